@@ -1,93 +1,186 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
-import sqlite3
-import json
 import re
+import functools
 from datetime import datetime
 
+from sunsun_db import engine, serialize
+from sunsun_db.http_cache import cache_headers, etag_matches, file_version, make_etag
+from sunsun_db.pool import connect
+from sunsun_db.result_cache import cache_key, database_version, get_result_cache
+from sunsun_db.timing import start_timer
+
 app = Flask(__name__)
 CORS(app)
 
 # データベースパス
 DB_PATH = '/Users/mitsuruono/sunsun_script_search/sunsun_script_database/sunsun_final_dialogue_database.db'
 
+def json_response(payload, status=200):
+    """serialize.dumps() で JSON にしたレスポンス（組み立て済みの RawJSON はそのまま埋め込む）"""
+    return app.response_class(serialize.dumps(payload), status=status, mimetype='application/json')
+
 def get_db_connection():
-    """データベース接続"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """データベース接続（読み取り専用の接続をプールから借りる）"""
+    with g.timer.phase('connect'):
+        conn = connect(DB_PATH)
+    g.timer.track(conn)
     return conn
 
+@app.before_request
+def start_request_timer():
+    """フェーズ別の計測を始める"""
+    g.timer = start_timer(request.endpoint)
+
+@app.after_request
+def add_server_timing(response):
+    """Server-Timing ヘッダーを付け、計測結果をログに出す"""
+    timer = g.timer
+    timer.cache = response.headers.get('X-Cache')
+    response.headers.update(timer.headers())
+    if response.is_streamed:
+        # ストリーミングは書き出しが終わってからログに出す
+        response.call_on_close(lambda: timer.log(response.status_code))
+    else:
+        timer.log(response.status_code)
+    return response
+
+def conditional_response(view):
+    """ETag を付け、If-None-Match が一致すれば SQL を実行せずに 304 を返す"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = make_etag(file_version(DB_PATH), request.endpoint, dict(request.args.items(), **kwargs))
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            response = app.response_class(status=304)
+            response.headers.update(cache_headers(etag))
+            return response
+        
+        response = app.make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.headers.update(cache_headers(etag))
+        return response
+    return wrapper
+
+def cached_response(view):
+    """レスポンスの JSON をデータベースの版ごとにキャッシュする（200 のみ保存）"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = get_result_cache()
+        with g.timer.phase('cache'):
+            version = database_version(DB_PATH)
+            key = cache_key(request.endpoint, dict(request.args.items(), **kwargs))
+            body = cache.get(version, key)
+        
+        if body is not None:
+            response = app.response_class(body, mimetype='application/json')
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        
+        response = app.make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            if response.is_streamed:
+                # ストリーミング中は書き出した分を溜め、最後まで送れたら保存する
+                response.response = tee_to_cache(response.response, cache, version, key)
+            else:
+                cache.put(version, key, response.get_data())
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+def tee_to_cache(chunks, cache, version, key):
+    """ストリーミングレスポンスをそのまま流しつつ、完了後にキャッシュへ保存する"""
+    body = []
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        body.append(chunk)
+        yield chunk
+    cache.put(version, key, b''.join(body))
+
+@app.route('/api/cache')
+def get_cache_stats():
+    """検索結果キャッシュのヒット・ミス・追い出し回数"""
+    return jsonify({
+        'success': True,
+        'data': get_result_cache().stats()
+    })
+
 @app.route('/api/stats')
+@conditional_response
 def get_stats():
     """データベース統計情報を取得"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 基本統計
-        cursor.execute('SELECT COUNT(DISTINCT script_name) as total_scripts FROM dialogues')
-        total_scripts = cursor.fetchone()['total_scripts']
-        
-        cursor.execute('SELECT COUNT(*) as total_dialogues FROM dialogues')
-        total_dialogues = cursor.fetchone()['total_dialogues']
-        
-        cursor.execute('''
-            SELECT COUNT(DISTINCT script_name) as youtube_connected 
-            FROM dialogues 
-            WHERE youtube_url IS NOT NULL AND youtube_url != ""
-        ''')
-        youtube_connected = cursor.fetchone()['youtube_connected']
-        
-        # キャラクター別統計
-        cursor.execute('''
-            SELECT character, COUNT(*) as count 
-            FROM dialogues 
-            WHERE character IS NOT NULL AND character != ""
-            GROUP BY character 
-            ORDER BY count DESC 
-            LIMIT 10
-        ''')
-        character_stats = [dict(row) for row in cursor.fetchall()]
-        
-        # 信頼度別統計
-        cursor.execute('''
-            SELECT 
-                COUNT(DISTINCT CASE WHEN match_confidence >= 0.8 THEN script_name END) as high_confidence,
-                COUNT(DISTINCT CASE WHEN match_confidence >= 0.5 AND match_confidence < 0.8 THEN script_name END) as medium_confidence,
-                COUNT(DISTINCT CASE WHEN match_confidence < 0.5 THEN script_name END) as low_confidence
-            FROM dialogues
-        ''')
-        confidence_stats = dict(cursor.fetchone())
+        try:
+            with g.timer.phase('query'):
+                stats = engine.get_stats(conn)
+        finally:
+            conn.close()
+        
+        with g.timer.phase('serialize'):
+            return json_response({
+                'success': True,
+                'data': stats
+            })
         
-        # 年代別統計
-        cursor.execute('''
-            SELECT 
-                substr(release_date, 1, 4) as year,
-                COUNT(DISTINCT script_name) as count
-            FROM dialogues 
-            WHERE release_date IS NOT NULL AND release_date != ""
-            GROUP BY substr(release_date, 1, 4)
-            ORDER BY year
-        ''')
-        year_stats = [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/stats/years')
+@conditional_response
+def get_year_counts():
+    """公開年ごとの台本数を取得"""
+    try:
+        conn = get_db_connection()
+        try:
+            with g.timer.phase('query'):
+                results = engine.release_year_counts(conn)
+        finally:
+            conn.close()
+        g.timer.rows(len(results))
+        
+        with g.timer.phase('serialize'):
+            return json_response({
+                'success': True,
+                'data': serialize.encode_rows(results)
+            })
         
-        conn.close()
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/stats/months')
+@conditional_response
+def get_month_counts():
+    """公開月ごとの台本数を取得（year で年を指定できる）"""
+    try:
+        conn = get_db_connection()
+        try:
+            with g.timer.phase('query'):
+                results = engine.release_month_counts(conn, year=request.args.get('year', '').strip())
+        finally:
+            conn.close()
+        g.timer.rows(len(results))
+        
+        with g.timer.phase('serialize'):
+            return json_response({
+                'success': True,
+                'data': serialize.encode_rows(results)
+            })
         
+    except ValueError as e:
         return jsonify({
-            'success': True,
-            'data': {
-                'total_scripts': total_scripts,
-                'total_dialogues': total_dialogues,
-                'youtube_connected': youtube_connected,
-                'youtube_coverage': round((youtube_connected / total_scripts) * 100, 2),
-                'character_stats': character_stats,
-                'confidence_stats': confidence_stats,
-                'year_stats': year_stats
-            }
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
         
     except Exception as e:
         return jsonify({
@@ -96,80 +189,49 @@ def get_stats():
         }), 500
 
 @app.route('/api/search/scripts')
+@conditional_response
+@cached_response
 def search_scripts():
-    """台本検索"""
+    """台本検索
+
+    cursor を指定するとその位置から続きを返す（キーセットページネーション）。
+    総件数は with_total=1 のときだけ数える。
+    theme / subject はカンマ区切りで複数指定でき、match=all ならすべてを含む台本に絞り込む。
+    date_from / date_to は公開日の範囲（YYYY-MM-DD・YYYY-MM・YYYY、両端を含む）。
+    """
     try:
-        query = request.args.get('q', '').strip()
-        theme = request.args.get('theme', '').strip()
-        year = request.args.get('year', '').strip()
-        limit = int(request.args.get('limit', 50))
-        offset = int(request.args.get('offset', 0))
-        
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # クエリ構築
-        conditions = []
-        params = []
-        
-        if query:
-            conditions.append('''
-                (script_name LIKE ? OR youtube_title LIKE ? OR themes LIKE ? OR subjects LIKE ?)
-            ''')
-            query_param = f'%{query}%'
-            params.extend([query_param, query_param, query_param, query_param])
-        
-        if theme:
-            conditions.append('themes LIKE ?')
-            params.append(f'%{theme}%')
-        
-        if year:
-            conditions.append('release_date LIKE ?')
-            params.append(f'{year}%')
-        
-        where_clause = ' AND '.join(conditions) if conditions else '1=1'
-        
-        # メインクエリ
-        sql_query = f'''
-            SELECT DISTINCT 
-                script_name,
-                themes,
-                subjects,
-                release_date,
-                youtube_title,
-                youtube_url,
-                match_confidence,
-                COUNT(dialogue) as dialogue_count
-            FROM dialogues 
-            WHERE {where_clause}
-            GROUP BY script_name, themes, subjects, release_date, youtube_title, youtube_url, match_confidence
-            ORDER BY match_confidence DESC, release_date DESC
-            LIMIT ? OFFSET ?
-        '''
-        
-        params.extend([limit, offset])
-        cursor.execute(sql_query, params)
-        results = [dict(row) for row in cursor.fetchall()]
-        
-        # 総件数取得
-        count_query = f'''
-            SELECT COUNT(DISTINCT script_name) as total
-            FROM dialogues 
-            WHERE {where_clause}
-        '''
-        cursor.execute(count_query, params[:-2])  # limit, offsetを除く
-        total_count = cursor.fetchone()['total']
-        
-        conn.close()
+        try:
+            with g.timer.phase('query'):
+                page = engine.search_scripts(
+                    conn,
+                    query=request.args.get('q', '').strip(),
+                    theme=request.args.get('theme', ''),
+                    subject=request.args.get('subject', ''),
+                    match=request.args.get('match', 'any').strip(),
+                    year=request.args.get('year', '').strip(),
+                    date_from=request.args.get('date_from', '').strip(),
+                    date_to=request.args.get('date_to', '').strip(),
+                    limit=engine.parse_limit(request.args.get('limit')),
+                    offset=int(request.args.get('offset', 0)),
+                    cursor=request.args.get('cursor', '').strip(),
+                    with_total=request.args.get('with_total', '') in ('1', 'true')
+                )
+        finally:
+            conn.close()
+        g.timer.rows(len(page.results), page.total_count)
+        
+        with g.timer.phase('serialize'):
+            return json_response({
+                'success': True,
+                'data': page.to_json_dict()
+            })
         
+    except ValueError as e:
         return jsonify({
-            'success': True,
-            'data': {
-                'results': results,
-                'total_count': total_count,
-                'has_more': (offset + limit) < total_count
-            }
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
         
     except Exception as e:
         return jsonify({
@@ -178,8 +240,18 @@ def search_scripts():
         }), 500
 
 @app.route('/api/search/keyword')
+@conditional_response
+@cached_response
 def search_by_keyword():
-    """キーワード検索 - 台本URL/キャラクター名/台本日付/YouTubeタイトル,URL,配信日をリスト出力"""
+    """キーワード検索 - 台本URL/キャラクター名/台本日付/YouTubeタイトル,URL,配信日をリスト出力
+
+    結果はカーソルから1件ずつ JSON 配列として書き出す（全件をメモリに載せない）。
+    ただしマッチ数の順に並べるため、SQLite はマッチした全行の集計とソートを終えてから
+    最初の行を返す。ストリーミングになるのは本文の書き出しだけで、最初のバイトまでの
+    時間はマッチした行数に比例する。
+    件数は limit（上限あり）で区切り、next_cursor を cursor に渡すと続きを返す。
+    total_results はマッチした台本の総数、count はこのページの件数。
+    """
     try:
         keyword = request.args.get('q', '').strip()
         
@@ -190,140 +262,91 @@ def search_by_keyword():
             }), 400
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # キーワードをダイアログ内容からも検索
-        search_query = '''
-            SELECT DISTINCT 
-                script_name,
-                character,
-                release_date,
-                youtube_title,
-                youtube_url,
-                script_url,
-                GROUP_CONCAT(DISTINCT character) as all_characters,
-                COUNT(*) as match_count
-            FROM dialogues 
-            WHERE (
-                dialogue LIKE ? OR 
-                script_name LIKE ? OR 
-                youtube_title LIKE ? OR 
-                themes LIKE ? OR 
-                subjects LIKE ?
-            )
-            AND dialogue IS NOT NULL 
-            AND dialogue != ""
-            GROUP BY script_name, release_date, youtube_title, youtube_url, script_url
-            ORDER BY match_count DESC, release_date DESC
-        '''
-        
-        keyword_param = f'%{keyword}%'
-        params = [keyword_param] * 5
-        
-        cursor.execute(search_query, params)
-        results = cursor.fetchall()
-        
-        # 結果を指定フォーマットで整形
-        formatted_results = []
-        for row in results:
-            formatted_results.append({
-                'script_name': row['script_name'],
-                'script_url': row['script_url'] or '',
-                'characters': row['all_characters'] or '',
-                'release_date': row['release_date'] or '',
-                'youtube_title': row['youtube_title'] or '',
-                'youtube_url': row['youtube_url'] or '',
-                'youtube_release_date': row['release_date'] or '',  # 同じ日付を使用
-                'match_count': row['match_count']
-            })
-        
-        conn.close()
-        
+        try:
+            with g.timer.phase('query'):
+                results = engine.KeywordScripts(
+                    conn, keyword,
+                    limit=engine.parse_limit(request.args.get('limit')),
+                    cursor=request.args.get('cursor', '').strip()
+                )
+        except Exception:
+            # ストリーミングを始められなかったら接続をここで返却する
+            conn.close()
+            raise
+        
+    except ValueError as e:
         return jsonify({
-            'success': True,
-            'keyword': keyword,
-            'total_results': len(formatted_results),
-            'data': formatted_results
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
         
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
+    
+    timer = g.timer
+    encode_row = serialize.row_encoder(engine.KeywordScript)
+    
+    def generate():
+        """結果を指定フォーマットで1件ずつ書き出す"""
+        with timer.phase('stream'):
+            yield b'{"success":true,"keyword":' + serialize.dumps(keyword) + b',"data":['
+            for i, result in enumerate(results):
+                if i:
+                    yield b','
+                yield encode_row(result)
+            yield (
+                b'],"total_results":' + str(results.total).encode()
+                + b',"count":' + str(results.count).encode()
+                + b',"next_cursor":' + serialize.dumps(results.next_cursor) + b'}'
+            )
+        timer.rows(results.count, results.total)
+    
+    response = app.response_class(generate(), mimetype='application/json')
+    # 書き出しが終わった（または中断された）ら接続を返却する
+    response.call_on_close(conn.close)
+    return response
 
 @app.route('/api/search/dialogues')
+@conditional_response
+@cached_response
 def search_dialogues():
-    """セリフ検索"""
+    """セリフ検索
+
+    並び順は台本の信頼度・公開日順、台本内は行番号順。
+    cursor を指定するとその位置から続きを返す（キーセットページネーション）。
+    総件数は with_total=1 のときだけ数える。
+    """
     try:
-        query = request.args.get('q', '').strip()
-        character = request.args.get('character', '').strip()
-        limit = int(request.args.get('limit', 50))
-        offset = int(request.args.get('offset', 0))
-        
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # クエリ構築
-        conditions = []
-        params = []
-        
-        if query:
-            conditions.append('dialogue LIKE ?')
-            params.append(f'%{query}%')
-        
-        if character:
-            conditions.append('character = ?')
-            params.append(character)
-        
-        where_clause = ' AND '.join(conditions) if conditions else '1=1'
-        
-        # メインクエリ
-        sql_query = f'''
-            SELECT 
-                script_name,
-                character,
-                dialogue,
-                row_number,
-                themes,
-                subjects,
-                release_date,
-                youtube_title,
-                youtube_url,
-                match_confidence
-            FROM dialogues 
-            WHERE {where_clause}
-            AND dialogue IS NOT NULL 
-            AND dialogue != ""
-            ORDER BY match_confidence DESC, release_date DESC, row_number
-            LIMIT ? OFFSET ?
-        '''
-        
-        params.extend([limit, offset])
-        cursor.execute(sql_query, params)
-        results = [dict(row) for row in cursor.fetchall()]
-        
-        # 総件数取得
-        count_query = f'''
-            SELECT COUNT(*) as total
-            FROM dialogues 
-            WHERE {where_clause}
-            AND dialogue IS NOT NULL 
-            AND dialogue != ""
-        '''
-        cursor.execute(count_query, params[:-2])  # limit, offsetを除く
-        total_count = cursor.fetchone()['total']
-        
-        conn.close()
+        try:
+            with g.timer.phase('query'):
+                page = engine.search_dialogues(
+                    conn,
+                    query=request.args.get('q', '').strip(),
+                    character=request.args.get('character', '').strip(),
+                    limit=engine.parse_limit(request.args.get('limit')),
+                    offset=int(request.args.get('offset', 0)),
+                    cursor=request.args.get('cursor', '').strip(),
+                    with_total=request.args.get('with_total', '') in ('1', 'true')
+                )
+        finally:
+            conn.close()
+        g.timer.rows(len(page.results), page.total_count)
+        
+        with g.timer.phase('serialize'):
+            return json_response({
+                'success': True,
+                'data': page.to_json_dict()
+            })
         
+    except ValueError as e:
         return jsonify({
-            'success': True,
-            'data': {
-                'results': results,
-                'total_count': total_count,
-                'has_more': (offset + limit) < total_count
-            }
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
         
     except Exception as e:
         return jsonify({
@@ -332,30 +355,23 @@ def search_dialogues():
         }), 500
 
 @app.route('/api/characters')
+@conditional_response
 def get_characters():
     """キャラクター一覧とセリフ数を取得"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                character,
-                COUNT(*) as dialogue_count,
-                COUNT(DISTINCT script_name) as script_count
-            FROM dialogues 
-            WHERE character IS NOT NULL AND character != ""
-            GROUP BY character 
-            ORDER BY dialogue_count DESC
-        ''')
-        
-        results = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        
-        return jsonify({
-            'success': True,
-            'data': results
-        })
+        try:
+            with g.timer.phase('query'):
+                results = engine.list_characters(conn)
+        finally:
+            conn.close()
+        g.timer.rows(len(results))
+        
+        with g.timer.phase('serialize'):
+            return json_response({
+                'success': True,
+                'data': serialize.encode_rows(results)
+            })
         
     except Exception as e:
         return jsonify({
@@ -364,38 +380,48 @@ def get_characters():
         }), 500
 
 @app.route('/api/themes')
+@conditional_response
 def get_themes():
     """テーマ一覧を取得"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT DISTINCT themes
-            FROM dialogues 
-            WHERE themes IS NOT NULL AND themes != ""
-        ''')
-        
-        all_themes = [row['themes'] for row in cursor.fetchall()]
-        
-        # テーマを分割して集計
-        theme_count = {}
-        for themes in all_themes:
-            if themes:
-                for theme in themes.split(','):
-                    theme = theme.strip()
-                    if theme:
-                        theme_count[theme] = theme_count.get(theme, 0) + 1
-        
-        # 件数順にソート
-        sorted_themes = sorted(theme_count.items(), key=lambda x: x[1], reverse=True)
-        
-        conn.close()
+        try:
+            with g.timer.phase('query'):
+                results = engine.list_themes(conn)
+        finally:
+            conn.close()
+        g.timer.rows(len(results))
+        
+        with g.timer.phase('serialize'):
+            return json_response({
+                'success': True,
+                'data': serialize.encode_rows(results)
+            })
         
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'data': [{'theme': theme, 'count': count} for theme, count in sorted_themes]
-        })
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/subjects')
+@conditional_response
+def get_subjects():
+    """題材一覧を取得"""
+    try:
+        conn = get_db_connection()
+        try:
+            with g.timer.phase('query'):
+                results = engine.list_subjects(conn)
+        finally:
+            conn.close()
+        g.timer.rows(len(results))
+        
+        with g.timer.phase('serialize'):
+            return json_response({
+                'success': True,
+                'data': serialize.encode_rows(results)
+            })
         
     except Exception as e:
         return jsonify({
@@ -404,73 +430,48 @@ def get_themes():
         }), 500
 
 @app.route('/api/script/<script_name>')
+@conditional_response
 def get_script_details(script_name):
     """個別台本の詳細情報を取得"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 台本情報
-        cursor.execute('''
-            SELECT DISTINCT
-                script_name,
-                themes,
-                subjects,
-                story_structure,
-                release_date,
-                youtube_title,
-                youtube_url,
-                youtube_video_id,
-                match_confidence
-            FROM dialogues 
-            WHERE script_name = ?
-        ''', [script_name])
-        
-        script_info = cursor.fetchone()
-        if not script_info:
+        try:
+        
+            # 台本情報・キャラクター別セリフ数・全行（空のセリフを含む）を1回で読む
+            with g.timer.phase('query'):
+                detail = engine.get_script_detail(conn, script_name, include_empty=True)
+        finally:
+            conn.close()
+        if not detail:
             return jsonify({
                 'success': False,
                 'error': 'Script not found'
             }), 404
         
-        # セリフ一覧
-        cursor.execute('''
-            SELECT 
-                character,
-                dialogue,
-                row_number
-            FROM dialogues 
-            WHERE script_name = ?
-            ORDER BY row_number
-        ''', [script_name])
-        
-        dialogues = [dict(row) for row in cursor.fetchall()]
-        
-        # キャラクター統計
-        cursor.execute('''
-            SELECT 
-                character,
-                COUNT(*) as count
-            FROM dialogues 
-            WHERE script_name = ?
-            AND character IS NOT NULL 
-            AND character != ""
-            GROUP BY character
-            ORDER BY count DESC
-        ''', [script_name])
-        
-        character_stats = [dict(row) for row in cursor.fetchall()]
-        
-        conn.close()
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'script_info': dict(script_info),
-                'dialogues': dialogues,
-                'character_stats': character_stats
-            }
-        })
+        script, character_stats, dialogues, line_count = detail
+        g.timer.rows(line_count)
+        
+        script_info = {
+            'script_name': script.script_name,
+            'themes': script.themes,
+            'subjects': script.subjects,
+            'story_structure': script.story_structure,
+            'release_date': script.release_date,
+            'youtube_title': script.youtube_title,
+            'youtube_url': script.youtube_url,
+            'youtube_video_id': script.youtube_video_id,
+            'match_confidence': script.match_confidence
+        }
+        
+        with g.timer.phase('serialize'):
+            return json_response({
+                'success': True,
+                'data': {
+                    'script_info': script_info,
+                    'dialogues': dialogues,
+                    'character_stats': character_stats
+                }
+            })
         
     except Exception as e:
         return jsonify({
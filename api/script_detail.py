@@ -1,57 +1,19 @@
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
-import sqlite3
-import urllib.request
-import tempfile
 import os
 import json
-import ssl
+import sys
 
-# Dropbox直接ダウンロードURL
-DROPBOX_URL = 'https://www.dropbox.com/scl/fi/dljhp6xzshdgvq7vqk3sz/sunsun_final_dialogue_database_proper.db?rlkey=qlf38ydm1b0n0ocsdbpjx0ih8&st=2h1nmfhq&dl=1'
+# 共通モジュール (sunsun_db) をリポジトリ直下から読み込む
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# データベース一時ファイル
-db_path = None
-
-def download_database():
-    """Dropboxからデータベースファイルをダウンロード"""
-    global db_path
-    
-    if db_path and os.path.exists(db_path):
-        return db_path
-    
-    try:
-        # 一時ファイルを作成
-        temp_fd, db_path = tempfile.mkstemp(suffix='.db')
-        os.close(temp_fd)
-        
-        print(f"Downloading database from {DROPBOX_URL}")
-        # SSL証明書検証をスキップ
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
-        opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
-        urllib.request.install_opener(opener)
-        
-        urllib.request.urlretrieve(DROPBOX_URL, db_path)
-        print(f"Database downloaded to {db_path}")
-        
-        return db_path
-        
-    except Exception as e:
-        print(f"Error downloading database: {e}")
-        raise
-
-def get_db_connection():
-    """データベース接続を取得"""
-    db_file = download_database()
-    conn = sqlite3.connect(db_file)
-    conn.row_factory = sqlite3.Row
-    return conn
+from sunsun_db import engine, serialize
+from sunsun_db.serverless import check_etag, get_db_connection, send_not_modified
+from sunsun_db.timing import start_timer
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        timer = start_timer('script_detail')
         try:
             # URLパラメータを取得
             parsed_url = urlparse(self.path)
@@ -69,33 +31,28 @@ class handler(BaseHTTPRequestHandler):
                 self.send_header('Access-Control-Allow-Origin', '*')
                 self.end_headers()
                 self.wfile.write(json.dumps(response).encode())
+                timer.log(400)
                 return
             
-            # データベース検索
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # 台本詳細情報を取得
-            script_query = '''
-                SELECT DISTINCT
-                    script_name,
-                    script_url,
-                    release_date,
-                    youtube_title,
-                    youtube_url,
-                    youtube_video_id,
-                    themes,
-                    subjects,
-                    category
-                FROM dialogues 
-                WHERE script_name = ?
-                LIMIT 1
-            '''
+            # データの版とパラメータが同じなら 304 を返す（SQL は実行しない）
+            params = {'script_name': script_name, 'keyword': keyword}
+            etag_headers, not_modified = check_etag(timer, 'script_detail', params, self.headers.get('If-None-Match'))
+            if not_modified:
+                return send_not_modified(self, etag_headers, timer)
             
-            cursor.execute(script_query, (script_name,))
-            script_info = cursor.fetchone()
+            # データベース検索
+            conn = get_db_connection(timer)
+            
+            # 台本情報・キャラクター別セリフ数・セリフを1回で読む
+            # （キーワード指定時は該当セリフのみ、正規化列で照合）
+            # セリフはこのレスポンスの形（空の値は ''・0、is_match 付き）の JSON で返る
+            try:
+                with timer.phase('query'):
+                    detail = engine.get_script_detail(conn, script_name, keyword, defaults=True)
+            finally:
+                conn.close()
             
-            if not script_info:
+            if not detail:
                 response = {
                     'success': False,
                     'error': '台本が見つかりません'
@@ -105,93 +62,57 @@ class handler(BaseHTTPRequestHandler):
                 self.send_header('Access-Control-Allow-Origin', '*')
                 self.end_headers()
                 self.wfile.write(json.dumps(response).encode())
-                conn.close()
+                timer.log(404)
                 return
             
-            # セリフ詳細を取得
-            if keyword:
-                # キーワード指定時は該当セリフのみ
-                dialogue_query = '''
-                    SELECT 
-                        character,
-                        dialogue,
-                        row_number
-                    FROM dialogues 
-                    WHERE script_name = ?
-                    AND dialogue LIKE ?
-                    AND dialogue IS NOT NULL 
-                    AND dialogue != ""
-                    ORDER BY row_number
-                '''
-                cursor.execute(dialogue_query, (script_name, f'%{keyword}%'))
-            else:
-                # 全セリフ取得
-                dialogue_query = '''
-                    SELECT 
-                        character,
-                        dialogue,
-                        row_number
-                    FROM dialogues 
-                    WHERE script_name = ?
-                    AND dialogue IS NOT NULL 
-                    AND dialogue != ""
-                    ORDER BY row_number
-                '''
-                cursor.execute(dialogue_query, (script_name,))
-            
-            dialogues = []
-            match_count = 0
+            script_info, character_stats, dialogues, line_count = detail
+            timer.rows(line_count)
             
-            for row in cursor.fetchall():
-                dialogue_text = row['dialogue'] or ''
-                is_match = False
-                
-                if keyword and keyword.lower() in dialogue_text.lower():
-                    is_match = True
-                    match_count += 1
-                
-                dialogues.append({
-                    'character': row['character'] or '',
-                    'dialogue': dialogue_text,
-                    'row_number': row['row_number'] or 0,
-                    'is_match': is_match
-                })
+            # キーワード指定時は SQL で絞り込み済みなので全件マッチ
+            match_count = line_count if keyword else 0
             
             # マッチ度計算（キーワード指定時のみ）
             match_confidence = 0
-            if keyword and dialogues:
-                match_confidence = match_count / len(dialogues)
-            
-            conn.close()
+            if keyword and line_count:
+                match_confidence = match_count / line_count
             
             response = {
                 'success': True,
                 'data': {
-                    'script_name': script_info['script_name'],
-                    'script_url': script_info['script_url'] or '',
-                    'release_date': script_info['release_date'] or '',
-                    'youtube_title': script_info['youtube_title'] or '',
-                    'youtube_url': script_info['youtube_url'] or '',
-                    'youtube_video_id': script_info['youtube_video_id'] or '',
-                    'themes': script_info['themes'] or '',
-                    'subjects': script_info['subjects'] or '',
-                    'category': script_info['category'] or '',
-                    'total_dialogues': len(dialogues),
+                    'script_name': script_info.script_name,
+                    'script_url': script_info.script_url or '',
+                    'release_date': script_info.release_date or '',
+                    'youtube_title': script_info.youtube_title or '',
+                    'youtube_url': script_info.youtube_url or '',
+                    'youtube_video_id': script_info.youtube_video_id or '',
+                    'themes': script_info.themes or '',
+                    'subjects': script_info.subjects or '',
+                    'category': script_info.category or '',
+                    'total_dialogues': line_count,
                     'match_count': match_count,
                     'match_confidence': match_confidence,
                     'keyword': keyword,
+                    'character_stats': character_stats,
                     'dialogues': dialogues
                 }
             }
             
+            with timer.phase('serialize'):
+                body = serialize.dumps(response)
+            
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
             self.send_header('Access-Control-Allow-Origin', '*')
             self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
             self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+            for header, value in etag_headers.items():
+                self.send_header(header, value)
+            for header, value in timer.headers().items():
+                self.send_header(header, value)
             self.end_headers()
             
-            self.wfile.write(json.dumps(response).encode())
+            self.wfile.write(body)
+            timer.log(200)
             
         except Exception as e:
             print(f"Error in script detail handler: {e}")
@@ -206,6 +127,7 @@ class handler(BaseHTTPRequestHandler):
             self.end_headers()
             
             self.wfile.write(json.dumps(response).encode())
+            timer.log(500)
     
     def do_OPTIONS(self):
         self.send_response(200)
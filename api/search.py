@@ -1,57 +1,31 @@
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
-import sqlite3
-import urllib.request
-import tempfile
 import os
 import json
-import ssl
+import sys
 
-# Dropbox直接ダウンロードURL
-DROPBOX_URL = 'https://www.dropbox.com/scl/fi/dljhp6xzshdgvq7vqk3sz/sunsun_final_dialogue_database_proper.db?rlkey=qlf38ydm1b0n0ocsdbpjx0ih8&st=2h1nmfhq&dl=1'
+# 共通モジュール (sunsun_db) をリポジトリ直下から読み込む
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# データベース一時ファイル
-db_path = None
+from sunsun_db import engine, serialize
+from sunsun_db.memory_index import get_memory_index, memory_index_enabled
+from sunsun_db.provision import download_database
+from sunsun_db.result_cache import cache_key, database_version, get_result_cache
+from sunsun_db.serverless import check_etag, get_db_connection, send_not_modified
+from sunsun_db.timing import start_timer
 
-def download_database():
-    """Dropboxからデータベースファイルをダウンロード"""
-    global db_path
-    
-    if db_path and os.path.exists(db_path):
-        return db_path
-    
+def search_database(keyword, limit, timer):
+    """データベースを検索して台本ごとにまとめる"""
+    conn = get_db_connection(timer)
     try:
-        # 一時ファイルを作成
-        temp_fd, db_path = tempfile.mkstemp(suffix='.db')
-        os.close(temp_fd)
-        
-        print(f"Downloading database from {DROPBOX_URL}")
-        # SSL証明書検証をスキップ
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
-        opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
-        urllib.request.install_opener(opener)
-        
-        urllib.request.urlretrieve(DROPBOX_URL, db_path)
-        print(f"Database downloaded to {db_path}")
-        
-        return db_path
-        
-    except Exception as e:
-        print(f"Error downloading database: {e}")
-        raise
-
-def get_db_connection():
-    """データベース接続を取得"""
-    db_file = download_database()
-    conn = sqlite3.connect(db_file)
-    conn.row_factory = sqlite3.Row
-    return conn
+        with timer.phase('query'):
+            return engine.search_grouped(conn, keyword, limit)
+    finally:
+        conn.close()
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        timer = start_timer('search')
         try:
             # URLパラメータを取得
             parsed_url = urlparse(self.path)
@@ -68,99 +42,76 @@ class handler(BaseHTTPRequestHandler):
                 self.send_header('Access-Control-Allow-Origin', '*')
                 self.end_headers()
                 self.wfile.write(json.dumps(response).encode())
+                timer.log(400)
                 return
             
-            # データベース検索
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # キーワード検索クエリ（セリフ詳細付き）
-            query = '''
-                SELECT 
-                    script_name,
-                    script_url,
-                    character,
-                    dialogue,
-                    row_number,
-                    release_date,
-                    youtube_title,
-                    youtube_url
-                FROM dialogues 
-                WHERE (
-                    dialogue LIKE ? OR 
-                    script_name LIKE ? OR 
-                    youtube_title LIKE ? OR 
-                    themes LIKE ? OR 
-                    subjects LIKE ?
-                )
-                AND dialogue IS NOT NULL 
-                AND dialogue != ""
-                ORDER BY script_name, row_number
-            '''
+            try:
+                limit = engine.parse_limit(query_params.get('limit', [''])[0])
+            except ValueError as e:
+                response = {
+                    'success': False,
+                    'error': str(e)
+                }
+                self.send_response(400)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(json.dumps(response).encode())
+                timer.log(400)
+                return
             
-            keyword_param = f'%{keyword}%'
-            params = [keyword_param] * 5
+            # データの版とパラメータが同じなら 304 を返す（SQL は実行しない）
+            params = {'q': keyword, 'limit': limit}
+            etag_headers, not_modified = check_etag(timer, 'search', params, self.headers.get('If-None-Match'))
+            if not_modified:
+                return send_not_modified(self, etag_headers, timer)
             
-            cursor.execute(query, params)
+            # 同じクエリの結果はデータベースの版が変わるまで再利用する
+            with timer.phase('download'):
+                db_path = download_database()
+            cache = get_result_cache()
+            with timer.phase('cache'):
+                version = database_version(db_path)
+                key = cache_key('search', params)
+                body = cache.get(version, key)
+            cache_status = 'HIT'
             
-            # 台本ごとにグループ化
-            scripts_dict = {}
-            for row in cursor.fetchall():
-                script_name = row['script_name']
-                if script_name not in scripts_dict:
-                    scripts_dict[script_name] = {
-                        'script_name': script_name,
-                        'script_url': row['script_url'] or '',
-                        'release_date': row['release_date'] or '',
-                        'youtube_title': row['youtube_title'] or '',
-                        'youtube_url': row['youtube_url'] or '',
-                        'dialogues': [],
-                        'characters': set()
-                    }
+            if body is None:
+                cache_status = 'MISS'
+                if memory_index_enabled():
+                    # ウォームコンテナではメモリ内インデックスで検索
+                    with timer.phase('query'):
+                        results, total = get_memory_index(db_path).search(keyword, limit)
+                else:
+                    results, total = search_database(keyword, limit, timer)
+                timer.rows(len(results), total)
                 
-                # キーワードがセリフ内容に含まれる場合のみセリフを追加
-                dialogue = row['dialogue'] or ''
-                if keyword.lower() in dialogue.lower():
-                    scripts_dict[script_name]['dialogues'].append({
-                        'character': row['character'] or '',
-                        'dialogue': dialogue,
-                        'row_number': row['row_number'] or 0
-                    })
-                    if row['character']:
-                        scripts_dict[script_name]['characters'].add(row['character'])
-            
-            # 結果を整形
-            results = []
-            for script_data in scripts_dict.values():
-                if script_data['dialogues']:  # セリフがある場合のみ
-                    # 実際のマッチ数を記録
-                    actual_match_count = len(script_data['dialogues'])
-                    # 代表的なセリフのみ表示（最初の3件）
-                    script_data['dialogues'] = script_data['dialogues'][:3]
-                    script_data['characters'] = ', '.join(list(script_data['characters']))
-                    script_data['match_count'] = actual_match_count
-                    results.append(script_data)
-            
-            # マッチ数とリリース日でソート
-            results.sort(key=lambda x: (x['match_count'], x['release_date']), reverse=True)
-            
-            conn.close()
-            
-            response = {
-                'success': True,
-                'keyword': keyword,
-                'total_results': len(results),
-                'data': results
-            }
+                with timer.phase('serialize'):
+                    response = {
+                        'success': True,
+                        'keyword': keyword,
+                        'total_results': total,
+                        'limit': limit,
+                        'data': [result.to_dict() for result in results]
+                    }
+                    body = serialize.dumps(response)
+                cache.put(version, key, body)
             
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
             self.send_header('Access-Control-Allow-Origin', '*')
             self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
             self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+            for header, value in etag_headers.items():
+                self.send_header(header, value)
+            for header, value in timer.headers().items():
+                self.send_header(header, value)
+            self.send_header('X-Cache', cache_status)
             self.end_headers()
             
-            self.wfile.write(json.dumps(response).encode())
+            self.wfile.write(body)
+            timer.cache = cache_status
+            timer.log(200)
             
         except Exception as e:
             print(f"Error in search handler: {e}")
@@ -175,6 +126,7 @@ class handler(BaseHTTPRequestHandler):
             self.end_headers()
             
             self.wfile.write(json.dumps(response).encode())
+            timer.log(500)
     
     def do_OPTIONS(self):
         self.send_response(200)
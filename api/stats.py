@@ -1,88 +1,58 @@
 from http.server import BaseHTTPRequestHandler
-import sqlite3
-import urllib.request
-import tempfile
 import os
 import json
-import ssl
+import sys
 
-# Dropbox直接ダウンロードURL
-DROPBOX_URL = 'https://www.dropbox.com/scl/fi/dljhp6xzshdgvq7vqk3sz/sunsun_final_dialogue_database_proper.db?rlkey=qlf38ydm1b0n0ocsdbpjx0ih8&st=2h1nmfhq&dl=1'
+# 共通モジュール (sunsun_db) をリポジトリ直下から読み込む
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# データベース一時ファイル
-db_path = None
-
-def download_database():
-    """Dropboxからデータベースファイルをダウンロード"""
-    global db_path
-    
-    if db_path and os.path.exists(db_path):
-        return db_path
-    
-    try:
-        # 一時ファイルを作成
-        temp_fd, db_path = tempfile.mkstemp(suffix='.db')
-        os.close(temp_fd)
-        
-        print(f"Downloading database from {DROPBOX_URL}")
-        # SSL証明書検証をスキップ
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
-        opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
-        urllib.request.install_opener(opener)
-        
-        urllib.request.urlretrieve(DROPBOX_URL, db_path)
-        print(f"Database downloaded to {db_path}")
-        
-        return db_path
-        
-    except Exception as e:
-        print(f"Error downloading database: {e}")
-        raise
-
-def get_db_connection():
-    """データベース接続を取得"""
-    db_file = download_database()
-    conn = sqlite3.connect(db_file)
-    conn.row_factory = sqlite3.Row
-    return conn
+from sunsun_db import engine, serialize
+from sunsun_db.serverless import check_etag, get_db_connection, send_not_modified
+from sunsun_db.timing import start_timer
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
+        timer = start_timer('stats')
         try:
-            # データベース統計を取得
-            conn = get_db_connection()
-            cursor = conn.cursor()
+            # データの版とパラメータが同じなら 304 を返す（SQL は実行しない）
+            etag_headers, not_modified = check_etag(timer, 'stats', {}, self.headers.get('If-None-Match'))
+            if not_modified:
+                return send_not_modified(self, etag_headers, timer)
             
-            # 基本統計
-            cursor.execute('SELECT COUNT(DISTINCT script_name) as total_scripts FROM dialogues')
-            total_scripts = cursor.fetchone()['total_scripts']
-            
-            cursor.execute('SELECT COUNT(*) as total_dialogues FROM dialogues')
-            total_dialogues = cursor.fetchone()['total_dialogues']
-            
-            conn.close()
+            # データベース統計を取得
+            conn = get_db_connection(timer)
+            try:
+                with timer.phase('query'):
+                    stats = engine.get_stats(conn)
+            finally:
+                conn.close()
             
             response = {
                 'success': True,
                 'data': {
-                    'total_scripts': total_scripts,
-                    'total_dialogues': total_dialogues,
+                    'total_scripts': stats['total_scripts'],
+                    'total_dialogues': stats['total_dialogues'],
                     'status': 'Database loaded successfully'
                 }
             }
             
             # レスポンスを送信
+            with timer.phase('serialize'):
+                body = serialize.dumps(response)
+            
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
             self.send_header('Access-Control-Allow-Origin', '*')
             self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
             self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+            for header, value in etag_headers.items():
+                self.send_header(header, value)
+            for header, value in timer.headers().items():
+                self.send_header(header, value)
             self.end_headers()
             
-            self.wfile.write(json.dumps(response).encode())
+            self.wfile.write(body)
+            timer.log(200)
             
         except Exception as e:
             print(f"Error in stats handler: {e}")
@@ -97,6 +67,7 @@ class handler(BaseHTTPRequestHandler):
             self.end_headers()
             
             self.wfile.write(json.dumps(response).encode())
+            timer.log(500)
     
     def do_OPTIONS(self):
         self.send_response(200)
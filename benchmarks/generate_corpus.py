@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""ベンチマーク用の合成データベースを生成する
+
+本番と同じ列を持つ旧形式の `dialogues` テーブルを作る（既定で約1,500台本・
+約25万行）。キャラクター・テーマ・公開日・マッチング信頼度の分布は本番データに
+寄せてあり、同じ --seed なら常に同じ内容になる。
+
+使い方:
+    python benchmarks/generate_corpus.py corpus.db
+    python benchmarks/generate_corpus.py corpus.db --build   # 続けて sunsun_db.build も実行
+    python benchmarks/generate_corpus.py small.db --scripts 200
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sunsun_db.schema import LINE_COLUMNS, SCRIPT_COLUMNS
+
+DEFAULT_SCRIPTS = 1500
+DEFAULT_SEED = 20240101
+
+# 台本1本あたりの平均行数（本番: 246,924行 / 1,529台本）
+MEAN_LINES = 165
+
+# キャラクターと出現の重み（少数の主要キャラクターが大半を占める）
+CHARACTERS = [
+    ('サンサン', 30), ('くもりん', 18), ('ナレーション', 12), ('ママ', 8), ('パパ', 7),
+    ('ドクター', 4), ('おばけちゃん', 3), ('ロボくん', 3), ('先生', 2), ('お姉さん', 2),
+    ('みんな', 2), ('Sunny', 1), ('ねこちゃん', 1), ('いぬくん', 1), ('王様', 1),
+    ('魔法使い', 1), ('店員さん', 1), ('宇宙人', 1), ('', 2),
+]
+
+THEMES = [
+    ('日常・遊び系', 35), ('工作・DIY系', 20), ('料理・食べ物系', 18),
+    ('キャラクター系', 15), ('教育・知育系', 12),
+]
+
+SUBJECTS = [
+    'おもちゃ', '工作', 'お菓子', 'スライム', '粘土', 'おりがみ', 'お絵かき', '料理',
+    'ケーキ', 'アイス', '恐竜', '電車', '車', '動物', '虫', 'お店屋さん', 'ごっこ遊び',
+    '実験', 'お風呂', 'かくれんぼ', '誕生日', 'クリスマス', 'ハロウィン', '雪遊び',
+]
+
+CATEGORIES = ['本編', 'ショート', '特別編', 'コラボ']
+
+STORY_STRUCTURES = ['導入→展開→オチ', '問題発生→解決', '紹介→体験→まとめ', 'クイズ形式']
+
+# セリフの部品
+OPENINGS = [
+    'ねえねえ', 'みてみて', 'わあ', 'よーし', 'えっと', 'あれ？', 'うーん', 'やったー',
+    'こんにちは', 'おはよう', 'すごい', 'ほんとだ', 'じゃあ', 'それでは',
+]
+NOUNS = [
+    'ケーキ', 'スライム', 'おりがみ', 'ねんど', 'クレヨン', 'ブロック', 'おにぎり', 'アイス',
+    'ジュース', 'きょうりゅう', 'でんしゃ', 'ロボット', 'おばけ', 'にじ', 'ほし', 'おはな',
+    'ボール', 'パン', 'プリン', 'チョコレート', 'いちご', 'バナナ', 'おもちゃ', 'はさみ',
+    'のり', 'テープ', 'かみ', 'はこ', 'ふうせん', 'シャボン玉', '雪だるま', 'お城',
+    'ＡＢＣ', 'ｶﾀｶﾅ', 'DIY',
+]
+VERBS = [
+    'つくろう', 'たべよう', 'あそぼう', 'みてみよう', 'ためしてみよう', 'さがそう',
+    'かざろう', 'まぜよう', 'きってみよう', 'ならべよう', 'かぞえよう', 'うたおう',
+]
+ENDINGS = [
+    'ね！', 'よ！', 'かな？', '！', '。', 'だね。', 'みたい！', 'でしょう？', 'よね〜', '♪',
+]
+REACTIONS = [
+    'たのしいね！', 'おいしそう！', 'かわいい〜', 'できた！', 'すごいすごい！',
+    'ありがとう！', 'どうしよう…', 'びっくりした！', 'もういっかい！', 'ばいばーい！',
+]
+
+
+def weighted(rng, items):
+    """(値, 重み) のリストから1つ選ぶ"""
+    values, weights = zip(*items)
+    return rng.choices(values, weights)[0]
+
+
+def make_dialogue(rng, subject):
+    """セリフを1つ作る（題材の語が出やすい）"""
+    kind = rng.random()
+    noun = subject if rng.random() < 0.3 else rng.choice(NOUNS)
+    if kind < 0.45:
+        return f'{rng.choice(OPENINGS)}、{noun}を{rng.choice(VERBS)}{rng.choice(ENDINGS)}'
+    if kind < 0.75:
+        return f'{noun}と{rng.choice(NOUNS)}、どっちがいい{rng.choice(ENDINGS)}'
+    if kind < 0.95:
+        return rng.choice(REACTIONS)
+    # 長めの説明セリフ
+    return '、'.join(f'{rng.choice(NOUNS)}を{rng.choice(VERBS)}' for _ in range(rng.randint(2, 4))) + '！'
+
+
+def match_confidence(rng):
+    """本番の分布（≥0.8: 1%, 0.5〜0.8: 14%, 残り <0.5）に寄せた信頼度"""
+    r = rng.random()
+    if r < 0.007:
+        return round(rng.uniform(0.8, 1.0), 3)
+    if r < 0.144:
+        return round(rng.uniform(0.5, 0.8), 3)
+    return round(rng.uniform(0.05, 0.5), 3)
+
+
+def release_date(rng, index, total):
+    """2019〜2025年。番号順にほぼ古い順で、一部は日付なし"""
+    if rng.random() < 0.03:
+        return None
+    day = int((index + rng.uniform(-5, 5)) / total * (7 * 365))
+    day = max(0, min(day, 7 * 365 - 1))
+    year = 2019 + day // 365
+    day_of_year = day % 365
+    month = min(12, day_of_year // 31 + 1)
+    return f'{year}-{month:02d}-{day_of_year % 28 + 1:02d}'
+
+
+def generate(db_path, scripts=DEFAULT_SCRIPTS, seed=DEFAULT_SEED):
+    """合成データベースを生成し、(台本数, 行数) を返す"""
+    rng = random.Random(seed)
+    columns = SCRIPT_COLUMNS + LINE_COLUMNS
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"CREATE TABLE dialogues ({', '.join(columns)})")
+
+    placeholders = ', '.join('?' * len(columns))
+    insert = f"INSERT INTO dialogues ({', '.join(columns)}) VALUES ({placeholders})"
+    total_lines = 0
+
+    for index in range(scripts):
+        script_name = f'B{1000 + index}_{rng.choice(SUBJECTS)}{rng.choice(VERBS)}'
+        subject = rng.choice(SUBJECTS)
+        themes = ','.join(dict.fromkeys(weighted(rng, THEMES) for _ in range(rng.randint(1, 3))))
+        video_id = ''.join(rng.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_', k=11))
+        metadata = {
+            'script_name': script_name,
+            'themes': themes,
+            'subjects': ','.join(dict.fromkeys([subject] + rng.sample(SUBJECTS, rng.randint(0, 2)))),
+            'story_structure': rng.choice(STORY_STRUCTURES),
+            'release_date': release_date(rng, index, scripts),
+            'youtube_title': f'【サンサンキッズTV】{subject}を{rng.choice(VERBS)}！{rng.choice(REACTIONS)}',
+            'youtube_url': f'https://www.youtube.com/watch?v={video_id}',
+            'youtube_video_id': video_id,
+            'script_url': f'https://docs.google.com/document/d/{seed}-{index:05d}',
+            'category': weighted(rng, list(zip(CATEGORIES, (80, 12, 5, 3)))),
+            'match_confidence': match_confidence(rng),
+        }
+        script_values = [metadata[c] for c in SCRIPT_COLUMNS]
+
+        lines = max(10, int(rng.gauss(MEAN_LINES, MEAN_LINES / 3)))
+        rows = []
+        for row_number in range(1, lines + 1):
+            # ト書きなど、セリフが空の行も少し混ぜる
+            dialogue = make_dialogue(rng, subject) if rng.random() > 0.03 else ''
+            rows.append(script_values + [weighted(rng, CHARACTERS), dialogue, row_number])
+        conn.executemany(insert, rows)
+        total_lines += lines
+
+    conn.commit()
+    conn.close()
+    return scripts, total_lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ベンチマーク用の合成データベースを生成')
+    parser.add_argument('db_path', help='出力する SQLite ファイル（既存なら上書き）')
+    parser.add_argument('--scripts', type=int, default=DEFAULT_SCRIPTS, help='台本数')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='乱数シード')
+    parser.add_argument('--build', action='store_true', help='生成後に sunsun_db.build を実行')
+    args = parser.parse_args()
+
+    start = time.time()
+    scripts, lines = generate(args.db_path, args.scripts, args.seed)
+    print(f"Generated {scripts} scripts, {lines} dialogue rows in {time.time() - start:.1f}s -> {args.db_path}")
+
+    if args.build:
+        from sunsun_db.build import build_database
+        if not build_database(args.db_path):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""ASGI 配信 (sunsun_db.asgi) のスレッドの分け方による待ち時間を比較する
+
+重いキーワード検索（LIKE の全件スキャン）を並行して送り続けながら /api/characters を
+順に呼び、その待ち時間を計測する。1つのスレッドプールを共有した場合と、
+fast lane・ルートごとの同時実行数の上限を使った場合（既定の設定）を比べる。
+ASGI サーバーを使わずにプロセス内で ASGI アプリを直接呼ぶ。
+
+使い方:
+    python benchmarks/lanes.py corpus.db
+    python benchmarks/lanes.py corpus.db --heavy-clients 32 --keyword ママ
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def request(app, path, query=''):
+    """ASGI アプリに GET を1回送り、ステータスを返す"""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'root_path': '',
+        'query_string': query.encode(), 'headers': [], 'http_version': '1.1', 'scheme': 'http',
+    }
+    await app(scope, receive, send)
+    return messages[0]['status']
+
+
+async def measure(app, keyword, heavy_clients, heavy_requests, fast_requests):
+    """(fast エンドポイントの待ち時間のリスト, 全体の時間) を返す"""
+    query = f'q={quote(keyword)}&limit=500'
+
+    async def heavy():
+        for _ in range(heavy_requests):
+            await request(app, '/api/search/keyword', query)
+
+    async def fast():
+        await asyncio.sleep(0.01)
+        latencies = []
+        for _ in range(fast_requests):
+            start = time.perf_counter()
+            await request(app, '/api/characters')
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[heavy() for _ in range(heavy_clients)], fast())
+    return sorted(results[-1]), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ASGI 配信のスレッドの分け方による待ち時間の比較')
+    parser.add_argument('db_path', help='ビルド済みデータベース')
+    parser.add_argument('--keyword', default='ママ', help='重い検索のキーワード（2文字で LIKE）')
+    parser.add_argument('--heavy-clients', type=int, default=16, help='重い検索の同時クライアント数')
+    parser.add_argument('--heavy-requests', type=int, default=4, help='クライアントごとの重い検索の回数')
+    parser.add_argument('--fast-requests', type=int, default=40, help='/api/characters の回数')
+    parser.add_argument('--threads', type=int, default=8, help='スレッド数（共有する場合の合計）')
+    args = parser.parse_args()
+
+    # 同じクエリの繰り返しが結果キャッシュに当たらないようにする
+    os.environ['SUNSUN_RESULT_CACHE_BYTES'] = '0'
+    os.environ['SUNSUN_TIMING'] = '0'
+
+    import api
+    from sunsun_db.asgi import LaneDispatcher
+
+    api.DB_PATH = os.path.abspath(args.db_path)
+    configs = {
+        'shared pool': lambda: LaneDispatcher(api.app, threads=args.threads, fast_routes=(), route_limits={}),
+        'lanes': lambda: LaneDispatcher(api.app, threads=args.threads),
+    }
+    for name, make_app in configs.items():
+        app = make_app()
+        latencies, elapsed = asyncio.run(
+            measure(app, args.keyword, args.heavy_clients, args.heavy_requests, args.fast_requests)
+        )
+        app.shutdown()
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(
+            f"{name:12s} /api/characters p50 {p50 * 1000:8.2f}ms  p95 {p95 * 1000:8.2f}ms  "
+            f"max {latencies[-1] * 1000:8.2f}ms  (total {elapsed:.2f}s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""エンドポイントのクエリ計画を検査する
+
+sunsun_db.engine が組み立てる各エンドポイントの SQL に EXPLAIN QUERY PLAN を
+実行し、期待するインデックス・FTS が使われているかを確かめる。
+`substr()` や先頭の `%` を足しただけでインデックス検索が dialogue_lines の
+全件スキャンに変わるような退行を、デプロイ前に検出するためのもの。
+
+- 各クエリに「計画に含まれるべき行」「含まれてはいけない行」を指定する
+- dialogue_lines（約25万行）の全件スキャンは、許可したクエリ以外では失敗にする
+- --save で計画を JSON に保存し、別のコミットで --compare に渡すと差分を表示する
+
+期待どおりでないクエリがあれば終了コード 1 で終わる。
+
+使い方:
+    python benchmarks/generate_corpus.py corpus.db --build
+    python benchmarks/query_plans.py corpus.db --save plans_main.json
+    python benchmarks/query_plans.py corpus.db --compare plans_main.json
+"""
+
+import argparse
+import difflib
+import json
+import os
+import re
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sunsun_db import engine
+from sunsun_db.fts import MODE_FTS, MODE_NORMALIZED
+from sunsun_db.tags import MATCH_ALL, MATCH_ANY
+
+# dialogue_lines を先頭から最後まで読む計画（インデックス順の走査を含む）
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (d|dialogue_lines)( USING .*)?$')
+
+# ORDER BY をインデックスで解決できずにソートしている
+TEMP_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+LINES_BY_SCRIPT = 'SEARCH d USING INDEX idx_dialogue_lines_script (script_id=?)'
+LINES_FTS = 'SCAN dialogue_lines_fts VIRTUAL TABLE INDEX'
+SCRIPTS_FTS = 'SCAN scripts_fts VIRTUAL TABLE INDEX'
+STATS_BY_SCRIPT = 'SEARCH st USING PRIMARY KEY (script_id=?)'
+THEME_LOOKUP = 'SEARCH script_themes USING PRIMARY KEY (theme=?)'
+
+
+def plan_cases():
+    """名前: (SQL, 含まれるべき行, 含まれてはいけない行, 全件スキャンを許すか)
+
+    全件スキャンを許しているのは、集計の性質上すべての行を読むもの、
+    または2文字以下のキーワード（LIKE）で FTS を使えないもの。
+    """
+    return {
+        # /api/search/scripts
+        'scripts.browse': (
+            engine._script_search_sql(None, 0, 0, MATCH_ANY, False, False, False, True, True, False),
+            ['SCAN scripts USING INDEX idx_scripts_order', LINES_BY_SCRIPT], [TEMP_SORT], False),
+        'scripts.browse_cursor': (
+            engine._script_search_sql(None, 0, 0, MATCH_ANY, False, False, False, True, True, True),
+            ['SEARCH scripts USING INDEX idx_scripts_order', LINES_BY_SCRIPT], [TEMP_SORT], False),
+        'scripts.theme_year': (
+            engine._script_search_sql(None, 1, 0, MATCH_ANY, True, False, False, True, True, False),
+            ['USING INDEX idx_scripts_order', THEME_LOOKUP], [TEMP_SORT], False),
+        'scripts.date_range': (
+            # 公開日の範囲でも並び順に走査して limit 件で止める
+            engine._script_search_sql(None, 0, 0, MATCH_ANY, False, True, True, True, True, False),
+            ['SCAN scripts USING INDEX idx_scripts_order', LINES_BY_SCRIPT], [TEMP_SORT], False),
+        'scripts.date_range_count': (
+            engine._script_count_sql(None, 0, 0, MATCH_ANY, False, True, True, True, True),
+            ['USING COVERING INDEX idx_scripts_release_date (release_date_iso>? AND release_date_iso<?)'], [], False),
+        'scripts.year_count': (
+            engine._script_count_sql(None, 0, 0, MATCH_ANY, True, False, False, True, True),
+            ['USING COVERING INDEX idx_scripts_release_month (release_year=?)'], [], False),
+        'scripts.themes_all': (
+            engine._script_search_sql(None, 2, 1, MATCH_ALL, False, False, False, True, True, False),
+            [THEME_LOOKUP, 'SEARCH script_subjects USING PRIMARY KEY (subject=?)'], [], False),
+        'scripts.fts': (
+            engine._script_search_sql(MODE_FTS, 0, 0, MATCH_ANY, False, False, False, True, True, False),
+            [SCRIPTS_FTS, 'SEARCH scripts USING INTEGER PRIMARY KEY', LINES_BY_SCRIPT], [], False),
+        'scripts.fts_count': (
+            engine._script_count_sql(MODE_FTS, 0, 0, MATCH_ANY, False, False, False, True, True),
+            [SCRIPTS_FTS], [], False),
+
+        # /api/search/dialogues
+        'dialogues.browse': (
+            engine._dialogue_search_sql(None, False, False, True),
+            ['SCAN s USING INDEX idx_scripts_order', LINES_BY_SCRIPT], [TEMP_SORT], False),
+        'dialogues.browse_cursor': (
+            engine._dialogue_search_sql(None, False, True, True),
+            ['SEARCH s USING INDEX idx_scripts_order', LINES_BY_SCRIPT], [TEMP_SORT], False),
+        'dialogues.fts': (
+            engine._dialogue_search_sql(MODE_FTS, False, False, True),
+            [LINES_FTS, 'SEARCH d USING INTEGER PRIMARY KEY'], [], False),
+        'dialogues.fts_count': (
+            engine._dialogue_count_sql(MODE_FTS, False),
+            [LINES_FTS, 'SEARCH d USING INTEGER PRIMARY KEY'], [], False),
+        'dialogues.normalized': (
+            # 台本の並び順に読み、limit 件見つかった時点で止まる
+            engine._dialogue_search_sql(MODE_NORMALIZED, False, False, True),
+            ['SCAN s USING INDEX idx_scripts_order', LINES_BY_SCRIPT], [TEMP_SORT], False),
+        'dialogues.character': (
+            engine._dialogue_search_sql(None, True, False, True),
+            ['SCAN s USING INDEX idx_scripts_order', 'USING INDEX idx_dialogue_lines_character (character_id=? AND script_id=?)'],
+            [TEMP_SORT], False),
+
+        # /api/search/keyword（セリフのマッチと台本メタデータのマッチの UNION）
+        'keyword.fts': (
+            engine._keyword_scripts_sql(MODE_FTS, False, True),
+            [LINES_FTS, SCRIPTS_FTS, 'SEARCH ld USING COVERING INDEX idx_dialogue_lines_script (script_id=?)'], [], False),
+        'keyword.fts_cursor': (
+            engine._keyword_scripts_sql(MODE_FTS, True, True),
+            [LINES_FTS, SCRIPTS_FTS], [], False),
+        'keyword.normalized': (
+            # LIKE はセリフ側だけ全件を読み、台本メタデータ側はインデックスで台本のセリフを引く
+            engine._keyword_scripts_sql(MODE_NORMALIZED, False, True),
+            ['SEARCH ld USING COVERING INDEX idx_dialogue_lines_script (script_id=?)'], [], True),
+
+        # /api/search
+        'grouped.fts': (
+            engine._grouped_search_sql(MODE_FTS, True),
+            [LINES_FTS, 'SEARCH d USING INTEGER PRIMARY KEY'], [], False),
+        'grouped.normalized': (
+            engine._grouped_search_sql(MODE_NORMALIZED, True),
+            [], [], True),
+
+        # 一覧
+        'characters': (
+            # ビルド時に集計した件数を読むだけ（キャラクター数件のソートのみ）
+            engine.CHARACTERS_SQL, ['SCAN characters'], [], False),
+        'characters.live_counts': (
+            # 件数が無い・古いデータベース
+            engine.CHARACTER_COUNTS_SQL,
+            ['SCAN d USING COVERING INDEX idx_dialogue_lines_character'], [], True),
+        'themes': (engine.TAG_COUNTS_SQL['themes'], ['SCAN theme_counts'], [], False),
+        'subjects': (engine.TAG_COUNTS_SQL['subjects'], ['SCAN subject_counts'], [], False),
+
+        # 公開年・公開月ごとの台本数
+        'release.years': (engine.YEAR_COUNTS_SQL, ['USING COVERING INDEX idx_scripts_release_month'], [TEMP_SORT], False),
+        'release.months': (
+            engine._month_counts_sql(False), ['SCAN scripts USING COVERING INDEX idx_scripts_release_month'], [TEMP_SORT],
+            False),
+        'release.months_year': (
+            engine._month_counts_sql(True), ['USING COVERING INDEX idx_scripts_release_month (release_year=?'], [TEMP_SORT],
+            False),
+
+        # 台本詳細（台本情報・キャラクター別セリフ数・セリフを1回で読む）
+        'script.detail': (
+            engine._script_detail_sql(None, False, True, False),
+            ['SEARCH s USING INDEX', '(script_name=?)', STATS_BY_SCRIPT, LINES_BY_SCRIPT], [TEMP_SORT], False),
+        'script.detail_all_lines': (
+            engine._script_detail_sql(None, True, True, False),
+            [STATS_BY_SCRIPT, LINES_BY_SCRIPT], [TEMP_SORT], False),
+        'script.detail_fts': (
+            # % や _ を含むキーワードのみ（それ以外は台本内のセリフだけを正規化列の LIKE で照合する）
+            engine._script_detail_sql(MODE_FTS, False, True, False),
+            [STATS_BY_SCRIPT, LINES_BY_SCRIPT, LINES_FTS], [TEMP_SORT], False),
+        'script.detail_normalized': (
+            engine._script_detail_sql(MODE_NORMALIZED, False, True, False),
+            [STATS_BY_SCRIPT, LINES_BY_SCRIPT], [TEMP_SORT], False),
+        'script.detail_live_counts': (
+            # script_character_stats が無い・古いデータベース（キャラクター数件のソートのみ）
+            engine._script_detail_sql(None, False, False, False),
+            ['SEARCH d USING COVERING INDEX idx_dialogue_lines_character', LINES_BY_SCRIPT], [], False),
+    }
+
+
+def explain(conn, sql):
+    """EXPLAIN QUERY PLAN の結果を、入れ子を字下げで表した行のリストにする"""
+    rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, [None] * sql.count('?')).fetchall()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+def check(plan, expected, forbidden, full_scan):
+    """期待と異なる点のリスト"""
+    problems = []
+    for text in expected:
+        if not any(text in line for line in plan):
+            problems.append(f'missing: {text}')
+    for text in forbidden:
+        if any(text in line for line in plan):
+            problems.append(f'unexpected: {text}')
+    if not full_scan:
+        for line in plan:
+            if FULL_SCAN_PATTERN.match(line.strip()):
+                problems.append(f'full scan: {line.strip()}')
+    return problems
+
+
+def compare(plans, baseline):
+    """保存済みの計画との差分を表示し、変わったクエリの数を返す"""
+    changed = 0
+    for name, plan in plans.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"\n[new] {name}")
+            continue
+        if previous != plan:
+            changed += 1
+            print(f"\n[changed] {name}")
+            for line in difflib.unified_diff(previous, plan, 'baseline', 'current', lineterm='', n=len(plan)):
+                print(line)
+    for name in baseline:
+        if name not in plans:
+            print(f"\n[removed] {name}")
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='エンドポイントのクエリ計画を検査')
+    parser.add_argument('db_path', help='ビルド済みデータベース（generate_corpus.py --build で作成）')
+    parser.add_argument('--save', help='計画を書き出す JSON ファイル')
+    parser.add_argument('--compare', help='比較する保存済みの計画（JSON）')
+    parser.add_argument('--verbose', action='store_true', help='すべての計画を表示')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(f'file:{args.db_path}?mode=ro', uri=True)
+    plans = {}
+    failures = 0
+    for name, (sql, expected, forbidden, full_scan) in plan_cases().items():
+        try:
+            plan = explain(conn, sql)
+            problems = check(plan, expected, forbidden, full_scan)
+        except sqlite3.OperationalError as e:
+            # 列やインデックスが無い（未ビルドのデータベースなど）
+            plan = []
+            problems = [f'error: {e}']
+        plans[name] = plan
+        if problems:
+            failures += 1
+        print(f"{'FAIL' if problems else 'ok':4s} {name}{'  (full scan allowed)' if full_scan else ''}")
+        for problem in problems:
+            print(f"     {problem}")
+        if problems or args.verbose:
+            for line in plan:
+                print(f"       {line}")
+    conn.close()
+
+    print(f"\n{len(plans) - failures}/{len(plans)} plans as expected (SQLite {sqlite3.sqlite_version})")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'sqlite': sqlite3.sqlite_version, 'plans': plans}, f, ensure_ascii=False, indent=2)
+        print(f"Plans written to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('sqlite') != sqlite3.sqlite_version:
+            print(f"Note: baseline was captured with SQLite {baseline.get('sqlite')}")
+        changed = compare(plans, baseline['plans'])
+        print(f"\n{changed} plan(s) changed since baseline")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
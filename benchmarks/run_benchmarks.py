@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""全エンドポイントのレイテンシとスループットを測る
+
+api.py (Flask) の各ルートと api/*.py (Vercel) の各ハンドラーを、ビルド済み
+データベースから作ったクエリの組み合わせ（よく出る語・2文字の語・該当なし・
+キャラクター・テーマ・年・台本名）でプロセス内から呼び出し、p50/p95/p99 と
+スループットを JSON に書き出す。--baseline に保存済みの結果を渡すと比較する。
+
+結果キャッシュは既定で無効にする（SQL の実行時間を測るため）。ETag の
+再検証ヘッダーは送らない。クエリの組み合わせは --seed とデータベースで決まる。
+--allocations を付けると1リクエストあたりのメモリ確保のピークも記録する。
+
+使い方:
+    python benchmarks/generate_corpus.py corpus.db --build
+    python benchmarks/run_benchmarks.py corpus.db --output baseline.json
+    python benchmarks/run_benchmarks.py corpus.db --output after.json --baseline baseline.json
+"""
+
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from email.message import Message
+from urllib.parse import quote, urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_REQUESTS = 200
+DEFAULT_WARMUP = 20
+DEFAULT_SEED = 1
+DEFAULT_THRESHOLD = 0.10
+
+# これより小さい差（ミリ秒）は計測誤差として悪化とみなさない
+MIN_REGRESSION_MS = 0.5
+
+# ヒットしないキーワード
+MISSING_KEYWORDS = ['存在しないキーワード', 'zzzz']
+
+
+def sample_keywords(conn, rng, count):
+    """セリフから切り出した長さの異なるキーワード"""
+    low, high = conn.execute('SELECT MIN(dialogue_id), MAX(dialogue_id) FROM dialogue_lines').fetchone()
+    keywords = []
+    while len(keywords) < count:
+        row = conn.execute(
+            'SELECT dialogue FROM dialogue_lines WHERE dialogue_id = ?', (rng.randint(low, high),)
+        ).fetchone()
+        text = (row[0] or '').strip() if row else ''
+        # 2文字は FTS を使えないフォールバック経路になる
+        length = rng.choice([2, 3, 3, 4, 6])
+        if len(text) < length:
+            continue
+        start = rng.randrange(len(text) - length + 1)
+        keywords.append(text[start:start + length])
+    return keywords + MISSING_KEYWORDS
+
+
+def build_workload(db_path, seed):
+    """エンドポイントごとのリクエスト（パス）のリスト"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    keywords = sample_keywords(conn, rng, 30)
+    characters = [row[0] for row in conn.execute('''
+        SELECT c.name FROM characters c JOIN dialogue_lines d ON d.character_id = c.character_id
+        WHERE c.name != '' GROUP BY c.character_id ORDER BY COUNT(*) DESC LIMIT 8
+    ''')]
+    themes = sorted({
+        theme.strip()
+        for (value,) in conn.execute('SELECT themes FROM scripts WHERE themes IS NOT NULL')
+        for theme in value.split(',') if theme.strip()
+    })
+    years = [row[0] for row in conn.execute(
+        "SELECT DISTINCT substr(release_date, 1, 4) FROM scripts WHERE release_date != '' ORDER BY 1"
+    )]
+    script_names = [row[0] for row in conn.execute('SELECT script_name FROM scripts ORDER BY script_id')]
+    script_names = rng.sample(script_names, min(20, len(script_names)))
+    conn.close()
+
+    def url(path, **params):
+        params = {name: value for name, value in params.items() if value != ''}
+        return path + ('?' + urlencode(params) if params else '')
+
+    return {
+        'flask /api/stats': [url('/api/stats')],
+        'flask /api/characters': [url('/api/characters')],
+        'flask /api/themes': [url('/api/themes')],
+        'flask /api/subjects': [url('/api/subjects')],
+        'flask /api/stats/years': [url('/api/stats/years')],
+        'flask /api/stats/months': [url('/api/stats/months', year=year) for year in years + ['']],
+        'flask /api/search/scripts': [
+            url('/api/search/scripts', q=rng.choice(keywords + [''] * 5), theme=rng.choice(themes + [''] * 4),
+                year=rng.choice(years + [''] * 4))
+            for _ in range(30)
+        ],
+        'flask /api/search/keyword': [url('/api/search/keyword', q=keyword) for keyword in keywords],
+        'flask /api/search/dialogues': [
+            url('/api/search/dialogues', q=rng.choice(keywords), character=rng.choice(characters + [''] * 8))
+            for _ in range(30)
+        ],
+        'flask /api/script/<script_name>': ['/api/script/' + quote(name) for name in script_names],
+        'vercel api/search.py': [url('/api/search', q=keyword) for keyword in keywords],
+        'vercel api/stats.py': [url('/api/stats')],
+        'vercel api/script_detail.py': [
+            url('/api/script_detail', script_name=name, keyword=rng.choice(keywords + [''] * 10))
+            for name in script_names
+        ],
+        # 既存のワークロードの乱数列を変えないよう最後に生成する
+        'flask /api/search/scripts (dates)': [
+            url('/api/search/scripts', date_from=f'{year}-{rng.randint(1, 12):02d}', date_to=rng.choice(years[years.index(year):]))
+            for year in rng.choices(years, k=30)
+        ],
+    }
+
+
+def flask_caller(db_path):
+    """api.py のルートを呼び出す関数"""
+    import api
+    api.DB_PATH = db_path
+    client = api.app.test_client()
+
+    def call(path):
+        response = client.get(path)
+        body = response.get_data()  # ストリーミングのレスポンスも最後まで読む
+        response.close()
+        return response.status_code, len(body)
+
+    return call
+
+
+def vercel_caller(filename):
+    """api/*.py のハンドラーを呼び出す関数（ソケットを使わずに do_GET を実行）"""
+    path = os.path.join(ROOT, 'api', filename)
+    spec = importlib.util.spec_from_file_location('bench_' + filename[:-3], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    def call(path):
+        handler = module.handler.__new__(module.handler)
+        handler.path = path
+        handler.headers = Message()
+        handler.wfile = io.BytesIO()
+        handler.request_version = 'HTTP/1.1'
+        handler.requestline = f'GET {path} HTTP/1.1'
+        handler.command = 'GET'
+        handler.client_address = ('127.0.0.1', 0)
+        handler.log_request = lambda *args, **kwargs: None
+        handler.do_GET()
+        response = handler.wfile.getvalue()
+        return int(response.split(b' ', 2)[1]), len(response)
+
+    return call
+
+
+def percentile(sorted_values, p):
+    """最近傍順位法によるパーセンタイル"""
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def measure(call, paths, requests, warmup, rng):
+    """paths をシャッフルして順に呼び出し、統計を返す"""
+    order = [paths[i % len(paths)] for i in range(requests)]
+    rng.shuffle(order)
+
+    for path in order[:warmup]:
+        call(path)
+
+    latencies = []
+    errors = 0
+    response_bytes = 0
+    start = time.perf_counter()
+    for path in order:
+        begin = time.perf_counter()
+        status, size = call(path)
+        latencies.append(time.perf_counter() - begin)
+        if status >= 400 and status != 404:
+            errors += 1
+        response_bytes += size
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'throughput_rps': requests / elapsed,
+        'avg_response_bytes': response_bytes // requests
+    }
+
+
+def measure_allocations(call, paths):
+    """1リクエストあたりのメモリ確保のピーク (KiB) を tracemalloc で測る
+
+    計測中は遅くなるので、レイテンシとは別に各パスを1回ずつ呼び出す。
+    """
+    peaks = []
+    tracemalloc.start()
+    try:
+        for path in paths:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            call(path)
+            peaks.append((tracemalloc.get_traced_memory()[1] - current) / 1024)
+    finally:
+        tracemalloc.stop()
+    return {
+        'alloc_peak_kib': statistics.mean(peaks),
+        'alloc_peak_kib_max': max(peaks)
+    }
+
+
+def corpus_info(db_path):
+    """結果に記録するデータベースの情報"""
+    conn = sqlite3.connect(db_path)
+    info = {
+        'db_path': os.path.abspath(db_path),
+        'db_bytes': os.path.getsize(db_path),
+        'scripts': conn.execute('SELECT COUNT(*) FROM scripts').fetchone()[0],
+        'dialogue_lines': conn.execute('SELECT COUNT(*) FROM dialogue_lines').fetchone()[0]
+    }
+    conn.close()
+    return info
+
+
+def compare(results, baseline, threshold):
+    """ベースラインとの比較を表示し、悪化したエンドポイント名を返す"""
+    regressions = []
+    print(f"\n{'endpoint':34s} {'p50':>19s} {'p95':>19s} {'p99':>19s} {'rps':>16s}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:34s} (ベースラインなし)")
+            continue
+
+        cells = []
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            change = current[metric] / previous[metric] - 1 if previous[metric] else 0.0
+            cells.append(f"{previous[metric]:7.2f}→{current[metric]:7.2f}{change:+5.0%}".rjust(18))
+        rps_change = current['throughput_rps'] / previous['throughput_rps'] - 1
+        cells.append(f"{current['throughput_rps']:8.1f}{rps_change:+5.0%}".rjust(16))
+        if 'alloc_peak_kib' in current and 'alloc_peak_kib' in previous:
+            cells.append(f"alloc {previous['alloc_peak_kib']:.0f}→{current['alloc_peak_kib']:.0f}KiB")
+
+        # p50 と p95 の両方が閾値を超えて遅くなったものを悪化とみなす（外れ値対策）
+        regressed = all(
+            current[metric] > previous[metric] * (1 + threshold)
+            and current[metric] - previous[metric] > MIN_REGRESSION_MS
+            for metric in ('p50_ms', 'p95_ms')
+        )
+        if regressed:
+            regressions.append(name)
+        print(f"{name:34s} {' '.join(cells)}{'  REGRESSION' if regressed else ''}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='全エンドポイントのレイテンシとスループットを測る')
+    parser.add_argument('db_path', help='ビルド済みデータベース（generate_corpus.py --build で作成）')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='エンドポイントごとのリクエスト数')
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP, help='計測前に捨てるリクエスト数')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='クエリの組み合わせを決める乱数シード')
+    parser.add_argument('--only', default='', help='名前にこの文字列を含むエンドポイントだけ測る')
+    parser.add_argument('--result-cache', action='store_true', help='結果キャッシュを有効のまま測る')
+    parser.add_argument('--allocations', action='store_true',
+                        help='1リクエストあたりのメモリ確保のピークも測る（tracemalloc）')
+    parser.add_argument('--output', help='結果を書き出す JSON ファイル')
+    parser.add_argument('--baseline', help='比較するベースラインの JSON ファイル')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='悪化とみなす p50/p95 の増加率（既定 0.10）')
+    args = parser.parse_args()
+
+    # ハンドラーの読み込み前に設定する（結果キャッシュとダウンロード先）
+    if not args.result_cache:
+        os.environ['SUNSUN_RESULT_CACHE_BYTES'] = '0'
+    os.environ['SUNSUN_DB_PATH'] = os.path.abspath(args.db_path)
+    # リクエストごとの計測ログは出さない（SUNSUN_TIMING=1 を指定すれば計測込みで測れる）
+    os.environ.setdefault('SUNSUN_TIMING', '0')
+
+    workload = build_workload(args.db_path, args.seed)
+    callers = {}
+    results = {}
+    for name, paths in workload.items():
+        if args.only not in name:
+            continue
+
+        target = name.split(' ', 1)[1]
+        if name.startswith('flask'):
+            if 'flask' not in callers:
+                callers['flask'] = flask_caller(args.db_path)
+            call = callers['flask']
+        else:
+            call = vercel_caller(os.path.basename(target))
+
+        stats = measure(call, paths, args.requests, args.warmup, random.Random(args.seed))
+        if args.allocations:
+            stats.update(measure_allocations(call, paths))
+        results[name] = stats
+        print(
+            f"{name:34s} p50 {stats['p50_ms']:7.2f}ms  p95 {stats['p95_ms']:7.2f}ms  "
+            f"p99 {stats['p99_ms']:7.2f}ms  {stats['throughput_rps']:8.1f} req/s"
+            + (f"  alloc {stats['alloc_peak_kib']:7.1f}KiB" if args.allocations else '')
+            + (f"  errors {stats['errors']}" if stats['errors'] else '')
+        )
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'corpus': corpus_info(args.db_path),
+        'settings': {
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'result_cache': args.result_cache,
+            'allocations': args.allocations
+        },
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} endpoint(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""接続プロファイル別の全件スキャン性能を比較する
+
+デフォルト設定の接続と配信用プロファイル（mmap・大きめのキャッシュ・
+temp_store=MEMORY）の接続で、LIKE による検索クエリ（全件スキャン）を実行し、
+1回あたりの時間と行/秒を表示する。ページサイズの効果を見るには
+`--page-size` を変えてビルドした複数のデータベースを渡す。
+
+使い方:
+    python benchmarks/scan_profile.py serving_4k.db serving_16k.db
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sunsun_db.pool import apply_serving_profile
+
+# 検索エンドポイントの LIKE フォールバック（2文字のキーワード）と同じ形のクエリ
+QUERIES = {
+    'keyword_like': '''
+        SELECT d.script_id, COUNT(*)
+        FROM dialogue_lines d
+        JOIN scripts s ON s.script_id = d.script_id
+        WHERE (d.dialogue LIKE ? OR s.script_name LIKE ? OR s.youtube_title LIKE ?
+               OR s.themes LIKE ? OR s.subjects LIKE ?)
+        AND d.dialogue IS NOT NULL AND d.dialogue != ""
+        GROUP BY d.script_id
+    ''',
+    'dialogue_like': '''
+        SELECT COUNT(*) FROM dialogue_lines d
+        WHERE d.dialogue LIKE ? AND d.dialogue IS NOT NULL AND d.dialogue != ""
+    ''',
+}
+
+
+def open_connection(db_path, profile):
+    """プロファイルを指定して読み取り専用で開く"""
+    uri = f'file:{quote(os.path.abspath(db_path))}?mode=ro&immutable=1'
+    conn = sqlite3.connect(uri, uri=True)
+    if profile == 'serving':
+        apply_serving_profile(conn, db_path)
+    return conn
+
+
+def run(db_path, profile, keyword, repeat):
+    """各クエリを repeat 回実行して結果を返す"""
+    conn = open_connection(db_path, profile)
+    total_rows = conn.execute('SELECT COUNT(*) FROM dialogue_lines').fetchone()[0]
+    param = f'%{keyword}%'
+
+    results = {}
+    for name, sql in QUERIES.items():
+        params = [param] * sql.count('?')
+        conn.execute(sql, params).fetchall()  # ウォームアップ
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            times.append(time.perf_counter() - start)
+        median = statistics.median(times)
+        results[name] = (median, total_rows / median)
+
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='接続プロファイル別の全件スキャン性能')
+    parser.add_argument('db_paths', nargs='+', help='ビルド済みデータベース')
+    parser.add_argument('--keyword', default='ママ', help='検索キーワード')
+    parser.add_argument('--repeat', type=int, default=10, help='繰り返し回数')
+    args = parser.parse_args()
+
+    for db_path in args.db_paths:
+        conn = sqlite3.connect(db_path)
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        conn.close()
+        print(f"\n=== {db_path} (page_size={page_size}, {os.path.getsize(db_path) / 1024 / 1024:.1f}MB) ===")
+
+        baseline = run(db_path, 'default', args.keyword, args.repeat)
+        serving = run(db_path, 'serving', args.keyword, args.repeat)
+        for name in QUERIES:
+            base_time, base_rate = baseline[name]
+            serve_time, serve_rate = serving[name]
+            print(
+                f"{name:15s} default {base_time * 1000:8.2f}ms ({base_rate:,.0f} rows/s)  "
+                f"serving {serve_time * 1000:8.2f}ms ({serve_rate:,.0f} rows/s)  "
+                f"x{base_time / serve_time:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,11 @@ import re
 import sys
 import os
 
+from sunsun_db.dates import refresh_release_dates
+from sunsun_db.normalize import refresh_normalized_text
+from sunsun_db.schema import update_script_column
+from sunsun_db.stats import write_stats_cache
+
 def extract_management_id_from_name(script_name):
     """台本名から管理番号を抽出（より広範囲に対応）"""
     # B1234, A01, E01, F002, H001, PK-002等に対応
@@ -95,7 +100,7 @@ def update_database_comprehensive(db_path, url_mapping):
     cursor.execute("SELECT DISTINCT script_name FROM dialogues")
     scripts = cursor.fetchall()
     
-    updated_count = 0
+    updates = []
     matched_count = 0
     matched_scripts = []
     
@@ -107,16 +112,11 @@ def update_database_comprehensive(db_path, url_mapping):
             matched_count += 1
             matched_scripts.append((management_id, script_name, script_url))
             
-            # script_urlを更新
-            cursor.execute("""
-                UPDATE dialogues 
-                SET script_url = ? 
-                WHERE script_name = ?
-            """, (script_url, script_name))
-            
-            updated_count += cursor.rowcount
+            updates.append((script_name, script_url))
             print(f"Updated {script_name}: {script_url[:60]}...")
     
+    # script_urlを更新（台本1件につき1回）
+    updated_count = update_script_column(conn, 'script_url', updates)
     conn.commit()
     
     # 更新結果を確認
@@ -126,6 +126,11 @@ def update_database_comprehensive(db_path, url_mapping):
     cursor.execute("SELECT COUNT(DISTINCT script_name) FROM dialogues")
     total_scripts = cursor.fetchone()[0]
     
+    # 検索用の正規化列・公開日の列と統計スナップショットを更新
+    refresh_normalized_text(conn)
+    refresh_release_dates(conn)
+    write_stats_cache(conn)
+    
     conn.close()
     
     print(f"\n=== Comprehensive Update Summary ===")
@@ -7,6 +7,11 @@ import re
 import sys
 import os
 
+from sunsun_db.dates import refresh_release_dates
+from sunsun_db.normalize import refresh_normalized_text
+from sunsun_db.schema import update_script_column
+from sunsun_db.stats import write_stats_cache
+
 def extract_script_id_from_name(script_name):
     """台本名から管理番号を抽出"""
     match = re.match(r'^(B\d+)', script_name)
@@ -105,7 +110,7 @@ def update_database_with_urls(db_path, url_mapping):
     cursor.execute("SELECT DISTINCT script_name FROM dialogues")
     scripts = cursor.fetchall()
     
-    updated_count = 0
+    updates = []
     matched_count = 0
     matched_scripts = []
     
@@ -117,22 +122,22 @@ def update_database_with_urls(db_path, url_mapping):
             matched_count += 1
             matched_scripts.append((management_id, script_name, script_url))
             
-            # script_urlを更新
-            cursor.execute("""
-                UPDATE dialogues 
-                SET script_url = ? 
-                WHERE script_name = ?
-            """, (script_url, script_name))
-            
-            updated_count += cursor.rowcount
+            updates.append((script_name, script_url))
             print(f"Updated {script_name}: {script_url[:60]}...")
     
+    # script_urlを更新（台本1件につき1回）
+    updated_count = update_script_column(conn, 'script_url', updates)
     conn.commit()
     
     # 更新結果を確認
     cursor.execute("SELECT COUNT(DISTINCT script_name) FROM dialogues WHERE script_url IS NOT NULL AND script_url != ''")
     total_with_urls = cursor.fetchone()[0]
     
+    # 検索用の正規化列・公開日の列と統計スナップショットを更新
+    refresh_normalized_text(conn)
+    refresh_release_dates(conn)
+    write_stats_cache(conn)
+    
     conn.close()
     
     print(f"\n=== Update Summary ===")
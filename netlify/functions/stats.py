@@ -1,50 +1,13 @@
 import json
-import sqlite3
-import urllib.request
-import tempfile
 import os
-import ssl
+import sys
 
-# Dropbox直接ダウンロードURL
-DROPBOX_URL = 'https://www.dropbox.com/scl/fi/dljhp6xzshdgvq7vqk3sz/sunsun_final_dialogue_database_proper.db?rlkey=qlf38ydm1b0n0ocsdbpjx0ih8&st=2h1nmfhq&dl=1'
+# 共通モジュール (sunsun_db) をリポジトリ直下から読み込む
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-# データベース一時ファイル
-db_path = None
-
-def download_database():
-    """Dropboxからデータベースファイルをダウンロード"""
-    global db_path
-    
-    if db_path and os.path.exists(db_path):
-        return db_path
-    
-    try:
-        # 一時ファイルを作成
-        temp_fd, db_path = tempfile.mkstemp(suffix='.db')
-        os.close(temp_fd)
-        
-        # SSL証明書検証をスキップ
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
-        opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
-        urllib.request.install_opener(opener)
-        
-        urllib.request.urlretrieve(DROPBOX_URL, db_path)
-        
-        return db_path
-        
-    except Exception as e:
-        print(f"Error downloading database: {e}")
-        raise
-
-def get_db_connection():
-    """データベース接続を取得"""
-    db_file = download_database()
-    conn = sqlite3.connect(db_file)
-    conn.row_factory = sqlite3.Row
-    return conn
+from sunsun_db import engine, serialize
+from sunsun_db.serverless import check_etag, get_db_connection, not_modified_response
+from sunsun_db.timing import start_timer
 
 def main(event, context):
     """Netlify Function handler"""
@@ -66,33 +29,39 @@ def main(event, context):
     
     # Handle GET request
     if event['httpMethod'] == 'GET':
+        timer = start_timer('stats')
         try:
-            # データベース統計を取得
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # 基本統計
-            cursor.execute('SELECT COUNT(DISTINCT script_name) as total_scripts FROM dialogues')
-            total_scripts = cursor.fetchone()['total_scripts']
+            # データの版とパラメータが同じなら 304 を返す（SQL は実行しない）
+            if_none_match = (event.get('headers') or {}).get('if-none-match')
+            etag_headers, not_modified = check_etag(timer, 'stats', {}, if_none_match)
+            if not_modified:
+                return not_modified_response(headers, etag_headers, timer)
             
-            cursor.execute('SELECT COUNT(*) as total_dialogues FROM dialogues')
-            total_dialogues = cursor.fetchone()['total_dialogues']
-            
-            conn.close()
+            # データベース統計を取得
+            conn = get_db_connection(timer)
+            try:
+                with timer.phase('query'):
+                    stats = engine.get_stats(conn)
+            finally:
+                conn.close()
             
             response = {
                 'success': True,
                 'data': {
-                    'total_scripts': total_scripts,
-                    'total_dialogues': total_dialogues,
+                    'total_scripts': stats['total_scripts'],
+                    'total_dialogues': stats['total_dialogues'],
                     'status': 'Database loaded successfully'
                 }
             }
             
+            with timer.phase('serialize'):
+                body = serialize.dumps(response).decode()
+            
+            timer.log(200)
             return {
                 'statusCode': 200,
-                'headers': headers,
-                'body': json.dumps(response)
+                'headers': {**headers, **etag_headers, **timer.headers()},
+                'body': body
             }
             
         except Exception as e:
@@ -102,6 +71,7 @@ def main(event, context):
                 'error': str(e)
             }
             
+            timer.log(500)
             return {
                 'statusCode': 500,
                 'headers': headers,
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""API サーバーの本番用の起動スクリプト（セルフホスト向け）
+
+api.py の Flask アプリを sunsun_db.asgi で ASGI アプリにして uvicorn で配信する。
+SQLite の呼び出しは上限付きのスレッドプールで実行され、/api/stats や /api/characters は
+専用のスレッドで処理されるので、重いキーワード検索が続いても待たされない。
+
+    pip install uvicorn
+    python serve.py --db serving.db --workers 4 --threads 8 --fast-threads 2
+    python serve.py --route-limit /api/search/keyword=1  # ルートごとの同時実行数
+
+ASGI サーバーを直接使う場合は環境変数で設定する:
+    SUNSUN_DB_PATH=serving.db SUNSUN_THREADS=8 uvicorn serve:app --workers 4
+    SUNSUN_DB_PATH=serving.db gunicorn -w 4 -k uvicorn.workers.UvicornWorker serve:app
+"""
+
+import argparse
+import os
+import sys
+
+try:
+    import uvicorn
+except ImportError:  # serve:app は他の ASGI サーバーでも使えるので必須にしない
+    uvicorn = None
+
+import api
+from sunsun_db.asgi import DEFAULT_FAST_THREADS, DEFAULT_THREADS, LaneDispatcher, parse_route_limits
+from sunsun_db.pool import get_pool
+
+if os.environ.get('SUNSUN_DB_PATH'):
+    api.DB_PATH = os.environ['SUNSUN_DB_PATH']
+
+app = LaneDispatcher.from_environ(api.app)
+
+# すべてのスレッドが同時に接続を使うので、その数だけ接続をプールに残す
+pool = get_pool(api.DB_PATH)
+pool.max_idle = max(pool.max_idle, app.total_threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API サーバーを ASGI (uvicorn) で起動')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=1, help='プロセス数（既定: 1）')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS,
+                        help=f'プロセスごとの SQLite 用スレッド数（既定: {DEFAULT_THREADS}）')
+    parser.add_argument('--fast-threads', type=int, default=DEFAULT_FAST_THREADS,
+                        help=f'軽いエンドポイント専用のスレッド数（既定: {DEFAULT_FAST_THREADS}）')
+    parser.add_argument('--route-limit', action='append', default=[], metavar='PATH=N',
+                        help='ルートごとの同時実行数（例: /api/search/keyword=2、複数指定可）')
+    parser.add_argument('--db', help='データベースファイル（既定: api.DB_PATH）')
+    args = parser.parse_args()
+
+    if args.threads < 1 or args.fast_threads < 1 or args.workers < 1:
+        parser.error('--workers, --threads and --fast-threads must be at least 1')
+    try:
+        parse_route_limits(','.join(args.route_limit))
+    except ValueError as e:
+        parser.error(str(e))
+
+    if uvicorn is None:
+        print("uvicorn is not installed: pip install uvicorn")
+        sys.exit(1)
+
+    # ワーカープロセスは serve:app を読み込み直すので、設定は環境変数で渡す
+    os.environ['SUNSUN_THREADS'] = str(args.threads)
+    os.environ['SUNSUN_FAST_THREADS'] = str(args.fast_threads)
+    if args.route_limit:
+        os.environ['SUNSUN_ROUTE_LIMITS'] = ','.join(args.route_limit)
+    if args.db:
+        os.environ['SUNSUN_DB_PATH'] = os.path.abspath(args.db)
+
+    print(f"Serving on {args.host}:{args.port}: {args.workers} workers x "
+          f"{args.threads} threads + {args.fast_threads} fast threads")
+    uvicorn.run('serve:app', host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
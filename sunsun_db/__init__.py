@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""サンサンキッズTV台本データベースの共通モジュール
+
+Flask API (api.py)・Vercel (api/*.py)・Netlify (netlify/functions/*.py) の
+各ハンドラから共通で利用する。
+"""
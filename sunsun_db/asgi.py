@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Flask アプリを ASGI で配信するためのディスパッチャ
+
+api.py の Flask アプリ (WSGI) をそのまま ASGI アプリとして公開する。
+ルートの処理（SQLite の呼び出しを含む）はイベントループではなくスレッドで実行し、
+
+- 軽いエンドポイント（集計済みの表を読むだけ: /api/stats, /api/characters など）は
+  専用のスレッド（fast lane）で処理するので、重い検索の後ろに並ばない
+- それ以外は上限付きのスレッドプールで処理し、ルートごとに同時実行数を制限する
+  （LIKE で全件を読む /api/search/keyword が全スレッドを占有しない）
+- 上限に達したルートのリクエストはスレッドを使わずにイベントループ上で待つ
+
+ストリーミングのレスポンスはワーカースレッドから1チャンクずつ送信する
+（送信が終わるまで次のチャンクを読まない）。
+
+スレッド数などは環境変数でも指定できる（ASGI サーバーの各ワーカープロセスで同じ設定になる）:
+    SUNSUN_THREADS=8 SUNSUN_FAST_THREADS=2 SUNSUN_ROUTE_LIMITS=/api/search/keyword=2
+
+起動はリポジトリ直下の serve.py を参照。
+"""
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# 通常のスレッドプールと fast lane のスレッド数
+DEFAULT_THREADS = 8
+DEFAULT_FAST_THREADS = 2
+
+# fast lane で処理するルート（前方一致）
+FAST_ROUTES = (
+    '/api/stats',
+    '/api/characters',
+    '/api/themes',
+    '/api/subjects',
+    '/api/cache',
+)
+
+# ルートごとの同時実行数の上限（前方一致、スレッド数を超える値はスレッド数になる）
+DEFAULT_ROUTE_LIMITS = {
+    '/api/search/keyword': 2,
+    '/api/search/dialogues': 4,
+    '/api/search/scripts': 4,
+    '/api/script': 4,
+}
+
+
+def parse_route_limits(value):
+    """'/api/search/keyword=2,/api/search/dialogues=4' を dict にする（不正な値は ValueError）"""
+    limits = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        route, sep, limit = item.partition('=')
+        if not sep or not route.strip().startswith('/') or not limit.strip().isdigit() or int(limit) < 1:
+            raise ValueError(f'invalid route limit: {item.strip()} (expected /path=N)')
+        limits[route.strip().rstrip('/')] = int(limit)
+    return limits
+
+
+def match_route(path, routes):
+    """path に前方一致する最も長いルート（'/api/stats' は '/api/stats/years' にも一致する）"""
+    matched = None
+    for route in routes:
+        if (path == route or path.startswith(route + '/')) and (matched is None or len(route) > len(matched)):
+            matched = route
+    return matched
+
+
+def wsgi_environ(scope, body):
+    """ASGI の HTTP スコープから WSGI の environ を作る"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI ではパスを latin-1 の文字列として渡す
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        key = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+class LaneDispatcher:
+    """WSGI アプリをスレッドで実行する ASGI アプリ"""
+
+    def __init__(self, wsgi_app, threads=DEFAULT_THREADS, fast_threads=DEFAULT_FAST_THREADS,
+                 route_limits=None, fast_routes=FAST_ROUTES):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.fast_threads = fast_threads
+        self.fast_routes = tuple(route.rstrip('/') for route in fast_routes)
+        limits = DEFAULT_ROUTE_LIMITS if route_limits is None else route_limits
+        self.route_limits = {route: min(limit, threads) for route, limit in limits.items()}
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='sunsun-db')
+        self.fast_executor = ThreadPoolExecutor(fast_threads, thread_name_prefix='sunsun-db-fast')
+        # asyncio.Semaphore はイベントループの中で作る (Python 3.9)
+        self._semaphores = None
+
+    @classmethod
+    def from_environ(cls, wsgi_app):
+        """環境変数 SUNSUN_THREADS / SUNSUN_FAST_THREADS / SUNSUN_ROUTE_LIMITS の設定で作る"""
+        route_limits = None
+        if os.environ.get('SUNSUN_ROUTE_LIMITS'):
+            route_limits = dict(DEFAULT_ROUTE_LIMITS, **parse_route_limits(os.environ['SUNSUN_ROUTE_LIMITS']))
+        return cls(
+            wsgi_app,
+            threads=int(os.environ.get('SUNSUN_THREADS', DEFAULT_THREADS)),
+            fast_threads=int(os.environ.get('SUNSUN_FAST_THREADS', DEFAULT_FAST_THREADS)),
+            route_limits=route_limits
+        )
+
+    @property
+    def total_threads(self):
+        return self.threads + self.fast_threads
+
+    def lane(self, path):
+        """(実行するスレッドプール, 同時実行数を制限するルート) を返す"""
+        if match_route(path, self.fast_routes):
+            return self.fast_executor, None
+        return self.executor, match_route(path, self.route_limits)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        self.fast_executor.shutdown(wait=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"unsupported scope type: {scope['type']}")
+
+        body = await self._read_body(receive)
+        environ = wsgi_environ(scope, body)
+        executor, route = self.lane(scope['path'])
+        loop = asyncio.get_running_loop()
+
+        if route is None:
+            await loop.run_in_executor(executor, self._run_wsgi, environ, send, loop)
+            return
+
+        if self._semaphores is None:
+            self._semaphores = {name: asyncio.Semaphore(limit) for name, limit in self.route_limits.items()}
+        async with self._semaphores[route]:
+            await loop.run_in_executor(executor, self._run_wsgi, environ, send, loop)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        return b''.join(chunks)
+
+    def _run_wsgi(self, environ, send, loop):
+        """ワーカースレッドで WSGI アプリを呼び、レスポンスをイベントループ経由で送る"""
+        def call(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ]
+            return write
+
+        def start():
+            if not response.get('started'):
+                response['started'] = True
+                call({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+
+        def write(chunk):
+            start()
+            call({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                if chunk:
+                    write(chunk)
+            start()
+            call({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            # Flask の call_on_close（接続の返却など）はここで呼ばれる
+            if hasattr(result, 'close'):
+                result.close()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""配信用データベースのビルド
+
+使い方:
+    python -m sunsun_db.build sunsun_final_dialogue_database.db
+    python -m sunsun_db.build source.db -o serving.db
+    python -m sunsun_db.build source.db -o serving.db --manifest db_manifest.json --compress gzip
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+from sunsun_db.characters import build_characters
+from sunsun_db.dates import add_release_dates
+from sunsun_db.fts import build_fts_index
+from sunsun_db.indexes import analyze, create_indexes, report_index_sizes
+from sunsun_db.normalize import add_normalized_text
+from sunsun_db.provision import COMPRESSION_EXTENSIONS, compress_database, write_manifest
+from sunsun_db.schema import create_version_tracking, normalize_schema
+from sunsun_db.stats import write_stats_cache
+
+
+def run_step(name, func, conn):
+    """ビルドステップを実行して所要時間を表示"""
+    start = time.time()
+    print(f"[{name}] start")
+    func(conn)
+    print(f"[{name}] done ({time.time() - start:.2f}s)")
+
+
+# 配信用のページサイズ（全件スキャンや FTS の読み込みは大きいページの方が速い）
+DEFAULT_PAGE_SIZE = 16384
+
+
+def vacuum(conn, page_size=DEFAULT_PAGE_SIZE):
+    """不要領域を解放し、ページサイズを変更してファイルを詰め直す"""
+    if conn.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal':
+        # WAL モードではページサイズを変更できない
+        conn.execute('PRAGMA journal_mode = DELETE')
+    conn.execute(f'PRAGMA page_size = {int(page_size)}')
+    conn.execute('VACUUM')
+    print(f"Page size: {conn.execute('PRAGMA page_size').fetchone()[0]}")
+
+
+def build_database(db_path, output_path=None, manifest_path=None, compression=None,
+                   page_size=DEFAULT_PAGE_SIZE):
+    """データベースを正規化し、検索用の構造を追加する
+
+    output_path を指定した場合は元ファイルをコピーしてから処理する。
+    最後に配信用のマニフェスト（SHA-256 とサイズ）を書き出す。
+    compression を指定すると配信用の圧縮ファイルも作成する。
+    """
+    if not os.path.exists(db_path):
+        print(f"Database not found: {db_path}")
+        return False
+
+    if output_path:
+        shutil.copyfile(db_path, output_path)
+        db_path = output_path
+
+    run_build_steps(db_path, page_size)
+
+    compressed_path = compress_database(db_path, compression) if compression else None
+    write_manifest(db_path, manifest_path, compressed_path=compressed_path, compression=compression)
+
+    return True
+
+
+def run_build_steps(db_path, page_size=DEFAULT_PAGE_SIZE):
+    """db_path をその場で正規化し、検索用の構造を追加する（マニフェストは書かない）"""
+    size_before = os.path.getsize(db_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        run_step('normalize', normalize_schema, conn)
+        run_step('version', create_version_tracking, conn)
+        run_step('characters', build_characters, conn)
+        run_step('dates', add_release_dates, conn)
+        run_step('indexes', create_indexes, conn)
+        run_step('text', add_normalized_text, conn)
+        run_step('fts', build_fts_index, conn)
+        run_step('stats', write_stats_cache, conn)
+        run_step('analyze', analyze, conn)
+        run_step('vacuum', lambda c: vacuum(c, page_size), conn)
+        report_index_sizes(conn)
+    finally:
+        conn.close()
+
+    size_after = os.path.getsize(db_path)
+    print(f"Database size: {size_before / 1024 / 1024:.1f}MB -> {size_after / 1024 / 1024:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='配信用データベースのビルド')
+    parser.add_argument('db_path', help='SQLite データベースファイル')
+    parser.add_argument('-o', '--output', help='出力先（省略時は上書き）')
+    parser.add_argument('--manifest', help='マニフェストの出力先（省略時は <db>.manifest.json）')
+    parser.add_argument('--compress', choices=sorted(COMPRESSION_EXTENSIONS), help='配信用の圧縮ファイルを作成')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='ページサイズ (bytes)')
+    args = parser.parse_args()
+
+    if not build_database(args.db_path, args.output, args.manifest, args.compress, args.page_size):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
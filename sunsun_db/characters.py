@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""キャラクター表の集約
+
+characters テーブルに、表記ゆれをまとめた正式名・別名の一覧と、
+セリフ数・登場台本数を持たせる。/api/characters はこの表を読むだけになり、
+リクエストごとに dialogue_lines を集計しない。
+
+- 別名: normalize_text() で同じになる名前（全角/半角、カタカナ/ひらがな、
+  大文字/小文字の違い）を1人にまとめ、セリフの多い表記を正式名にする。
+  残りの表記は aliases 列（JSON 配列）に入り、セリフの character_id は
+  正式名の ID に付け替える
+- 件数: dialogue_count / script_count。stats_cache と同じく ETL の最後にも
+  更新し、保存時の data_version が現在値と異なる場合は古いとみなす
+
+互換ビュー dialogues のトリガーも別名を正式名の ID に変換するので、ETL で
+既知の別名の表記のセリフが追加されても同じキャラクターになる。まだ無い表記の
+ゆれは一旦別のキャラクターになり、次のビルドでまとめ直される。
+"""
+
+import json
+import sqlite3
+
+from sunsun_db.normalize import normalize_text
+from sunsun_db.schema import create_compat_triggers, is_derived_current, is_normalized, mark_derived_current
+
+# 追加する列: 型
+CHARACTER_COLUMNS = {
+    'aliases': 'TEXT',
+    'dialogue_count': 'INTEGER',
+    'script_count': 'INTEGER',
+}
+
+
+def add_character_columns(conn):
+    """characters に別名・件数の列を追加する"""
+    existing = [row[1] for row in conn.execute('PRAGMA table_info(characters)')]
+    for column, column_type in CHARACTER_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f'ALTER TABLE characters ADD COLUMN {column} {column_type}')
+    conn.commit()
+
+
+def merge_character_aliases(conn):
+    """表記ゆれのキャラクターを正式名にまとめる"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT c.character_id, c.name, c.aliases, COUNT(d.dialogue_id) AS dialogue_count
+        FROM characters c
+        LEFT JOIN dialogue_lines d ON d.character_id = c.character_id
+        GROUP BY c.character_id
+        ORDER BY dialogue_count DESC, c.character_id
+    ''')
+    groups = {}
+    for character_id, name, aliases, _ in cursor.fetchall():
+        groups.setdefault(normalize_text(name), []).append((character_id, name, aliases))
+
+    merged = 0
+    for members in groups.values():
+        # 先頭（セリフが最も多い表記）を正式名にする
+        canonical_id, canonical_name, _ = members[0]
+        aliases = set()
+        for character_id, name, previous in members:
+            aliases.update(json.loads(previous) if previous else [])
+            if character_id != canonical_id:
+                aliases.add(name)
+                cursor.execute(
+                    'UPDATE dialogue_lines SET character_id = ? WHERE character_id = ?',
+                    (canonical_id, character_id)
+                )
+                cursor.execute('DELETE FROM characters WHERE character_id = ?', (character_id,))
+                merged += 1
+        aliases.discard(canonical_name)
+        cursor.execute(
+            'UPDATE characters SET aliases = ? WHERE character_id = ?',
+            (json.dumps(sorted(aliases), ensure_ascii=False), canonical_id)
+        )
+    conn.commit()
+
+    print(f"Characters: {len(groups)} ({merged} aliases merged)")
+
+
+def build_characters(conn):
+    """列を追加して別名をまとめる（件数は write_character_counts で更新）"""
+    add_character_columns(conn)
+    merge_character_aliases(conn)
+    if is_normalized(conn):
+        # 互換ビュー経由の INSERT/UPDATE でも別名を正式名の ID に変換する
+        create_compat_triggers(conn, aliases=True)
+        conn.commit()
+
+
+def write_character_counts(conn):
+    """キャラクターごとのセリフ数・登場台本数を保存する
+
+    characters の更新で data_version が進むので、data_version を記録する
+    他の派生データより先に実行する。
+    """
+    add_character_columns(conn)
+
+    cursor = conn.cursor()
+    # (character_id, script_id, row_number) のインデックスだけで数えられる
+    cursor.execute('''
+        SELECT character_id, COUNT(*), COUNT(DISTINCT script_id)
+        FROM dialogue_lines
+        WHERE character_id IS NOT NULL
+        GROUP BY character_id
+    ''')
+    counts = cursor.fetchall()
+    cursor.execute('UPDATE characters SET dialogue_count = 0, script_count = 0')
+    cursor.executemany(
+        'UPDATE characters SET dialogue_count = ?, script_count = ? WHERE character_id = ?',
+        [(dialogue_count, script_count, character_id) for character_id, dialogue_count, script_count in counts]
+    )
+    mark_derived_current(conn, 'character_counts')
+    conn.commit()
+
+    print(f"Character counts updated: {len(counts)} characters")
+
+
+def has_character_counts(conn):
+    """characters の件数が現在のデータと一致しているか"""
+    return is_derived_current(conn, 'character_counts')
+
+
+def find_character_id(conn, name):
+    """正式名または別名からキャラクター ID を引く（無ければ None）"""
+    row = conn.execute('SELECT character_id FROM characters WHERE name = ?', (name,)).fetchone()
+    if row is None:
+        try:
+            row = conn.execute('''
+                SELECT c.character_id
+                FROM characters c, json_each(c.aliases) a
+                WHERE a.value = ?
+            ''', (name,)).fetchone()
+        except sqlite3.OperationalError:
+            # 別名の列が無い（ビルド前の）データベース
+            row = None
+    return row[0] if row else None
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""公開日の型付き列
+
+scripts.release_date は自由入力の文字列（'2021-07-06'、'2021/7/6'、
+'2021年7月6日'、YouTube の '2021-07-06T10:00:00Z' など）なので、
+年での絞り込みや年別の集計にインデックスが使えない。ビルド時に解析して
+以下の列に保存する。
+
+- release_date_iso: ISO 形式の日付 ('YYYY-MM-DD')。日が無ければ NULL
+- release_year / release_month: 整数の年・月（年月だけの値でも入る）
+
+解析できなかった値はビルドのログに台本名とともに表示する（列は NULL のまま）。
+release_date が更新されるとトリガーで列が NULL に戻り、ETL スクリプトの最後に
+refresh_release_dates() で再計算される。
+"""
+
+import re
+import sqlite3
+import unicodedata
+from datetime import date
+
+from sunsun_db.pool import memo
+
+# 解析結果の列
+DATE_COLUMNS = {
+    'release_date_iso': 'TEXT',
+    'release_year': 'INTEGER',
+    'release_month': 'INTEGER',
+}
+
+# 年・月・日（日の後ろの時刻などは無視する）
+FULL_DATE_PATTERNS = [
+    re.compile(r'^(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})日?(?:$|[T\s(（])'),
+    re.compile(r'^(\d{4})(\d{2})(\d{2})$'),
+]
+YEAR_MONTH_PATTERN = re.compile(r'^(\d{4})[-/.年](\d{1,2})月?$')
+YEAR_PATTERN = re.compile(r'^(\d{4})年?$')
+
+# ビルドのログに表示する解析できなかった値の件数
+REPORT_LIMIT = 20
+
+def parse_release_date(value):
+    """(ISO 日付, 年, 月) を返す。日付として解析できなければ None"""
+    if value is None:
+        return None
+    text = unicodedata.normalize('NFKC', value).strip()
+
+    for pattern in FULL_DATE_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            try:
+                parsed = date(*(int(part) for part in match.groups()))
+            except ValueError:
+                return None
+            return parsed.isoformat(), parsed.year, parsed.month
+
+    match = YEAR_MONTH_PATTERN.match(text)
+    if match:
+        year, month = (int(part) for part in match.groups())
+        return (None, year, month) if 1 <= month <= 12 else None
+
+    match = YEAR_PATTERN.match(text)
+    if match:
+        return None, int(match.group(1)), None
+    return None
+
+
+def date_bound(value, end=False):
+    """date_from / date_to の値を ISO 日付にする
+
+    'YYYY' や 'YYYY-MM' も受け付け、end なら期間の最後の日にする
+    （文字列として比較するので月末は 31 日でよい）。解析できなければ ValueError。
+    """
+    parsed = parse_release_date(value)
+    if parsed is None:
+        raise ValueError(f'invalid date: {value}')
+    iso, year, month = parsed
+    if iso is not None:
+        return iso
+    if month is None:
+        return f'{year}-12-31' if end else f'{year}-01-01'
+    return f'{year}-{month:02d}-31' if end else f'{year}-{month:02d}-01'
+
+
+def has_release_dates(conn):
+    """公開日の列が作成済みかどうか"""
+    return memo(conn, 'release_dates', _has_release_date_columns)
+
+
+def _has_release_date_columns(conn):
+    try:
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(scripts)')]
+    except sqlite3.OperationalError:
+        columns = []
+    return 'release_year' in columns
+
+
+def refresh_release_dates(conn, full=False):
+    """公開日を解析して列に保存する（full=False なら未解析の行のみ）
+
+    解析できなかった値は台本名とともに表示する。
+    """
+    if not has_release_dates(conn):
+        print("Skipping release dates: columns not found (run python -m sunsun_db.build)")
+        return
+
+    cursor = conn.cursor()
+    where = '' if full else 'AND release_year IS NULL'
+    rows = cursor.execute(f'''
+        SELECT script_id, script_name, release_date FROM scripts
+        WHERE release_date IS NOT NULL AND TRIM(release_date) != '' {where}
+    ''').fetchall()
+
+    parsed_rows = []
+    partial = 0
+    unparseable = []
+    for script_id, script_name, release_date in rows:
+        parsed = parse_release_date(release_date)
+        if parsed is None:
+            unparseable.append((script_name, release_date))
+            parsed = (None, None, None)
+        elif parsed[0] is None:
+            partial += 1
+        parsed_rows.append(parsed + (script_id,))
+
+    cursor.executemany('''
+        UPDATE scripts SET release_date_iso = ?, release_year = ?, release_month = ?
+        WHERE script_id = ?
+    ''', parsed_rows)
+    conn.commit()
+
+    if parsed_rows:
+        print(f"Parsed release_date: {len(parsed_rows) - len(unparseable)} rows ({partial} without day)")
+    if unparseable:
+        print(f"Warning: {len(unparseable)} release_date values could not be parsed:")
+        for script_name, release_date in unparseable[:REPORT_LIMIT]:
+            print(f"  {script_name}: {release_date!r}")
+        if len(unparseable) > REPORT_LIMIT:
+            print(f"  ... and {len(unparseable) - REPORT_LIMIT} more")
+
+
+def add_release_dates(conn):
+    """公開日の列と無効化トリガーを作成し、全行を解析する"""
+    cursor = conn.cursor()
+    existing = [row[1] for row in cursor.execute('PRAGMA table_info(scripts)')]
+    for column, column_type in DATE_COLUMNS.items():
+        if column not in existing:
+            cursor.execute(f'ALTER TABLE scripts ADD COLUMN {column} {column_type}')
+
+    # release_date が変わったら再解析の対象にする
+    cursor.execute('DROP TRIGGER IF EXISTS scripts_release_date_reset')
+    cursor.execute('''
+        CREATE TRIGGER scripts_release_date_reset AFTER UPDATE OF release_date ON scripts
+        WHEN new.release_date IS NOT old.release_date BEGIN
+            UPDATE scripts SET release_date_iso = NULL, release_year = NULL, release_month = NULL
+            WHERE script_id = new.script_id;
+        END
+    ''')
+    conn.commit()
+
+    refresh_release_dates(conn, full=True)
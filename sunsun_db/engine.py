@@ -0,0 +1,859 @@
+# -*- coding: utf-8 -*-
+"""検索クエリエンジン
+
+Flask (api.py)・Vercel (api/*.py)・Netlify (netlify/functions/*.py) の各ハンドラは
+このモジュールの関数を呼び、結果の整形（レスポンスの形）だけを受け持つ。
+
+- SQL は検索方式・指定された条件の組み合わせごとに一度だけ組み立てて使い回す。
+  毎回同じ文字列になるので sqlite3 のステートメントキャッシュが効く
+- 行は tuple のまま読み、NamedTuple の結果型に詰める。JSON にするときは
+  to_dict()、またはレスポンス用に sunsun_db.serialize を使う
+- 台本詳細のセリフは SQLite 側でレスポンスの形の JSON に組み立てて返す
+"""
+
+import functools
+import json
+from typing import List, NamedTuple, Optional
+
+from sunsun_db.characters import find_character_id, has_character_counts
+from sunsun_db.dates import date_bound, has_release_dates, parse_release_date
+from sunsun_db.fts import MODE_FTS, MODE_NORMALIZED, keyword_mode, match_condition, match_params
+from sunsun_db.normalize import normalize_text
+from sunsun_db.pagination import (
+    cached_count,
+    decode_cursor,
+    encode_cursor,
+    script_order_by,
+    script_order_keys,
+    script_sort_values,
+    scripts_after,
+)
+from sunsun_db.serialize import RawJSON, encode_rows
+from sunsun_db.stats import has_script_character_stats, read_stats
+from sunsun_db.tags import (
+    MATCH_ALL,
+    MATCH_ANY,
+    TAG_TABLES,
+    has_script_tags,
+    parse_tags,
+    split_tags,
+    tag_condition,
+)
+
+# 検索対象の列
+SCRIPT_SEARCH_COLUMNS = ('script_name', 'youtube_title', 'themes', 'subjects')
+DIALOGUE_SEARCH_COLUMNS = ('dialogue',)
+KEYWORD_SEARCH_COLUMNS = ('dialogue', 'script_name', 'youtube_title', 'themes', 'subjects')
+
+# LIKE のワイルドカード
+LIKE_WILDCARDS = frozenset('%_')
+
+# 代表として返すセリフの件数
+SAMPLE_DIALOGUES = 3
+
+# 返す件数の既定値と上限
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+# ---- 結果の型 ----
+
+class ScriptSummary(NamedTuple):
+    script_name: str
+    themes: Optional[str]
+    subjects: Optional[str]
+    release_date: Optional[str]
+    youtube_title: Optional[str]
+    youtube_url: Optional[str]
+    match_confidence: Optional[float]
+    dialogue_count: int
+
+
+class DialogueHit(NamedTuple):
+    script_name: str
+    character: Optional[str]
+    dialogue: str
+    row_number: Optional[int]
+    themes: Optional[str]
+    subjects: Optional[str]
+    release_date: Optional[str]
+    youtube_title: Optional[str]
+    youtube_url: Optional[str]
+    match_confidence: Optional[float]
+
+
+class KeywordScript(NamedTuple):
+    script_name: str
+    script_url: str
+    characters: str
+    release_date: str
+    youtube_title: str
+    youtube_url: str
+    youtube_release_date: str
+    match_count: int
+
+
+class DialogueLine(NamedTuple):
+    character: Optional[str]
+    dialogue: Optional[str]
+    row_number: Optional[int]
+
+
+class GroupedScript(NamedTuple):
+    script_name: str
+    script_url: str
+    release_date: str
+    youtube_title: str
+    youtube_url: str
+    dialogues: List[DialogueLine]
+    characters: str
+    match_count: int
+
+    def to_dict(self):
+        result = self._asdict()
+        result['dialogues'] = [
+            {
+                'character': line.character or '',
+                'dialogue': line.dialogue,
+                'row_number': line.row_number or 0
+            }
+            for line in self.dialogues
+        ]
+        return result
+
+
+class ScriptInfo(NamedTuple):
+    script_id: int
+    script_name: str
+    themes: Optional[str]
+    subjects: Optional[str]
+    story_structure: Optional[str]
+    release_date: Optional[str]
+    youtube_title: Optional[str]
+    youtube_url: Optional[str]
+    youtube_video_id: Optional[str]
+    script_url: Optional[str]
+    category: Optional[str]
+    match_confidence: Optional[float]
+
+
+class CharacterCount(NamedTuple):
+    character: str
+    dialogue_count: int
+    script_count: int
+    aliases: List[str]
+
+
+class ScriptCharacterCount(NamedTuple):
+    character: str
+    count: int
+
+
+class ThemeCount(NamedTuple):
+    theme: str
+    count: int
+
+
+class SubjectCount(NamedTuple):
+    subject: str
+    count: int
+
+
+class YearCount(NamedTuple):
+    year: int
+    count: int
+
+
+class MonthCount(NamedTuple):
+    year: int
+    month: int
+    count: int
+
+
+class ScriptDetail(NamedTuple):
+    script: ScriptInfo
+    character_stats: RawJSON   # ScriptCharacterCount の JSON 配列
+    lines: RawJSON             # DialogueLine の JSON 配列
+    line_count: int
+
+
+# to_dict() は JSON 用の dict を返す（GroupedScript 以外は列名そのまま）
+for _result_type in (ScriptSummary, DialogueHit, KeywordScript, DialogueLine,
+                     ScriptInfo, CharacterCount, ScriptCharacterCount, ThemeCount, SubjectCount,
+                     YearCount, MonthCount):
+    _result_type.to_dict = _result_type._asdict
+
+
+class Page(NamedTuple):
+    results: list
+    total_count: Optional[int]
+    has_more: bool
+    next_cursor: Optional[str]
+
+    def to_dict(self):
+        return {
+            'results': [result.to_dict() for result in self.results],
+            'total_count': self.total_count,
+            'has_more': self.has_more,
+            'next_cursor': self.next_cursor
+        }
+
+    def to_json_dict(self):
+        """to_dict() の results を組み立て済みの JSON にしたもの（serialize.dumps() 用）"""
+        result = self._asdict()
+        result['results'] = encode_rows(self.results)
+        return result
+
+
+# ---- 共通処理 ----
+
+def parse_limit(value):
+    """limit パラメータを解釈する（不正な値は ValueError）"""
+    if value in (None, ''):
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        limit = 0
+    if limit < 1:
+        raise ValueError('limit は1以上の整数を指定してください')
+    return min(limit, MAX_LIMIT)
+
+
+def execute(conn, sql, params=()):
+    """tuple で行を返すカーソルで実行する（sqlite3.Row を作らない）"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(sql, params)
+    return cursor
+
+
+# ---- 台本検索 ----
+
+@functools.lru_cache(maxsize=None)
+def _script_search_where(mode, themes, subjects, match, year, date_from, date_to, precomputed, typed_dates,
+                         ordered=False):
+    """themes / subjects は絞り込むテーマ・題材の件数、typed_dates は公開日の型付き列があるか
+
+    ordered なら公開日の条件に単項 + を付け、並び順のインデックスのまま走査して
+    limit 件で止める（公開日のインデックスから引くと該当台本すべてのセリフ数を数えてからソートになる）。
+    件数を数えるだけなら公開日のインデックスの範囲を読む。
+    """
+    conditions = []
+    if mode:
+        conditions.append(match_condition(mode, SCRIPT_SEARCH_COLUMNS))
+    if themes:
+        conditions.append(tag_condition('themes', themes, match, precomputed))
+    if subjects:
+        conditions.append(tag_condition('subjects', subjects, match, precomputed))
+    prefix = '+' if ordered else ''
+    if year:
+        conditions.append(f'{prefix}release_year = ?' if typed_dates else 'release_date LIKE ?')
+    # 列が無いデータベースでは元の文字列の先頭（ISO 形式の日付）で比べる
+    release_date = f'{prefix}release_date_iso' if typed_dates else 'substr(release_date, 1, 10)'
+    if date_from:
+        conditions.append(f'{release_date} >= ?')
+    if date_to:
+        conditions.append(f'{release_date} <= ?')
+    return ' AND '.join(conditions) if conditions else '1=1'
+
+
+@functools.lru_cache(maxsize=None)
+def _script_search_sql(mode, themes, subjects, match, year, date_from, date_to, precomputed, typed_dates,
+                       after):
+    where_clause = _script_search_where(mode, themes, subjects, match, year, date_from, date_to,
+                                        precomputed, typed_dates, ordered=True)
+    if after:
+        where_clause += ' AND ' + scripts_after([None] * 3, typed_dates=typed_dates)[0]
+
+    # 台本テーブルのみを走査し、セリフ数は該当台本分だけ数える
+    return f'''
+        SELECT
+            script_name,
+            themes,
+            subjects,
+            release_date,
+            youtube_title,
+            youtube_url,
+            match_confidence,
+            (
+                SELECT COUNT(dialogue) FROM dialogue_lines d
+                WHERE d.script_id = scripts.script_id
+            ) AS dialogue_count,
+            script_id,
+            {script_order_keys(typed_dates=typed_dates)[1]}
+        FROM scripts
+        WHERE {where_clause}
+        ORDER BY {script_order_by(typed_dates=typed_dates)}
+        LIMIT ? OFFSET ?
+    '''
+
+
+@functools.lru_cache(maxsize=None)
+def _script_count_sql(mode, themes, subjects, match, year, date_from, date_to, precomputed, typed_dates):
+    where_clause = _script_search_where(mode, themes, subjects, match, year, date_from, date_to,
+                                        precomputed, typed_dates)
+    return f'SELECT COUNT(*) FROM scripts WHERE {where_clause}'
+
+
+def search_scripts(conn, query='', theme=(), year='', limit=DEFAULT_LIMIT, offset=0,
+                   cursor=None, with_total=False, subject=(), match=MATCH_ANY,
+                   date_from='', date_to=''):
+    """台本検索
+
+    並び順は信頼度・公開日の降順。cursor を指定するとその位置から続きを返す。
+    総件数は with_total のときだけ数える。
+    theme / subject は完全一致で、複数指定したときは match（any / all）で絞り込む。
+    date_from / date_to は公開日の範囲（'YYYY-MM-DD'、'YYYY-MM'、'YYYY'、両端を含む）。
+    """
+    if match not in (MATCH_ANY, MATCH_ALL):
+        raise ValueError(f'match must be {MATCH_ANY} or {MATCH_ALL}')
+    themes = parse_tags(theme)
+    subjects = parse_tags(subject)
+    typed_dates = has_release_dates(conn)
+
+    mode = keyword_mode(conn, query) if query else None
+    params = match_params(mode, query, SCRIPT_SEARCH_COLUMNS) if query else []
+    params += themes + subjects
+    if year:
+        if not year.isdigit():
+            raise ValueError(f'invalid year: {year}')
+        params.append(int(year) if typed_dates else f'{year}%')
+    if date_from:
+        params.append(date_bound(date_from))
+    if date_to:
+        params.append(date_bound(date_to, end=True))
+    conditions = (mode, len(themes), len(subjects), match, bool(year), bool(date_from), bool(date_to),
+                  has_script_tags(conn), typed_dates)
+
+    page_params = list(params)
+    if cursor:
+        page_params += scripts_after(decode_cursor(cursor, 3), typed_dates=typed_dates)[1]
+        offset = 0
+
+    # has_more 判定のため1件多く取得する
+    sql = _script_search_sql(*conditions, bool(cursor))
+    rows = execute(conn, sql, page_params + [limit + 1, offset]).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(script_sort_values(last[6], last[9], last[8]))
+
+    total_count = None
+    if with_total:
+        total_count = cached_count(conn, _script_count_sql(*conditions), params)
+
+    return Page([ScriptSummary._make(row[:8]) for row in rows], total_count, has_more, next_cursor)
+
+
+# ---- セリフ検索 ----
+
+@functools.lru_cache(maxsize=None)
+def _dialogue_search_where(mode, character):
+    conditions = []
+    if mode:
+        conditions.append(match_condition(mode, DIALOGUE_SEARCH_COLUMNS, line_key='d.dialogue_id'))
+    if character:
+        conditions.append('d.character_id = ?')
+    conditions.append('d.dialogue IS NOT NULL AND d.dialogue != ""')
+    return ' AND '.join(conditions)
+
+
+@functools.lru_cache(maxsize=None)
+def _dialogue_search_sql(mode, character, after, typed_dates):
+    where_clause = _dialogue_search_where(mode, character)
+    order_keys = script_order_keys('s', typed_dates)
+    if after:
+        # 前の台本は読み飛ばし、同じ台本内は行番号で続きを探す
+        keys = ', '.join(order_keys)
+        where_clause += f'''
+            AND {order_keys[0]} <= ?
+            AND ({keys}) <= (?, ?, ?)
+            AND (
+                ({keys}) < (?, ?, ?)
+                OR (COALESCE(d.row_number, -1), d.dialogue_id) > (?, ?)
+            )
+        '''
+
+    return f'''
+        SELECT
+            s.script_name,
+            c.name AS character,
+            d.dialogue,
+            d.row_number,
+            s.themes,
+            s.subjects,
+            s.release_date,
+            s.youtube_title,
+            s.youtube_url,
+            s.match_confidence,
+            s.script_id,
+            d.dialogue_id,
+            {order_keys[1]}
+        FROM scripts s
+        JOIN dialogue_lines d ON d.script_id = s.script_id
+        LEFT JOIN characters c ON c.character_id = d.character_id
+        WHERE {where_clause}
+        ORDER BY {script_order_by('s', typed_dates)}, d.row_number, d.dialogue_id
+        LIMIT ? OFFSET ?
+    '''
+
+
+@functools.lru_cache(maxsize=None)
+def _dialogue_count_sql(mode, character):
+    return f'SELECT COUNT(*) FROM dialogue_lines d WHERE {_dialogue_search_where(mode, character)}'
+
+
+def search_dialogues(conn, query='', character='', limit=DEFAULT_LIMIT, offset=0,
+                     cursor=None, with_total=False):
+    """セリフ検索
+
+    並び順は台本の信頼度・公開日順、台本内は行番号順。
+    cursor を指定するとその位置から続きを返す。総件数は with_total のときだけ数える。
+    """
+    mode = keyword_mode(conn, query) if query else None
+    params = match_params(mode, query, DIALOGUE_SEARCH_COLUMNS) if query else []
+    if character:
+        # 別名で指定されても正式名のキャラクターのセリフを返す
+        params.append(find_character_id(conn, character))
+
+    page_params = list(params)
+    if cursor:
+        last_values = decode_cursor(cursor, 5)
+        script_values = last_values[:3]
+        page_params += [script_values[0]] + script_values + script_values + last_values[3:]
+        offset = 0
+
+    # has_more 判定のため1件多く取得する
+    sql = _dialogue_search_sql(mode, bool(character), bool(cursor), has_release_dates(conn))
+    rows = execute(conn, sql, page_params + [limit + 1, offset]).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        row_number = last[3] if last[3] is not None else -1
+        next_cursor = encode_cursor(script_sort_values(last[9], last[12], last[10]) + [row_number, last[11]])
+
+    total_count = None
+    if with_total:
+        total_count = cached_count(conn, _dialogue_count_sql(mode, bool(character)), params)
+
+    return Page([DialogueHit._make(row[:10]) for row in rows], total_count, has_more, next_cursor)
+
+
+# ---- 台本ごとのキーワード検索 (/api/search/keyword) ----
+
+@functools.lru_cache(maxsize=None)
+def _keyword_scripts_sql(mode, after, typed_dates):
+    # セリフがマッチした行と、台本メタデータがマッチした台本の全セリフの和集合。
+    # OR で1つの WHERE にすると全セリフを読むので、それぞれ FTS（またはインデックス）から引く
+    line_where = match_condition(mode, DIALOGUE_SEARCH_COLUMNS, line_key='dialogue_id')
+    script_where = match_condition(mode, SCRIPT_SEARCH_COLUMNS, script_key='s.script_id')
+    release_date = script_order_keys('s', typed_dates)[1]
+    after_clause = 'WHERE (match_count, sort_date, script_id) < (?, ?, ?)' if after else ''
+
+    # マッチした行の集計 (GROUP BY のソート) は台本 ID とキャラクター名だけで行い、
+    # 台本のメタデータは集計後の台本ごとの行にだけ結合する。
+    # total はカーソルで絞り込む前の台本数（ウィンドウ関数のある副問い合わせには条件が押し込まれない）
+    return f'''
+        WITH matched AS (
+            SELECT dialogue_id FROM dialogue_lines WHERE {line_where}
+            UNION
+            SELECT ld.dialogue_id
+            FROM scripts s
+            JOIN dialogue_lines ld ON ld.script_id = s.script_id
+            WHERE {script_where}
+        ),
+        per_script AS (
+            SELECT
+                d.script_id,
+                COALESCE(GROUP_CONCAT(DISTINCT c.name), '') AS characters,
+                COUNT(*) AS match_count
+            FROM matched m
+            JOIN dialogue_lines d ON d.dialogue_id = m.dialogue_id
+            LEFT JOIN characters c ON c.character_id = d.character_id
+            WHERE d.dialogue IS NOT NULL
+            AND d.dialogue != ""
+            GROUP BY d.script_id
+        ),
+        ranked AS (
+            SELECT
+                s.script_name,
+                COALESCE(s.script_url, '') AS script_url,
+                p.characters,
+                COALESCE(s.release_date, '') AS release_date,
+                COALESCE(s.youtube_title, '') AS youtube_title,
+                COALESCE(s.youtube_url, '') AS youtube_url,
+                COALESCE(s.release_date, '') AS youtube_release_date,
+                p.match_count,
+                p.script_id,
+                {release_date} AS sort_date,
+                COUNT(*) OVER () AS total
+            FROM per_script p
+            JOIN scripts s ON s.script_id = p.script_id
+        )
+        SELECT * FROM ranked
+        {after_clause}
+        ORDER BY match_count DESC, sort_date DESC, script_id DESC
+        LIMIT ?
+    '''
+
+
+class KeywordScripts:
+    """キーワードにマッチした台本を1件ずつ返すイテレータ
+
+    生成時にクエリを実行する（エラーはここで発生する）。マッチ数の順に並べるので、
+    最初の行が返るのはマッチした全行の GROUP BY と ORDER BY が終わった後
+    （以降の行は読むたびにソート済みの結果から取り出す）。最後まで読むと
+    count に返した件数、total にマッチした台本の総数（カーソルの位置によらない。
+    カーソルより後ろに台本が無ければ 0）、next_cursor に続きのカーソル（無ければ None）が入る。
+    """
+
+    def __init__(self, conn, keyword, limit=DEFAULT_LIMIT, cursor=None):
+        mode = keyword_mode(conn, keyword)
+        params = match_params(mode, keyword, KEYWORD_SEARCH_COLUMNS)
+        if cursor:
+            params += decode_cursor(cursor, 3)
+
+        # has_more 判定のため1件多く取得する
+        self.limit = limit
+        self.count = 0
+        self.total = 0
+        self.next_cursor = None
+        sql = _keyword_scripts_sql(mode, bool(cursor), has_release_dates(conn))
+        self._cursor = execute(conn, sql, params + [limit + 1])
+
+    def __iter__(self):
+        last = None
+        for row in self._cursor:
+            if self.count == self.limit:
+                self.next_cursor = encode_cursor([last[7], last[9], last[8]])
+                break
+            self.count += 1
+            self.total = row[10]
+            last = row
+            yield KeywordScript._make(row[:8])
+
+
+# ---- 台本ごとにまとめたキーワード検索 (/api/search) ----
+
+@functools.lru_cache(maxsize=None)
+def _grouped_search_sql(mode, typed_dates):
+    dialogue_where = match_condition(mode, DIALOGUE_SEARCH_COLUMNS, line_key='d.dialogue_id')
+    release_date = script_order_keys('s', typed_dates)[1]
+
+    # マッチ数・代表セリフ・キャラクター一覧を SQL 側で集計し、
+    # 上位 limit 件の台本に必要な行だけを返す
+    return f'''
+        WITH matches AS (
+            SELECT
+                d.script_id,
+                d.character_id,
+                d.dialogue,
+                d.row_number,
+                ROW_NUMBER() OVER (
+                    PARTITION BY d.script_id ORDER BY d.row_number, d.dialogue_id
+                ) AS sample_rank
+            FROM dialogue_lines d
+            WHERE {dialogue_where}
+            AND d.dialogue IS NOT NULL
+            AND d.dialogue != ""
+        ),
+        script_characters AS (
+            SELECT m.script_id, GROUP_CONCAT(c.name, ', ') AS characters
+            FROM (SELECT DISTINCT script_id, character_id FROM matches) m
+            JOIN characters c ON c.character_id = m.character_id
+            GROUP BY m.script_id
+        ),
+        top_scripts AS (
+            SELECT
+                m.script_id,
+                COUNT(*) AS match_count,
+                COUNT(*) OVER () AS total
+            FROM matches m
+            JOIN scripts s ON s.script_id = m.script_id
+            GROUP BY m.script_id
+            ORDER BY match_count DESC, {release_date} DESC, s.script_name
+            LIMIT ?
+        )
+        SELECT
+            s.script_id,
+            s.script_name,
+            COALESCE(s.script_url, ''),
+            COALESCE(s.release_date, ''),
+            COALESCE(s.youtube_title, ''),
+            COALESCE(s.youtube_url, ''),
+            COALESCE(sc.characters, ''),
+            t.match_count,
+            t.total,
+            c.name,
+            m.dialogue,
+            m.row_number
+        FROM top_scripts t
+        JOIN scripts s ON s.script_id = t.script_id
+        LEFT JOIN script_characters sc ON sc.script_id = t.script_id
+        JOIN matches m ON m.script_id = t.script_id AND m.sample_rank <= {SAMPLE_DIALOGUES}
+        LEFT JOIN characters c ON c.character_id = m.character_id
+        ORDER BY t.match_count DESC, {release_date} DESC, s.script_name, m.sample_rank
+    '''
+
+
+def search_grouped(conn, keyword, limit=DEFAULT_LIMIT):
+    """キーワードを含むセリフがある台本を、マッチ数・公開日の降順で返す
+
+    (GroupedScript のリスト, マッチした台本の総数) を返す。
+    """
+    mode = keyword_mode(conn, keyword)
+    params = match_params(mode, keyword, DIALOGUE_SEARCH_COLUMNS)
+
+    # 行は台本ごとに連続して届くので、順に読みながらまとめる
+    results = []
+    total = 0
+    script_id = None
+    for row in execute(conn, _grouped_search_sql(mode, has_release_dates(conn)), params + [limit]):
+        if row[0] != script_id:
+            script_id = row[0]
+            total = row[8]
+            results.append(GroupedScript(*row[1:6], [], row[6], row[7]))
+        results[-1].dialogues.append(DialogueLine(*row[9:12]))
+
+    return results, total
+
+
+# ---- 一覧 ----
+
+# キャラクター一覧。ビルド時に集計した characters の件数を読むだけで済む
+CHARACTERS_SQL = '''
+    SELECT name, dialogue_count, script_count, aliases
+    FROM characters
+    WHERE dialogue_count > 0
+    ORDER BY dialogue_count DESC, character_id
+'''
+
+# 件数が無い・古い場合はセリフから集計する（別名は返さない）
+CHARACTER_COUNTS_SQL = '''
+    SELECT
+        c.name,
+        COUNT(*) AS dialogue_count,
+        COUNT(DISTINCT d.script_id) AS script_count,
+        NULL AS aliases
+    FROM dialogue_lines d
+    JOIN characters c ON c.character_id = d.character_id
+    GROUP BY d.character_id
+    ORDER BY dialogue_count DESC, d.character_id
+'''
+
+# テーマ・題材ごとの台本数。ビルド時に作った件数テーブルを読むだけで済む
+TAG_COUNTS_SQL = {
+    column: f'''
+        SELECT {name}, script_count
+        FROM {count_table}
+        ORDER BY script_count DESC, {name}
+    '''
+    for column, (name, _, count_table) in TAG_TABLES.items()
+}
+
+
+def list_characters(conn):
+    """キャラクター一覧とセリフ数・登場台本数・別名"""
+    sql = CHARACTERS_SQL if has_character_counts(conn) else CHARACTER_COUNTS_SQL
+    return [
+        CharacterCount(name, dialogue_count, script_count, json.loads(aliases) if aliases else [])
+        for name, dialogue_count, script_count, aliases in execute(conn, sql)
+    ]
+
+
+def _list_tags(conn, column, result_type):
+    if has_script_tags(conn):
+        return [result_type._make(row) for row in execute(conn, TAG_COUNTS_SQL[column])]
+
+    # 件数テーブルが無い・古い場合は元の列を分割して数える
+    counts = {}
+    for (value,) in execute(conn, f'SELECT {column} FROM scripts WHERE {column} IS NOT NULL'):
+        for tag in split_tags(value):
+            counts[tag] = counts.get(tag, 0) + 1
+    return [result_type(tag, count) for tag, count in sorted(counts.items(), key=lambda x: (-x[1], x[0]))]
+
+
+def list_themes(conn):
+    """テーマ一覧と台本数（件数順）"""
+    return _list_tags(conn, 'themes', ThemeCount)
+
+
+def list_subjects(conn):
+    """題材一覧と台本数（件数順）"""
+    return _list_tags(conn, 'subjects', SubjectCount)
+
+
+# ---- 公開日の集計 ----
+
+# idx_scripts_release_month (release_year, release_month) だけで数える
+YEAR_COUNTS_SQL = '''
+    SELECT release_year, COUNT(*) AS count
+    FROM scripts
+    WHERE release_year IS NOT NULL
+    GROUP BY release_year
+    ORDER BY release_year
+'''
+
+
+@functools.lru_cache(maxsize=None)
+def _month_counts_sql(year):
+    year_condition = 'AND release_year = ?' if year else ''
+    return f'''
+        SELECT release_year, release_month, COUNT(*) AS count
+        FROM scripts
+        WHERE release_month IS NOT NULL {year_condition}
+        GROUP BY release_year, release_month
+        ORDER BY release_year, release_month
+    '''
+
+
+def _parsed_release_dates(conn):
+    """列が無いデータベース用に release_date を解析する（解析できない値は除く）"""
+    parsed = (parse_release_date(value) for (value,) in execute(conn, 'SELECT release_date FROM scripts'))
+    return [value for value in parsed if value is not None]
+
+
+def release_year_counts(conn):
+    """年ごとの台本数（年順）"""
+    if has_release_dates(conn):
+        return [YearCount._make(row) for row in execute(conn, YEAR_COUNTS_SQL)]
+
+    counts = {}
+    for _, year, _ in _parsed_release_dates(conn):
+        counts[year] = counts.get(year, 0) + 1
+    return [YearCount(year, count) for year, count in sorted(counts.items())]
+
+
+def release_month_counts(conn, year=''):
+    """月ごとの台本数（年月順）。year を指定するとその年だけ"""
+    if year and not str(year).isdigit():
+        raise ValueError(f'invalid year: {year}')
+    year = int(year) if year else None
+
+    if has_release_dates(conn):
+        params = [year] if year else []
+        return [MonthCount._make(row) for row in execute(conn, _month_counts_sql(bool(year)), params)]
+
+    counts = {}
+    for _, parsed_year, month in _parsed_release_dates(conn):
+        if month is not None and (year is None or parsed_year == year):
+            counts[(parsed_year, month)] = counts.get((parsed_year, month), 0) + 1
+    return [MonthCount(y, m, count) for (y, m), count in sorted(counts.items())]
+
+
+# ---- 台本詳細 ----
+
+# 台本 (s) のキャラクター別セリフ数。ビルド時に作った script_character_stats が
+# あれば主キーの順に読むだけで、無い・古い場合はその台本の行から集計する
+SCRIPT_CHARACTER_STATS_SQL = '''
+    SELECT c.name, st.dialogue_count AS count
+    FROM script_character_stats st
+    JOIN characters c ON c.character_id = st.character_id
+    WHERE st.script_id = s.script_id
+    ORDER BY st.dialogue_count DESC, st.character_id
+'''
+
+SCRIPT_CHARACTER_COUNTS_SQL = '''
+    SELECT c.name, COUNT(*) AS count
+    FROM dialogue_lines d
+    JOIN characters c ON c.character_id = d.character_id
+    WHERE d.script_id = s.script_id
+    GROUP BY d.character_id
+    ORDER BY count DESC, d.character_id
+'''
+
+
+def _json_object(fields, expressions):
+    """結果型の列名をキーにした json_object() の式"""
+    return 'json_object(' + ', '.join(f"'{field}', {expression}" for field, expression in zip(fields, expressions)) + ')'
+
+
+@functools.lru_cache(maxsize=None)
+def _script_detail_sql(mode, include_empty, precomputed, defaults):
+    """台本情報・キャラクター別セリフ数・セリフを1行で読む SQL
+
+    mode を指定するとキーワードにマッチしたセリフだけを返す。
+    セリフは件数を先頭に付けた 'N,[...]'、キャラクター別セリフ数は JSON 配列で、
+    どちらもレスポンスの形（DialogueLine・ScriptCharacterCount の列名）で組み立てる。
+    defaults なら NULL を空文字・0 にし、キーワードで絞り込んだかを is_match に入れる
+    （サーバーレス関数のレスポンスの形）。
+    """
+    line_conditions = ['d.script_id = s.script_id']
+    if mode is not None:
+        line_conditions.append(match_condition(mode, DIALOGUE_SEARCH_COLUMNS, line_key='d.dialogue_id'))
+    if not include_empty:
+        line_conditions.append('d.dialogue IS NOT NULL AND d.dialogue != ""')
+    stats_sql = SCRIPT_CHARACTER_STATS_SQL if precomputed else SCRIPT_CHARACTER_COUNTS_SQL
+
+    line_fields = DialogueLine._fields
+    line_columns = ('name', 'dialogue', 'row_number')
+    if defaults:
+        line_fields += ('is_match',)
+        line_columns = ("COALESCE(name, '')", "COALESCE(dialogue, '')", 'COALESCE(row_number, 0)',
+                        "json('true')" if mode is not None else "json('false')")
+    line_json = _json_object(line_fields, line_columns)
+    stat_json = _json_object(ScriptCharacterCount._fields, ('name', 'count'))
+
+    # 台本1行に対してサブクエリが1回ずつ実行される。キャラクター別セリフ数と
+    # セリフはインデックスの順に読んで JSON 配列にまとめる（ソートしない）
+    return f'''
+        SELECT
+            {', '.join('s.' + field for field in ScriptInfo._fields)},
+            (SELECT json_group_array({stat_json}) FROM ({stats_sql})),
+            (
+                SELECT COUNT(*) || ',' || json_group_array({line_json}) FROM (
+                    SELECT c.name, d.dialogue, d.row_number
+                    FROM dialogue_lines d
+                    LEFT JOIN characters c ON c.character_id = d.character_id
+                    WHERE {' AND '.join(line_conditions)}
+                    ORDER BY d.row_number
+                )
+            )
+        FROM scripts s
+        WHERE s.script_name = ?
+    '''
+
+
+def get_script_detail(conn, script_name, keyword='', include_empty=False, defaults=False):
+    """台本詳細（無ければ None）
+
+    keyword を指定するとマッチしたセリフのみ、include_empty で空のセリフも返す。
+    キャラクター別セリフ数とセリフは組み立て済みの JSON（RawJSON）で返す。
+    """
+    mode = keyword_mode(conn, keyword) if keyword else None
+    if mode == MODE_FTS and not LIKE_WILDCARDS.intersection(normalize_text(keyword)):
+        # 照合するのは1台本のセリフ（インデックスで読む数百行）だけなので、全台本のマッチを
+        # 集める FTS ではなく正規化列の LIKE を使う（同じ正規化なので結果は同じ。
+        # % と _ は LIKE ではワイルドカードになるので、含む場合は FTS のまま）
+        mode = MODE_NORMALIZED
+    params = match_params(mode, keyword, DIALOGUE_SEARCH_COLUMNS) if mode else []
+    params.append(script_name)
+    sql = _script_detail_sql(mode, include_empty, has_script_character_stats(conn), defaults)
+
+    row = execute(conn, sql, params).fetchone()
+    if row is None:
+        return None
+    *script, character_stats, lines = row
+    line_count, _, lines = lines.partition(',')
+    return ScriptDetail(
+        ScriptInfo._make(script),
+        RawJSON(character_stats.encode()),
+        RawJSON(lines.encode()),
+        int(line_count)
+    )
+
+
+# ---- 統計 ----
+
+def get_stats(conn):
+    """統計情報（stats_cache のスナップショット）"""
+    return read_stats(conn)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""FTS5 trigram 全文検索インデックス
+
+セリフ本文 (dialogue_lines.dialogue) と台本メタデータ (scripts の
+script_name / youtube_title / themes / subjects) をそれぞれ trigram
+トークナイザで索引化する。trigram は形態素解析なしで日本語の部分一致検索が
+できるため、`LIKE '%q%'` の全件スキャンを置き換えられる。
+
+索引化するのは正規化列（sunsun_db.normalize）で、クエリも同じ正規化をしてから
+検索する。
+"""
+
+from sunsun_db.normalize import has_normalized_text, normalize_text, normalized_column
+from sunsun_db.pool import memo
+
+# FTS テーブル名: (元テーブル, 主キー, 索引化する列)
+LINES_FTS = 'dialogue_lines_fts'
+SCRIPTS_FTS = 'scripts_fts'
+
+FTS_INDEXES = {
+    LINES_FTS: ('dialogue_lines', 'dialogue_id', ['dialogue_norm']),
+    SCRIPTS_FTS: ('scripts', 'script_id', ['script_name_norm', 'youtube_title_norm', 'themes_norm', 'subjects_norm']),
+}
+
+# trigram は3文字未満のクエリにマッチできないため、それ以下は LIKE で検索する
+FTS_MIN_QUERY_LENGTH = 3
+
+
+def create_fts_table(conn, fts_table):
+    """FTS5 テーブルを作成し、元テーブルと同期するトリガーを設定する"""
+    content, key, fts_columns = FTS_INDEXES[fts_table]
+    columns = ', '.join(fts_columns)
+    new_values = ', '.join(f'new.{c}' for c in fts_columns)
+    old_values = ', '.join(f'old.{c}' for c in fts_columns)
+
+    cursor = conn.cursor()
+    cursor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE {fts_table} USING fts5(
+            {columns},
+            content='{content}',
+            content_rowid='{key}',
+            tokenize='trigram'
+        )
+    ''')
+
+    # 元テーブルの変更に追従するトリガー（external content 方式）
+    for suffix in ('ai', 'ad', 'au'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{suffix}')
+    cursor.execute(f'''
+        CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {content} BEGIN
+            INSERT INTO {fts_table}(rowid, {columns}) VALUES (new.{key}, {new_values});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {content} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {columns}) VALUES ('delete', old.{key}, {old_values});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER {fts_table}_au AFTER UPDATE OF {columns} ON {content} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {columns}) VALUES ('delete', old.{key}, {old_values});
+            INSERT INTO {fts_table}(rowid, {columns}) VALUES (new.{key}, {new_values});
+        END
+    ''')
+
+    cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+    cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('optimize')")
+
+
+def build_fts_index(conn):
+    """全 FTS インデックスを作成"""
+    for fts_table in FTS_INDEXES:
+        create_fts_table(conn, fts_table)
+    conn.commit()
+
+
+def has_fts_index(conn):
+    """FTS インデックスが作成済みかどうか"""
+    row = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)",
+        (LINES_FTS, SCRIPTS_FTS)
+    ).fetchone()
+    return row[0] == len(FTS_INDEXES)
+
+
+def fts_phrase(keyword):
+    """キーワードを FTS5 のフレーズ文字列にエスケープ"""
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+# キーワード検索の方式
+MODE_FTS = 'fts'                # 正規化列の FTS で MATCH
+MODE_NORMALIZED = 'normalized'  # 正規化列を LIKE（FTS が無い、または3文字未満）
+MODE_RAW = 'raw'                # 正規化列の無い旧データベース。元の列を LIKE
+
+def search_mode(conn):
+    """データベースが対応している検索方式"""
+    return memo(conn, 'search_mode', _detect_search_mode)
+
+
+def _detect_search_mode(conn):
+    if not has_normalized_text(conn):
+        return MODE_RAW
+    if has_fts_index(conn):
+        return MODE_FTS
+    return MODE_NORMALIZED
+
+
+def keyword_mode(conn, keyword):
+    """キーワードに使う検索方式（FTS は正規化後3文字以上のときのみ）"""
+    mode = search_mode(conn)
+    if mode == MODE_FTS and len(normalize_text(keyword)) < FTS_MIN_QUERY_LENGTH:
+        return MODE_NORMALIZED
+    return mode
+
+
+def match_condition(mode, columns, line_key='dialogue_id', script_key='script_id'):
+    """検索方式と列から WHERE 条件の SQL を返す（同じ引数なら常に同じ文字列）
+
+    line_key / script_key はクエリ内でセリフ ID・台本 ID を指す列名。
+    """
+    if mode == MODE_RAW:
+        return '(' + ' OR '.join(f'{c} LIKE ?' for c in columns) + ')'
+
+    columns = [normalized_column(c) for c in columns]
+    if mode == MODE_NORMALIZED:
+        return '(' + ' OR '.join(f'{c} LIKE ?' for c in columns) + ')'
+
+    conditions = []
+    for fts_table, key in ((LINES_FTS, line_key), (SCRIPTS_FTS, script_key)):
+        if any(c in FTS_INDEXES[fts_table][2] for c in columns):
+            conditions.append(f'{key} IN (SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ?)')
+    return '(' + ' OR '.join(conditions) + ')'
+
+
+def match_params(mode, keyword, columns):
+    """match_condition() に対応するパラメータ"""
+    if mode == MODE_RAW:
+        return [f'%{keyword}%'] * len(columns)
+
+    keyword = normalize_text(keyword)
+    columns = [normalized_column(c) for c in columns]
+    if mode == MODE_NORMALIZED:
+        return [f'%{keyword}%'] * len(columns)
+
+    params = []
+    for fts_table in (LINES_FTS, SCRIPTS_FTS):
+        fts_columns = [c for c in columns if c in FTS_INDEXES[fts_table][2]]
+        if fts_columns:
+            column_filter = '{' + ' '.join(fts_columns) + '}'
+            params.append(f'{column_filter} : {fts_phrase(keyword)}')
+    return params
+
+
+def keyword_condition(conn, keyword, columns, line_key='dialogue_id', script_key='script_id'):
+    """キーワード検索の WHERE 条件とパラメータを返す
+
+    正規化列があればキーワードも正規化して正規化列を検索する。
+    3文字以上かつ FTS インデックスがあれば MATCH、それ以外は LIKE を使う。
+    """
+    mode = keyword_mode(conn, keyword)
+    return match_condition(mode, columns, line_key, script_key), match_params(mode, keyword, columns)
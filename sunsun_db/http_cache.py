@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""ETag と CDN 向けキャッシュヘッダー
+
+データは ETL を再実行して公開（デプロイ）したときにしか変わらないため、
+レスポンスの ETag はデータベースの内容の版・デプロイ・リクエストパラメータから
+決める。If-None-Match が一致すれば SQL を実行せずに 304 を返せる。
+
+- ブラウザは毎回 ETag で再検証する (Cache-Control: max-age=0)
+- デプロイに含まれるマニフェストで版が固定されている（pinned）ときは、CDN は
+  次のデプロイまで保持する (CDN-Cache-Control)。Vercel / Netlify ともデプロイ時に
+  CDN のキャッシュは破棄される
+- マニフェストが無い場合（同じ URL のファイルの差し替え）や api.py のローカルファイルは
+  デプロイせずに内容が変わりうるので、CDN には短い時間だけ保持させる
+"""
+
+import hashlib
+import os
+
+from sunsun_db.result_cache import cache_key
+
+CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+CDN_CACHE_CONTROL = 'public, max-age=31536000, stale-while-revalidate=86400'
+UNPINNED_CDN_CACHE_CONTROL = 'public, max-age=300, stale-while-revalidate=600'
+
+# デプロイを識別する環境変数（Vercel, Netlify）
+DEPLOY_ENV_VARS = ('VERCEL_DEPLOYMENT_ID', 'VERCEL_GIT_COMMIT_SHA', 'DEPLOY_ID', 'COMMIT_REF')
+
+
+def file_version(db_path):
+    """ファイルのサイズと更新時刻による版（SQL は実行しない）"""
+    stat = os.stat(db_path)
+    return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+
+def deploy_id():
+    """デプロイの識別子（API のレスポンス形式が変わったときに ETag を変えるため）"""
+    for name in DEPLOY_ENV_VARS:
+        value = os.environ.get(name)
+        if value:
+            return value
+    return ''
+
+
+def make_etag(version, endpoint, params):
+    """データベースの版・デプロイ・エンドポイント・パラメータから ETag を作る"""
+    key = repr((deploy_id(), version, cache_key(endpoint, params)))
+    return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match ヘッダーが ETag に一致するか（弱い比較）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def cache_headers(etag, pinned=False):
+    """成功レスポンス・304 に付けるヘッダー（pinned: 版がデプロイで固定されているか）"""
+    return {
+        'ETag': etag,
+        'Cache-Control': CACHE_CONTROL,
+        'CDN-Cache-Control': CDN_CACHE_CONTROL if pinned else UNPINNED_CDN_CACHE_CONTROL
+    }
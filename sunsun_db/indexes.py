@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""配信用データベースのインデックス
+
+宣言したインデックスを作成し、ANALYZE で sqlite_stat1 に統計を書き込む
+（読み取り専用で配信するので、プランナはビルド時の統計をそのまま使う）。
+各インデックスのサイズも表示する。
+
+ビルド済みのデータベースに対してだけ実行する場合（マニフェストは更新しない）:
+    python -m sunsun_db.indexes serving.db
+    python -m sunsun_db.indexes serving.db --report  # サイズの表示のみ
+"""
+
+import argparse
+import sqlite3
+
+INDEXES = {
+    # 台本検索・セリフ検索の並び順（sunsun_db.pagination.SCRIPT_ORDER_KEYS と同じ式、
+    # 公開日は sunsun_db.dates の解析済みの列）
+    'idx_scripts_order': '''
+        CREATE INDEX IF NOT EXISTS idx_scripts_order ON scripts(
+            COALESCE(match_confidence, -1),
+            COALESCE(release_date_iso, ''),
+            script_id
+        )
+    ''',
+    # 年での絞り込みと年別・月別の集計（sunsun_db.dates の列）
+    'idx_scripts_release_month': '''
+        CREATE INDEX IF NOT EXISTS idx_scripts_release_month ON scripts(
+            release_year,
+            release_month
+        )
+    ''',
+    # 公開日の範囲での絞り込み (date_from / date_to)
+    'idx_scripts_release_date': '''
+        CREATE INDEX IF NOT EXISTS idx_scripts_release_date ON scripts(release_date_iso)
+    ''',
+    # セリフ検索のキャラクター絞り込みと、characters の件数の集計
+    # （集計は character_id と script_id だけで済むのでテーブルを読まない）
+    'idx_dialogue_lines_character': '''
+        CREATE INDEX IF NOT EXISTS idx_dialogue_lines_character ON dialogue_lines(
+            character_id,
+            script_id,
+            row_number
+        )
+    ''',
+}
+
+# 台本詳細 (engine._script_detail_sql) は台本名の検索に scripts.script_name の
+# UNIQUE 制約のインデックスを、台本内の行に schema の idx_dialogue_lines_script を使う
+
+
+def create_indexes(conn):
+    """インデックスを作成（定義が変わったインデックスは作り直す）"""
+    for name, sql in INDEXES.items():
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+        rebuilt = row is not None and row[0].split() != sql.replace('IF NOT EXISTS ', '').split()
+        if rebuilt:
+            conn.execute(f'DROP INDEX {name}')
+        conn.execute(sql)
+        print(f"Index: {name}{' (rebuilt)' if rebuilt else ''}")
+    conn.commit()
+
+
+def analyze(conn):
+    """統計を更新する（sqlite_stat1）"""
+    conn.execute('ANALYZE')
+    conn.commit()
+    rows = conn.execute('SELECT COUNT(*) FROM sqlite_stat1').fetchone()[0]
+    print(f"Analyzed: {rows} rows in sqlite_stat1")
+
+
+def index_sizes(conn):
+    """インデックスごとのサイズ (bytes)。dbstat が使えなければ None"""
+    try:
+        rows = conn.execute('''
+            SELECT m.name, m.tbl_name, SUM(s.pgsize)
+            FROM dbstat s
+            JOIN sqlite_master m ON m.name = s.name
+            WHERE m.type = 'index'
+            GROUP BY m.name
+            ORDER BY SUM(s.pgsize) DESC
+        ''').fetchall()
+    except sqlite3.OperationalError:
+        return None
+    return [(name, table, size) for name, table, size in rows]
+
+
+def report_index_sizes(conn):
+    """インデックスのサイズとデータベース全体に対する割合を表示"""
+    sizes = index_sizes(conn)
+    if sizes is None:
+        print("Index sizes unavailable: SQLite was built without dbstat")
+        return
+
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    total = conn.execute('PRAGMA page_count').fetchone()[0] * page_size
+    print("Index sizes:")
+    for name, table, size in sizes:
+        print(f"  {name:36s} {table:16s} {size / 1024 / 1024:8.2f}MB ({size / total:5.1%})")
+    index_total = sum(size for _, _, size in sizes)
+    print(f"  {'(all indexes)':36s} {'':16s} {index_total / 1024 / 1024:8.2f}MB ({index_total / total:5.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='インデックスの作成・ANALYZE・サイズの表示')
+    parser.add_argument('db_path', help='ビルド済みデータベース')
+    parser.add_argument('--report', action='store_true', help='作成せずにサイズだけ表示')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    try:
+        if not args.report:
+            create_indexes(conn)
+            analyze(conn)
+        report_index_sizes(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
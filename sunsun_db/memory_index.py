@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""ウォームコンテナ向けのメモリ内検索インデックス
+
+コンテナごとに一度だけデータベースから全セリフを読み込み、台本ごとに
+セリフ本文・正規化済み（sunsun_db.normalize と同じ規則）の本文・メタデータを保持する。
+以降のキーワード検索は SQLite を使わずにこのインデックスだけで処理する。
+
+メモリを消費するため既定では無効。環境変数 SUNSUN_MEMORY_INDEX=1 で有効にする。
+構築時間と使用メモリはログに出力されるので、プラットフォームごとに判断する。
+"""
+
+import os
+import sys
+import threading
+import time
+
+from sunsun_db.dates import has_release_dates
+from sunsun_db.engine import SAMPLE_DIALOGUES, DialogueLine, GroupedScript
+from sunsun_db.normalize import normalize_text
+from sunsun_db.pool import connect
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def memory_index_enabled():
+    """メモリ内インデックスを使うかどうか"""
+    return os.environ.get('SUNSUN_MEMORY_INDEX', '') in ('1', 'true')
+
+
+def resident_memory():
+    """現在の常駐メモリ (bytes)。取得できなければ None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class ScriptEntry:
+    """1台本分のデータ"""
+
+    __slots__ = ('metadata', 'characters', 'dialogues', 'row_numbers', 'normalized')
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+        self.characters = []
+        self.dialogues = []
+        self.row_numbers = []
+        self.normalized = []
+
+
+class MemoryIndex:
+    """台本ごとのセリフ配列を持つ検索インデックス"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.scripts = []
+        self.build_time = 0.0
+        self.memory_bytes = None
+
+    def build(self):
+        """データベースからインデックスを構築する"""
+        start = time.perf_counter()
+        rss_before = resident_memory()
+
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        # 並び順は engine.search_grouped と同じく解析済みの公開日を使う
+        sort_date = 'release_date_iso' if has_release_dates(conn) else 'release_date'
+        cursor.execute(f'''
+            SELECT script_id, script_name, script_url, release_date, youtube_title, youtube_url,
+                   {sort_date} AS sort_date
+            FROM scripts
+            ORDER BY script_name
+        ''')
+        entries = {}
+        for row in cursor.fetchall():
+            entries[row['script_id']] = ScriptEntry({
+                'script_name': row['script_name'],
+                'script_url': row['script_url'] or '',
+                'release_date': row['release_date'] or '',
+                'youtube_title': row['youtube_title'] or '',
+                'youtube_url': row['youtube_url'] or '',
+                'sort_date': row['sort_date'] or ''
+            })
+
+        cursor.execute('''
+            SELECT d.script_id, c.name, d.dialogue, d.row_number
+            FROM dialogue_lines d
+            LEFT JOIN characters c ON c.character_id = d.character_id
+            WHERE d.dialogue IS NOT NULL AND d.dialogue != ""
+            ORDER BY d.script_id, d.row_number
+        ''')
+        for script_id, character, dialogue, row_number in cursor:
+            entry = entries.get(script_id)
+            if entry is None:
+                continue
+            entry.characters.append(sys.intern(character or ''))
+            entry.dialogues.append(dialogue)
+            entry.row_numbers.append(row_number or 0)
+            entry.normalized.append(normalize_text(dialogue))
+        conn.close()
+
+        self.scripts = [entry for entry in entries.values() if entry.dialogues]
+
+        self.build_time = time.perf_counter() - start
+        rss_after = resident_memory()
+        if rss_before is not None and rss_after is not None:
+            self.memory_bytes = rss_after - rss_before
+
+        memory = f"{self.memory_bytes / 1024 / 1024:.1f}MB" if self.memory_bytes is not None else 'unknown'
+        print(
+            f"Memory index built: {len(self.scripts)} scripts, "
+            f"{sum(len(e.dialogues) for e in self.scripts)} dialogues, "
+            f"{self.build_time:.2f}s, resident memory +{memory}"
+        )
+        return self
+
+    def search(self, keyword, limit=None):
+        """キーワードを含むセリフがある台本を、マッチ数・公開日の降順で返す
+
+        (上位 limit 件の GroupedScript, マッチした台本の総数) を返す（engine.search_grouped と同じ形）。
+        """
+        needle = normalize_text(keyword)
+        results = []
+
+        for entry in self.scripts:
+            matches = [i for i, text in enumerate(entry.normalized) if needle in text]
+            if not matches:
+                continue
+
+            characters = {}
+            for i in matches:
+                if entry.characters[i]:
+                    characters[entry.characters[i]] = True
+
+            metadata = entry.metadata
+            results.append((metadata['sort_date'], GroupedScript(
+                metadata['script_name'],
+                metadata['script_url'],
+                metadata['release_date'],
+                metadata['youtube_title'],
+                metadata['youtube_url'],
+                [
+                    DialogueLine(entry.characters[i], entry.dialogues[i], entry.row_numbers[i])
+                    for i in matches[:SAMPLE_DIALOGUES]
+                ],
+                ', '.join(characters),
+                len(matches)
+            )))
+
+        results.sort(key=lambda x: (x[1].match_count, x[0]), reverse=True)
+        return [result for _, result in results[:limit]], len(results)
+
+
+def get_memory_index(db_path):
+    """コンテナ内で共有するインデックスを取得（初回または DB 変更時に構築）"""
+    global _index
+
+    with _index_lock:
+        if _index is None or _index.db_path != db_path:
+            _index = MemoryIndex(db_path).build()
+        return _index
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""検索用の正規化テキスト
+
+セリフ本文と台本メタデータの検索対象列について、正規化したコピーを
+`<列名>_norm` 列に保存する。正規化は以下の順に行う。
+
+- NFKC（全角英数字・半角カナなどの幅を統一）
+- casefold（大文字・小文字を区別しない）
+- カタカナ → ひらがな
+
+クエリにも同じ normalize_text() を適用し、正規化列に対して FTS / LIKE で
+検索するため、リクエスト時に行ごとの Python 文字列処理は不要になる。
+
+正規化列はビルド時（と ETL の最後）に計算する。元の列が更新されると
+トリガーで正規化列が NULL に戻るので、refresh_normalized_text() で再計算する。
+"""
+
+import sqlite3
+import unicodedata
+
+# テーブル: (主キー, 正規化する列)
+NORMALIZED_COLUMNS = {
+    'dialogue_lines': ('dialogue_id', ['dialogue']),
+    'scripts': ('script_id', ['script_name', 'youtube_title', 'themes', 'subjects']),
+}
+
+NORMALIZED_SUFFIX = '_norm'
+
+# カタカナ（ァ〜ヶ、ヽヾ）→ ひらがな
+KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+KATAKANA_TO_HIRAGANA.update({0x30FD: 0x309D, 0x30FE: 0x309E})
+
+
+def normalize_text(text):
+    """検索用に正規化する（NFKC + casefold + カタカナのひらがな化）"""
+    if text is None:
+        return None
+    return unicodedata.normalize('NFKC', text).casefold().translate(KATAKANA_TO_HIRAGANA)
+
+
+def normalized_column(column):
+    """正規化列の列名"""
+    return column + NORMALIZED_SUFFIX
+
+
+def has_normalized_text(conn):
+    """正規化列が作成済みかどうか"""
+    try:
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(dialogue_lines)')]
+    except sqlite3.OperationalError:
+        return False
+    return normalized_column('dialogue') in columns
+
+
+def refresh_normalized_text(conn, full=False):
+    """正規化列を計算する（full=False なら未計算の行のみ）"""
+    if not has_normalized_text(conn):
+        print("Skipping normalized text: columns not found (run python -m sunsun_db.build)")
+        return
+
+    conn.create_function('normalize_text', 1, normalize_text, deterministic=True)
+    cursor = conn.cursor()
+    for table, (_, columns) in NORMALIZED_COLUMNS.items():
+        for column in columns:
+            target = normalized_column(column)
+            where = '' if full else f'WHERE {target} IS NULL AND {column} IS NOT NULL'
+            cursor.execute(f'UPDATE {table} SET {target} = normalize_text({column}) {where}')
+            if cursor.rowcount:
+                print(f"Normalized {table}.{column}: {cursor.rowcount} rows")
+    conn.commit()
+
+
+def add_normalized_text(conn):
+    """正規化列と無効化トリガーを作成し、全行を計算する"""
+    cursor = conn.cursor()
+    for table, (key, columns) in NORMALIZED_COLUMNS.items():
+        existing = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+        for column in columns:
+            target = normalized_column(column)
+            if target not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {target} TEXT')
+
+            # 元の列が変わったら再計算対象にする（ユーザー定義関数を使わないので
+            # normalize_text を登録していない接続からの更新でも動く）
+            trigger = f'{table}_{target}_reset'
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute(f'''
+                CREATE TRIGGER {trigger} AFTER UPDATE OF {column} ON {table}
+                WHEN new.{column} IS NOT old.{column} BEGIN
+                    UPDATE {table} SET {target} = NULL WHERE {key} = new.{key};
+                END
+            ''')
+
+    refresh_normalized_text(conn, full=True)
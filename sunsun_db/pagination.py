@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""カーソル（キーセット）ページネーション
+
+OFFSET は読み飛ばす行を毎回走査するため、深いページほど遅くなる。
+代わりに直前のページの最後の行のソートキーを不透明なカーソル文字列にして返し、
+次のページはそのキーより後ろの行だけをインデックスから読む。
+"""
+
+import base64
+import json
+import threading
+from collections import OrderedDict
+
+from sunsun_db.schema import get_data_version
+
+# 台本の並び順: match_confidence DESC, 公開日 DESC, script_id DESC
+# （NULL は最後に並ぶよう COALESCE し、idx_scripts_order と同じ式を使う）。
+# 公開日は解析済みの release_date_iso で比べる（'2020/1/5' と '2020/12/01' のような
+# 表記の違いで順序が崩れない）。列が無いデータベースでは元の release_date を使う
+SCRIPT_ORDER_KEYS = [
+    'COALESCE({s}match_confidence, -1)',
+    "COALESCE({s}{release_date}, '')",
+    '{s}script_id',
+]
+
+# 件数キャッシュの上限（LRU で追い出す）
+COUNT_CACHE_SIZE = 256
+
+# Flask のスレッドや ASGI のスレッドプールから同時に使われるのでロックで保護する
+_count_cache = OrderedDict()
+_count_cache_lock = threading.Lock()
+
+
+def script_order_keys(alias='', typed_dates=True):
+    """台本の並び順の式（alias はテーブル別名、typed_dates は公開日の列の有無）"""
+    prefix = f'{alias}.' if alias else ''
+    release_date = 'release_date_iso' if typed_dates else 'release_date'
+    return [key.format(s=prefix, release_date=release_date) for key in SCRIPT_ORDER_KEYS]
+
+
+def script_order_by(alias='', typed_dates=True):
+    """台本の並び順の ORDER BY 句"""
+    return ', '.join(f'{key} DESC' for key in script_order_keys(alias, typed_dates))
+
+
+def script_sort_values(match_confidence, release_date, script_id):
+    """行の値から台本のソートキーを作る（release_date は並び順に使う列の値）"""
+    return [
+        match_confidence if match_confidence is not None else -1,
+        release_date or '',
+        script_id
+    ]
+
+
+def scripts_after(values, alias='', typed_dates=True):
+    """カーソルより後ろの台本を選ぶ条件とパラメータ
+
+    先頭列だけの範囲条件を重ねて、インデックスの範囲検索が使われるようにする。
+    """
+    keys = script_order_keys(alias, typed_dates)
+    condition = f"{keys[0]} <= ? AND ({', '.join(keys)}) < (?, ?, ?)"
+    return condition, [values[0]] + list(values)
+
+
+def encode_cursor(values):
+    """ソートキーをカーソル文字列にする"""
+    raw = json.dumps(values, ensure_ascii=False, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, length):
+    """カーソル文字列をソートキーに戻す"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise ValueError('無効なカーソルです')
+
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError('無効なカーソルです')
+    return values
+
+
+def cached_count(conn, sql, params):
+    """件数クエリの結果を data_version ごとにキャッシュする"""
+    db_file = conn.execute('PRAGMA database_list').fetchone()[2]
+    key = (db_file, get_data_version(conn), sql, tuple(params))
+
+    with _count_cache_lock:
+        if key in _count_cache:
+            _count_cache.move_to_end(key)
+            return _count_cache[key]
+
+    # 件数クエリはロックの外で実行する（同時に数えた場合は後の結果で上書きされるだけ）
+    count = conn.execute(sql, params).fetchone()[0]
+
+    with _count_cache_lock:
+        _count_cache[key] = count
+        _count_cache.move_to_end(key)
+        while len(_count_cache) > COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return count
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""読み取り専用 SQLite 接続のプール
+
+配信時のデータベースは読み取り専用なので、`mode=ro&immutable=1` で開いた接続を
+プロセス内（ウォームコンテナ内）で使い回す。スキーマの再解析やページキャッシュの
+作り直しがリクエストごとに発生しなくなる。
+
+- 接続の close() はプールへの返却になるため、ハンドラ側は従来どおり
+  `conn = get_db_connection()` ... `conn.close()` と書ける
+- Flask のスレッドサーバーからも使えるよう、貸し出しはロックで保護する
+- ファイルが差し替えられた（inode・サイズ・更新時刻が変わった）場合は
+  古い接続を破棄して開き直す
+- 未使用の接続は貸し出す前に SELECT 1 で確かめ、エラーになれば破棄して開き直す
+  （返却時のロールバックが失敗した接続もプールに戻さない）
+- 各接続には配信用プロファイル（ファイル全体の mmap、大きめのページキャッシュ、
+  一時データのメモリ化）を適用する
+- データベースから一度調べれば済む値（列やインデックスの有無など）は memo() で
+  ファイルの世代ごとに覚えておき、ファイルが差し替えられたら捨てる
+- ビルド前（正規化前）のファイルは開いた時点でエラーにする（各クエリの
+  "no such table: scripts" ではなく、ビルドが必要なことが分かるメッセージにする）
+"""
+
+import os
+import sqlite3
+import threading
+from urllib.parse import quote
+
+# 1接続あたりのページキャッシュ (KiB)
+DEFAULT_CACHE_SIZE_KIB = 64 * 1024
+
+# mmap サイズ (bytes)。None ならファイル全体を割り当てる
+DEFAULT_MMAP_SIZE = None
+
+# ファイル全体を mmap するときの余裕分
+MMAP_HEADROOM = 16 * 1024 * 1024
+
+# プールに保持する未使用接続の上限
+DEFAULT_MAX_IDLE = 8
+
+# 1接続あたりのプリペアドステートメントのキャッシュ数（sunsun_db.engine の SQL がすべて収まる数）
+CACHED_STATEMENTS = 256
+
+
+def is_alive(conn):
+    """接続がクエリを実行できる状態か（閉じられた接続や I/O エラーなら False）"""
+    try:
+        conn.execute('SELECT 1').fetchone()
+    except sqlite3.Error:
+        return False
+    return True
+
+
+def apply_serving_profile(conn, db_path, cache_size_kib=DEFAULT_CACHE_SIZE_KIB, mmap_size=DEFAULT_MMAP_SIZE):
+    """読み取り用接続に配信用の PRAGMA を設定する
+
+    mmap でファイルを直接参照すると、全件スキャンでも read() システムコールと
+    ページキャッシュへのコピーが発生しない。
+    """
+    if mmap_size is None:
+        mmap_size = os.path.getsize(db_path) + MMAP_HEADROOM
+    conn.execute(f'PRAGMA mmap_size = {int(mmap_size)}')
+    conn.execute(f'PRAGMA cache_size = -{int(cache_size_kib)}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+
+
+class PooledConnection(sqlite3.Connection):
+    """close() でプールに返却される接続"""
+
+    pool = None
+    generation = None
+    checked_out = False
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        elif self.checked_out:
+            # 二重に close() されても一度だけ返却する
+            self.checked_out = False
+            self.pool.release(self)
+
+    def discard(self):
+        """プールに戻さずに閉じる"""
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """1つのデータベースファイルに対する接続プール"""
+
+    def __init__(self, db_path, cache_size_kib=DEFAULT_CACHE_SIZE_KIB,
+                 mmap_size=DEFAULT_MMAP_SIZE, max_idle=DEFAULT_MAX_IDLE):
+        self.db_path = db_path
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []
+        self._identity = None
+        self._generation = 0
+        # 現在の世代のファイルについて覚えている値
+        self._memo = {}
+
+    def _file_identity(self):
+        stat = os.stat(self.db_path)
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _open(self):
+        # sunsun_db.schema は memo() を使うので、ここで読み込む
+        from sunsun_db.schema import is_normalized
+
+        uri = f'file:{quote(os.path.abspath(self.db_path))}?mode=ro&immutable=1'
+        conn = sqlite3.connect(
+            uri, uri=True, check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS, factory=PooledConnection
+        )
+        if not is_normalized(conn):
+            conn.discard()
+            raise sqlite3.DatabaseError(
+                f"{self.db_path} はビルドされていません（scripts テーブルがありません）。"
+                "python -m sunsun_db.build でビルドしたファイルを配信してください"
+            )
+        conn.row_factory = sqlite3.Row
+        apply_serving_profile(conn, self.db_path, self.cache_size_kib, self.mmap_size)
+        return conn
+
+    def connect(self):
+        """接続を借りる（close() で返却）"""
+        identity = self._file_identity()
+
+        with self._lock:
+            # ファイルが差し替えられていたら既存の接続はすべて破棄する
+            if identity != self._identity:
+                stale = self._idle
+                self._idle = []
+                self._identity = identity
+                self._generation += 1
+                self._memo = {}
+            else:
+                stale = []
+            conn = self._idle.pop() if self._idle else None
+            generation = self._generation
+
+        for old in stale:
+            old.discard()
+
+        if conn is not None and not is_alive(conn):
+            conn.discard()
+            conn = None
+        if conn is None:
+            conn = self._open()
+        conn.pool = self
+        conn.generation = generation
+        conn.checked_out = True
+        return conn
+
+    def release(self, conn):
+        """接続を返却する"""
+        try:
+            # リクエストの計測 (sunsun_db.timing) が設定したハンドラを外す
+            conn.set_progress_handler(None, 0)
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.discard()
+            return
+
+        with self._lock:
+            keep = conn.generation == self._generation and len(self._idle) < self.max_idle
+            if keep:
+                self._idle.append(conn)
+
+        if not keep:
+            conn.discard()
+
+    def memo(self, generation, name, compute):
+        """世代 generation のファイルについて compute() の結果を覚えておく
+
+        古い世代の接続から呼ばれた場合は計算するだけで覚えない。
+        """
+        with self._lock:
+            if generation == self._generation and name in self._memo:
+                return self._memo[name]
+        value = compute()
+        with self._lock:
+            if generation == self._generation:
+                self._memo[name] = value
+        return value
+
+    def close_all(self):
+        """未使用の接続をすべて閉じる"""
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+            self._generation += 1
+            self._memo = {}
+        for conn in idle:
+            conn.discard()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path):
+    """データベースファイルごとのプールを取得"""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(db_path)
+        return pool
+
+
+def connect(db_path):
+    """プールから読み取り専用接続を借りる"""
+    return get_pool(db_path).connect()
+
+
+def memo(conn, name, compute):
+    """conn のデータベースについて compute(conn) の結果を返す
+
+    プールの接続ならファイルの世代ごとに1回だけ計算する（ファイルが差し替えられると
+    前の世代の値は捨てられる）。プール外の接続（ビルドや ETL）では毎回計算する。
+    """
+    pool = getattr(conn, 'pool', None)
+    if pool is None:
+        return compute(conn)
+    return pool.memo(conn.generation, name, lambda: compute(conn))
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""サーバーレス環境向けのデータベース取得
+
+Dropbox からデータベースファイルをダウンロードし、/tmp にキャッシュする。
+
+- キャッシュパスはマニフェストの SHA-256 から決まるため、同じサンドボックス内の
+  別インスタンスや次回のコールドスタートでも再利用できる
+- 一時ファイルに書き込み、サイズと SHA-256 を検証してからリネームするので、
+  書きかけのファイルが読まれることはない
+- ファイルロックで同時ダウンロードを防ぐ
+- 環境変数 SUNSUN_DB_PATH を指定するとダウンロードせずにそのファイルを使う（テスト用）
+- 圧縮済みの配信ファイル（gzip / xz、zstandard があれば zstd）はストリームのまま
+  展開してキャッシュファイルに書き込む
+- ビルド前（正規化前）のファイルが配信されている場合は、キャッシュに置く前に
+  sunsun_db.build と同じ手順でビルドする（コールドスタートが遅くなるので警告を出す）
+"""
+
+import fcntl
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import shutil
+import sqlite3
+import ssl
+import tempfile
+import time
+import urllib.request
+
+try:
+    import zstandard
+except ImportError:  # 標準ライブラリのみの環境では gzip / xz を使う
+    zstandard = None
+
+from sunsun_db.http_cache import file_version
+from sunsun_db.schema import is_normalized
+
+# Dropbox直接ダウンロードURL
+DROPBOX_URL = 'https://www.dropbox.com/scl/fi/dljhp6xzshdgvq7vqk3sz/sunsun_final_dialogue_database_proper.db?rlkey=qlf38ydm1b0n0ocsdbpjx0ih8&st=2h1nmfhq&dl=1'
+
+# 配信中のデータベースのマニフェスト（sha256, size, compression, compressed_size, url）
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db_manifest.json')
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'sunsun_db')
+CHUNK_SIZE = 1024 * 1024
+
+# 圧縮形式と拡張子
+COMPRESSION_EXTENSIONS = {
+    'gzip': '.gz',
+    'xz': '.xz',
+    'zstd': '.zst',
+}
+
+# プロセス内で取得済みのパス
+_db_path = None
+
+
+def load_manifest():
+    """マニフェストを読み込む（無ければ空）"""
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def file_sha256(path):
+    """ファイルの SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compress_database(db_path, compression):
+    """配信用の圧縮ファイルを作成し、そのパスを返す"""
+    output_path = db_path + COMPRESSION_EXTENSIONS[compression]
+
+    with open(db_path, 'rb') as src:
+        if compression == 'gzip':
+            with gzip.open(output_path, 'wb', compresslevel=9) as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        elif compression == 'xz':
+            with lzma.open(output_path, 'wb', preset=6) as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        else:
+            if zstandard is None:
+                raise RuntimeError("zstd には zstandard パッケージが必要です")
+            with open(output_path, 'wb') as dst:
+                zstandard.ZstdCompressor(level=19).copy_stream(src, dst)
+
+    size = os.path.getsize(db_path)
+    compressed_size = os.path.getsize(output_path)
+    print(f"Compressed ({compression}): {size} -> {compressed_size} bytes ({compressed_size / size:.1%})")
+    return output_path
+
+
+def write_manifest(db_path, manifest_path=None, url=None, compressed_path=None, compression=None):
+    """データベースファイルのマニフェストを書き出す
+
+    sha256 / size は展開後のデータベースファイルの値。
+    """
+    manifest = {
+        'sha256': file_sha256(db_path),
+        'size': os.path.getsize(db_path)
+    }
+    if compressed_path:
+        manifest['compression'] = compression
+        manifest['compressed_size'] = os.path.getsize(compressed_path)
+    if url:
+        manifest['url'] = url
+
+    manifest_path = manifest_path or db_path + '.manifest.json'
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        f.write('\n')
+
+    print(f"Manifest written to {manifest_path}")
+    return manifest
+
+
+def cache_path(manifest, url):
+    """キャッシュファイルのパス（内容のハッシュ、無ければ URL のハッシュで決まる）"""
+    key = manifest.get('sha256') or hashlib.sha256(url.encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f'{key[:16]}.db')
+
+
+def open_url(url):
+    """URL を開く"""
+    # SSL証明書検証をスキップ
+    ssl_context = ssl.create_default_context()
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+
+    opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
+    return opener.open(url)
+
+
+class CountingReader:
+    """読み込んだバイト数と読み込み時間を記録するラッパー"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+        self.read_time = 0.0
+
+    def read(self, size=-1):
+        start = time.perf_counter()
+        data = self.raw.read(size)
+        self.read_time += time.perf_counter() - start
+        self.bytes_read += len(data)
+        return data
+
+
+def detect_compression(url, manifest):
+    """圧縮形式（マニフェスト優先、無ければ URL の拡張子から判定）"""
+    if 'compression' in manifest:
+        return manifest['compression']
+    path = url.split('?', 1)[0]
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+
+def open_decompressed(stream, compression):
+    """ストリームを展開しながら読むファイルオブジェクトを返す"""
+    if not compression:
+        return stream
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if compression == 'xz':
+        return lzma.LZMAFile(stream)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd の展開には zstandard パッケージが必要です")
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def fetch(url, dest, manifest):
+    """ダウンロード（必要なら展開）して検証し、dest にアトミックに配置する
+
+    ダウンロードしたバイト数・展開後のサイズ・展開にかかった時間を返す。
+    """
+    part_path = f'{dest}.part.{os.getpid()}'
+    compression = detect_compression(url, manifest)
+    digest = hashlib.sha256()
+    size = 0
+    read_time = 0.0
+
+    try:
+        with open_url(url) as response, open(part_path, 'wb') as f:
+            raw = CountingReader(response)
+            source = open_decompressed(raw, compression)
+            while True:
+                start = time.perf_counter()
+                chunk = source.read(CHUNK_SIZE)
+                read_time += time.perf_counter() - start
+                if not chunk:
+                    break
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+
+        expected_compressed_size = manifest.get('compressed_size')
+        if compression and expected_compressed_size is not None and raw.bytes_read != expected_compressed_size:
+            raise ValueError(f"Compressed size mismatch: expected {expected_compressed_size}, got {raw.bytes_read}")
+
+        expected_size = manifest.get('size')
+        if expected_size is not None and size != expected_size:
+            raise ValueError(f"Size mismatch: expected {expected_size}, got {size}")
+
+        expected_sha256 = manifest.get('sha256')
+        if expected_sha256 and digest.hexdigest() != expected_sha256:
+            raise ValueError(f"SHA-256 mismatch: expected {expected_sha256}, got {digest.hexdigest()}")
+
+        ensure_built(part_path)
+        os.replace(part_path, dest)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    return {
+        'compression': compression or 'none',
+        'downloaded_bytes': raw.bytes_read,
+        'size': size,
+        # 展開側の読み込み時間からネットワーク読み込み分を引いたもの
+        'decompress_time': read_time - raw.read_time if compression else 0.0
+    }
+
+
+def ensure_built(path):
+    """正規化前のデータベースなら配信用にビルドする（ビルドした場合は True）"""
+    conn = sqlite3.connect(path)
+    try:
+        built = is_normalized(conn)
+    finally:
+        conn.close()
+    if built:
+        return False
+
+    print(
+        "Warning: the downloaded database is not built (no scripts table); building it now. "
+        "Publish the output of python -m sunsun_db.build to skip this step"
+    )
+    # sunsun_db.build はこのモジュールを読み込むので、ここで読み込む
+    from sunsun_db.build import run_build_steps
+    run_build_steps(path)
+    return True
+
+
+def download_database():
+    """データベースファイルのパスを返す（必要ならダウンロード）"""
+    global _db_path
+
+    local_path = os.environ.get('SUNSUN_DB_PATH')
+    if local_path:
+        return local_path
+
+    if _db_path and os.path.exists(_db_path):
+        return _db_path
+
+    manifest = load_manifest()
+    url = os.environ.get('SUNSUN_DB_URL') or manifest.get('url') or DROPBOX_URL
+    path = cache_path(manifest, url)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(f'{path}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # 検証済みのファイルしかリネームされないため、存在すれば再利用できる
+            if os.path.exists(path):
+                print(f"Using cached database {path}")
+            else:
+                print(f"Downloading database from {url}")
+                start = time.time()
+                result = fetch(url, path, manifest)
+                print(
+                    f"Database downloaded to {path} "
+                    f"({result['downloaded_bytes']} bytes downloaded, {result['compression']}, "
+                    f"{result['size']} bytes on disk, decompress {result['decompress_time']:.2f}s, "
+                    f"total {time.time() - start:.2f}s)"
+                )
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    _db_path = path
+    return _db_path
+
+
+def manifest_version():
+    """デプロイに含まれるマニフェストの SHA-256（SUNSUN_DB_PATH 指定時・マニフェストが無ければ None）
+
+    ダウンロードしたファイルはこの SHA-256 で検証されるので、同じデプロイの間は
+    データベースの内容が変わらない。
+    """
+    if os.environ.get('SUNSUN_DB_PATH'):
+        return None
+    return load_manifest().get('sha256') or None
+
+
+def content_version():
+    """配信中のデータベースの内容の版
+
+    マニフェストの SHA-256 が分かればダウンロードせずに決まる。
+    SUNSUN_DB_PATH 指定時やマニフェストが無い場合はファイルのサイズと更新時刻を使う
+    （データベースのダウンロードが必要で、コンテナごとに版が変わりうる）。
+    """
+    sha256 = manifest_version()
+    if sha256:
+        return sha256
+
+    return file_version(download_database())
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""検索結果のキャッシュ
+
+エンドポイント名と正規化したパラメータをキーに、シリアライズ済みの JSON
+(bytes) をプロセス内に保持する。ウォームコンテナや Flask のワーカーでは
+同じクエリの2回目以降がメモリ参照だけで済む。
+
+- 合計バイト数が上限を超えたら最も古く使われたものから捨てる (LRU)
+- データベースの版（ファイルの差し替え・data_version）が変わったら全件破棄する
+- ヒット・ミス・追い出しの回数を stats() で返す
+
+上限は環境変数 SUNSUN_RESULT_CACHE_BYTES で変更できる（0 で無効）。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from sunsun_db.pool import connect
+from sunsun_db.schema import get_data_version
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def database_version(db_path):
+    """キャッシュの有効範囲を決めるデータベースの版"""
+    conn = connect(db_path)
+    try:
+        # generation はファイルが差し替えられるたびに進む
+        return (db_path, conn.generation, get_data_version(conn))
+    finally:
+        conn.close()
+
+
+def cache_key(endpoint, params):
+    """エンドポイント名とパラメータからキーを作る（空の値は無視し、順序を揃える）"""
+    items = []
+    for name, value in params.items():
+        value = str(value).strip()
+        if value:
+            items.append((name, value))
+    return (endpoint,) + tuple(sorted(items))
+
+
+class ResultCache:
+    """バイト数で上限を決める LRU キャッシュ"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self.size = 0
+            self._version = version
+
+    def get(self, version, key):
+        """キャッシュ済みの bytes（無ければ None）"""
+        with self._lock:
+            self._check_version(version)
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, version, key, body):
+        """結果を保存する（上限を超える分は古いものから捨てる）"""
+        if len(body) > self.max_bytes:
+            return
+
+        with self._lock:
+            self._check_version(version)
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = body
+            self.size += len(body)
+
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """カウンタと使用量"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """プロセス内で共有するキャッシュ"""
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(int(os.environ.get('SUNSUN_RESULT_CACHE_BYTES', DEFAULT_MAX_BYTES)))
+        return _cache
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""正規化スキーマへの移行
+
+台本単位のメタデータ（script_name, themes, youtube_url など）は従来
+`dialogues` の全行に繰り返し保存されていた。これを以下に分割する。
+
+- scripts: 台本メタデータ（台本1件につき1行）
+- characters: キャラクター名
+- dialogue_lines: セリフ本体 (script_id, row_number, character_id, dialogue)
+
+従来のクエリや ETL スクリプトがそのまま動くよう、同じ列を持つ
+互換ビュー `dialogues` を作成する（INSERT/UPDATE/DELETE もトリガーで対応）。
+"""
+
+import sqlite3
+
+from sunsun_db.pool import memo
+
+# 台本単位の列（scripts テーブルに移す）
+SCRIPT_COLUMNS = [
+    'script_name',
+    'themes',
+    'subjects',
+    'story_structure',
+    'release_date',
+    'youtube_title',
+    'youtube_url',
+    'youtube_video_id',
+    'script_url',
+    'category',
+    'match_confidence',
+]
+
+# セリフ単位の列
+LINE_COLUMNS = ['character', 'dialogue', 'row_number']
+
+LEGACY_TABLE = 'dialogues_legacy'
+
+
+def is_normalized(conn):
+    """正規化済み（dialogues がビュー）かどうか"""
+    row = conn.execute(
+        "SELECT type FROM sqlite_master WHERE name = 'dialogues'"
+    ).fetchone()
+    return row is not None and row[0] == 'view'
+
+
+def create_schema(conn):
+    """正規化テーブルを作成"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scripts (
+            script_id INTEGER PRIMARY KEY,
+            script_name TEXT NOT NULL UNIQUE,
+            themes TEXT,
+            subjects TEXT,
+            story_structure TEXT,
+            release_date TEXT,
+            youtube_title TEXT,
+            youtube_url TEXT,
+            youtube_video_id TEXT,
+            script_url TEXT,
+            category TEXT,
+            match_confidence REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS characters (
+            character_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dialogue_lines (
+            dialogue_id INTEGER PRIMARY KEY,
+            script_id INTEGER NOT NULL REFERENCES scripts(script_id),
+            row_number INTEGER,
+            character_id INTEGER REFERENCES characters(character_id),
+            dialogue TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_dialogue_lines_script
+        ON dialogue_lines(script_id, row_number)
+    ''')
+
+
+def create_compat_view(conn):
+    """互換ビュー dialogues と更新用トリガーを作成"""
+    script_columns = ',\n            '.join(f's.{c}' for c in SCRIPT_COLUMNS)
+
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        CREATE VIEW dialogues AS
+        SELECT
+            d.dialogue_id,
+            d.script_id,
+            d.character_id,
+            c.name AS character,
+            d.dialogue,
+            d.row_number,
+            {script_columns}
+        FROM dialogue_lines d
+        JOIN scripts s ON s.script_id = d.script_id
+        LEFT JOIN characters c ON c.character_id = d.character_id
+    ''')
+
+    create_compat_triggers(conn)
+
+
+def create_compat_triggers(conn, aliases=False):
+    """互換ビュー dialogues の INSERT/UPDATE/DELETE トリガーを作成（作り直し）する
+
+    aliases なら characters.aliases（sunsun_db.characters が追加する列）の別名も
+    正式名の ID に変換し、別名の表記で新しいキャラクターを作らない。
+    """
+    script_updates = ', '.join(f'{c} = new.{c}' for c in SCRIPT_COLUMNS)
+    script_values = ', '.join(f'new.{c}' for c in SCRIPT_COLUMNS)
+    columns = ', '.join(SCRIPT_COLUMNS)
+
+    # キャラクター名を ID に変換する式と、新しいキャラクターとして追加する条件
+    character_id = '(SELECT character_id FROM characters WHERE name = new.character)'
+    new_character = "new.character IS NOT NULL AND new.character != ''"
+    if aliases:
+        alias_lookup = 'SELECT c.character_id FROM characters c, json_each(c.aliases) a WHERE a.value = new.character'
+        character_id = f'COALESCE({character_id}, ({alias_lookup}))'
+        new_character += f' AND NOT EXISTS ({alias_lookup})'
+
+    cursor = conn.cursor()
+    for trigger in ('dialogues_insert', 'dialogues_update', 'dialogues_delete'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    cursor.execute(f'''
+        CREATE TRIGGER dialogues_insert INSTEAD OF INSERT ON dialogues BEGIN
+            INSERT OR IGNORE INTO scripts ({columns}) VALUES ({script_values});
+            INSERT OR IGNORE INTO characters (name)
+                SELECT new.character WHERE {new_character};
+            INSERT INTO dialogue_lines (script_id, row_number, character_id, dialogue)
+            VALUES (
+                (SELECT script_id FROM scripts WHERE script_name = new.script_name),
+                new.row_number,
+                {character_id},
+                new.dialogue
+            );
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER dialogues_update INSTEAD OF UPDATE ON dialogues BEGIN
+            UPDATE scripts SET {script_updates} WHERE script_id = old.script_id;
+            INSERT OR IGNORE INTO characters (name)
+                SELECT new.character WHERE {new_character};
+            UPDATE dialogue_lines SET
+                row_number = new.row_number,
+                character_id = {character_id},
+                dialogue = new.dialogue
+            WHERE dialogue_id = old.dialogue_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER dialogues_delete INSTEAD OF DELETE ON dialogues BEGIN
+            DELETE FROM dialogue_lines WHERE dialogue_id = old.dialogue_id;
+        END
+    ''')
+
+
+def update_script_column(conn, column, values):
+    """台本単位の列を台本名ごとに更新し、更新した行数を返す
+
+    values は (script_name, value) のリスト。正規化済みなら scripts を台本1件につき
+    1回だけ更新する（互換ビュー経由ではセリフの行数だけトリガーが実行され、
+    rowcount も 0 になる）。値が変わらない台本は更新しない。
+    """
+    if column not in SCRIPT_COLUMNS or column == 'script_name':
+        raise ValueError(f"台本単位の列ではありません: {column}")
+    table = 'scripts' if is_normalized(conn) else 'dialogues'
+    cursor = conn.executemany(
+        f'UPDATE {table} SET {column} = ? WHERE script_name = ? AND {column} IS NOT ?',
+        [(value, script_name, value) for script_name, value in values]
+    )
+    return cursor.rowcount
+
+
+def drop_legacy_fts(conn):
+    """旧 dialogues テーブル向けの FTS インデックスを削除"""
+    cursor = conn.cursor()
+    for suffix in ('ai', 'ad', 'au'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS dialogues_fts_{suffix}')
+    cursor.execute('DROP TABLE IF EXISTS dialogues_fts')
+
+
+def normalize_schema(conn):
+    """旧 dialogues テーブルを正規化スキーマへ移行する"""
+    if is_normalized(conn):
+        print("Already normalized")
+        return
+
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA table_info(dialogues)')
+    existing = [row[1] for row in cursor.fetchall()]
+    unknown = [c for c in existing if c not in SCRIPT_COLUMNS + LINE_COLUMNS]
+    if unknown:
+        raise ValueError(f"未対応の列があります: {', '.join(unknown)}")
+
+    # 旧データに存在しない列は NULL で補う
+    def source(column):
+        return f'l.{column}' if column in existing else f'NULL AS {column}'
+
+    drop_legacy_fts(conn)
+    cursor.execute(f'ALTER TABLE dialogues RENAME TO {LEGACY_TABLE}')
+    create_schema(conn)
+
+    # 台本メタデータ（各台本の先頭行の値を採用）
+    columns = ', '.join(SCRIPT_COLUMNS)
+    cursor.execute(f'''
+        INSERT INTO scripts ({columns})
+        SELECT {', '.join(source(c) for c in SCRIPT_COLUMNS)}
+        FROM {LEGACY_TABLE} l
+        WHERE l.rowid IN (
+            SELECT MIN(rowid) FROM {LEGACY_TABLE}
+            WHERE script_name IS NOT NULL
+            GROUP BY script_name
+        )
+        ORDER BY l.script_name
+    ''')
+
+    cursor.execute(f'''
+        INSERT INTO characters (name)
+        SELECT DISTINCT character FROM {LEGACY_TABLE}
+        WHERE character IS NOT NULL AND character != ""
+        ORDER BY character
+    ''')
+
+    cursor.execute(f'''
+        INSERT INTO dialogue_lines (script_id, row_number, character_id, dialogue)
+        SELECT s.script_id, {source('row_number')}, c.character_id, l.dialogue
+        FROM {LEGACY_TABLE} l
+        JOIN scripts s ON s.script_name = l.script_name
+        LEFT JOIN characters c ON c.name = l.character
+        ORDER BY l.rowid
+    ''')
+
+    # 台本内でメタデータが揃っていない台本を報告
+    metadata = " || '|' || ".join(
+        f"COALESCE({c}, '')" for c in SCRIPT_COLUMNS[1:] if c in existing
+    )
+    cursor.execute(f'''
+        SELECT COUNT(*) FROM (
+            SELECT script_name FROM {LEGACY_TABLE}
+            GROUP BY script_name
+            HAVING COUNT(DISTINCT {metadata}) > 1
+        )
+    ''')
+    inconsistent = cursor.fetchone()[0]
+
+    cursor.execute(f'SELECT COUNT(*) FROM {LEGACY_TABLE} WHERE script_name IS NULL')
+    orphaned = cursor.fetchone()[0]
+
+    cursor.execute(f'DROP TABLE {LEGACY_TABLE}')
+    create_compat_view(conn)
+    conn.commit()
+
+    cursor.execute('SELECT COUNT(*) FROM scripts')
+    total_scripts = cursor.fetchone()[0]
+    cursor.execute('SELECT COUNT(*) FROM dialogue_lines')
+    total_lines = cursor.fetchone()[0]
+
+    print(f"Scripts: {total_scripts}")
+    print(f"Dialogue lines: {total_lines}")
+    if inconsistent:
+        print(f"Warning: {inconsistent} scripts had differing metadata (first row kept)")
+    if orphaned:
+        print(f"Warning: {orphaned} rows without script_name were dropped")
+
+
+def create_version_tracking(conn):
+    """データ更新ごとに data_version を進めるトリガーを作成する
+
+    統計キャッシュなどの派生データは、保存時の data_version と現在値を
+    比較して古くなったかどうかを判定する。
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS db_meta (
+            key TEXT PRIMARY KEY,
+            value
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('data_version', 1)")
+
+    for table in ('scripts', 'characters', 'dialogue_lines'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            trigger = f'{table}_version_{event.lower()}'
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute(f'''
+                CREATE TRIGGER {trigger} AFTER {event} ON {table} BEGIN
+                    UPDATE db_meta SET value = value + 1 WHERE key = 'data_version';
+                END
+            ''')
+    conn.commit()
+
+
+def get_data_version(conn):
+    """現在の data_version（未設定なら 0）"""
+    try:
+        row = conn.execute("SELECT value FROM db_meta WHERE key = 'data_version'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+def mark_derived_current(conn, name):
+    """派生データ name を現在の data_version で作成したことを記録する"""
+    conn.execute(
+        'INSERT OR REPLACE INTO db_meta (key, value) VALUES (?, ?)',
+        (f'{name}_version', get_data_version(conn))
+    )
+
+
+def is_derived_current(conn, name):
+    """派生データ name が現在のデータと一致しているか（無ければ False）"""
+    def compute(conn):
+        try:
+            row = conn.execute('SELECT value FROM db_meta WHERE key = ?', (f'{name}_version',)).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        return row is not None and row[0] == get_data_version(conn)
+
+    return memo(conn, f'{name}_current', compute)
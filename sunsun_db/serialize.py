@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""レスポンスの JSON 化
+
+各ハンドラはレスポンスを dumps() で bytes にする。
+
+- orjson がインストールされていれば使い、無ければ標準の json（サーバーレス関数は
+  標準ライブラリのみ）。どちらも区切りの空白なし・非 ASCII はそのまま UTF-8
+- 結果型（NamedTuple）のリストは encode_rows() で、to_dict() を呼ばずに JSON 配列にする。
+  標準の json では列名の部分（'{"script_name":' など）を結果型ごとに一度だけ作った
+  テンプレートに、列ごとにまとめて JSON にした値を埋め込む（行ごとの dict を作らない）。
+  orjson では列名と値の dict を渡す（orjson は dict を C で直接書き出すため、
+  テンプレートより速く確保も少ない）
+- 1件ずつ書き出すストリーミングでは row_encoder() の関数を使う（同じテンプレート）
+- SQLite の json_object() などで組み立て済みの JSON は RawJSON で包むと、
+  dumps() がそのまま埋め込む（Python のオブジェクトに戻さない）
+"""
+
+import functools
+import json
+import math
+from json.encoder import encode_basestring
+
+try:
+    import orjson
+except ImportError:  # 標準ライブラリのみの環境では json を使う
+    orjson = None
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), check_circular=False)
+
+
+class RawJSON(bytes):
+    """組み立て済みの JSON（dumps() でそのまま埋め込む）"""
+
+
+def _contains_raw(value):
+    if isinstance(value, RawJSON):
+        return True
+    if isinstance(value, dict):
+        return any(_contains_raw(item) for item in value.values())
+    return False
+
+
+def _dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return _encoder.encode(obj).encode()
+
+
+def dumps(obj):
+    """obj を JSON (bytes) にする
+
+    値に RawJSON を含む dict はキーごとに組み立てて埋め込む
+    （リストの中の RawJSON は探さない）。
+    """
+    if isinstance(obj, RawJSON):
+        return bytes(obj)
+    if isinstance(obj, dict) and _contains_raw(obj):
+        return b'{' + b','.join(
+            _dumps(str(key)) + b':' + dumps(value) for key, value in obj.items()
+        ) + b'}'
+    return _dumps(obj)
+
+
+def _encode_value(value):
+    """テンプレートに埋め込む1つの値（str・None・数値以外は json に任せる）"""
+    cls = value.__class__
+    if cls is str:
+        return encode_basestring(value)
+    if value is None:
+        return 'null'
+    if cls is int:
+        return int.__repr__(value)
+    if cls is float and math.isfinite(value):
+        return float.__repr__(value)
+    return _encoder.encode(value)
+
+
+def _encode_column(values):
+    """1列分の値を JSON にする（すべて str なら encode_basestring を直接使う）"""
+    if set(map(type, values)) == {str}:
+        return map(encode_basestring, values)
+    return map(_encode_value, values)
+
+
+@functools.lru_cache(maxsize=None)
+def _row_template(result_type):
+    """結果型の1行のテンプレート（列名は組み立て済みで、値を %s に埋め込む）"""
+    return '{' + ','.join(encode_basestring(field) + ':%s' for field in result_type._fields) + '}'
+
+
+def encode_rows(results):
+    """結果型（NamedTuple）のリストを JSON 配列にする"""
+    if not results:
+        return RawJSON(b'[]')
+    if orjson is not None:
+        # orjson は dict を C で直接書き出すので、テンプレートに埋め込むより速く確保も少ない
+        fields = results[0]._fields
+        return RawJSON(orjson.dumps([dict(zip(fields, row)) for row in results]))
+
+    # 列ごとに値を JSON にしてから行のテンプレートに埋め込む（行ごとの dict を作らない）
+    template = _row_template(type(results[0]))
+    columns = [_encode_column(values) for values in zip(*results)]
+    return RawJSON(('[' + ','.join(map(template.__mod__, zip(*columns))) + ']').encode())
+
+
+@functools.lru_cache(maxsize=None)
+def row_encoder(result_type):
+    """結果型の1行を JSON (bytes) にする関数"""
+    fields = result_type._fields
+    if orjson is not None:
+        return lambda row: orjson.dumps(dict(zip(fields, row)))
+
+    template = _row_template(result_type)
+    return lambda row: (template % tuple(map(_encode_value, row))).encode()
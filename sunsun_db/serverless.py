@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""サーバーレス関数（Vercel の api/、Netlify の netlify/functions/）の共通処理
+
+各関数は以下のように使う（Netlify では send_not_modified の代わりに
+not_modified_response を返す）。
+
+    etag_headers, not_modified = check_etag(timer, 'stats', {}, self.headers.get('If-None-Match'))
+    if not_modified:
+        return send_not_modified(self, etag_headers, timer)
+    conn = get_db_connection(timer)
+"""
+
+from sunsun_db.http_cache import cache_headers, etag_matches, make_etag
+from sunsun_db.pool import connect
+from sunsun_db.provision import content_version, download_database, manifest_version
+
+
+def get_db_connection(timer):
+    """データベース接続を取得（ウォームコンテナでは接続を再利用する）"""
+    with timer.phase('download'):
+        db_path = download_database()
+    with timer.phase('connect'):
+        conn = connect(db_path)
+    timer.track(conn)
+    return conn
+
+
+def check_etag(timer, endpoint, params, if_none_match):
+    """データの版とパラメータから ETag を作り、If-None-Match と比べる
+
+    (200・304 に付けるキャッシュヘッダー, 304 を返せるか) を返す。
+    一致すれば SQL を実行せずに 304 を返せる。
+    """
+    with timer.phase('download'):
+        # マニフェストで版が固定されているときだけ CDN に長く保持させる
+        pinned = manifest_version() is not None
+        etag = make_etag(content_version(), endpoint, params)
+    return cache_headers(etag, pinned), etag_matches(if_none_match, etag)
+
+
+def send_not_modified(handler, etag_headers, timer):
+    """Vercel の BaseHTTPRequestHandler に 304 を書き出す"""
+    handler.send_response(304)
+    for header, value in {**etag_headers, **timer.headers()}.items():
+        handler.send_header(header, value)
+    handler.send_header('Access-Control-Allow-Origin', '*')
+    handler.end_headers()
+    timer.log(304)
+
+
+def not_modified_response(headers, etag_headers, timer):
+    """Netlify Function の 304 レスポンス"""
+    timer.log(304)
+    return {
+        'statusCode': 304,
+        'headers': {**headers, **etag_headers, **timer.headers()},
+        'body': ''
+    }
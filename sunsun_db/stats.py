@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""統計情報スナップショット
+
+/api/stats の集計結果を stats_cache テーブルに1行で保存しておき、
+リクエスト時はその行を読むだけにする。ETL やビルドの最後に更新し、
+保存時の data_version が現在値と異なる場合は古いとみなして再集計する。
+
+台本詳細用の script_character_stats（台本×キャラクターのセリフ数）、
+characters のセリフ数・登場台本数、テーマ・題材の中間テーブルも同じタイミングで作り直す。
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+
+from sunsun_db.characters import write_character_counts
+from sunsun_db.dates import has_release_dates
+from sunsun_db.schema import (
+    get_data_version,
+    is_derived_current,
+    is_normalized,
+    mark_derived_current,
+)
+from sunsun_db.tags import write_script_tags
+
+CHARACTER_TOP_N = 10
+
+
+def compute_stats(conn):
+    """統計情報を集計する"""
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT COUNT(*) FROM scripts')
+    total_scripts = cursor.fetchone()[0]
+
+    cursor.execute('SELECT COUNT(*) FROM dialogue_lines')
+    total_dialogues = cursor.fetchone()[0]
+
+    cursor.execute('''
+        SELECT COUNT(*) FROM scripts
+        WHERE youtube_url IS NOT NULL AND youtube_url != ""
+    ''')
+    youtube_connected = cursor.fetchone()[0]
+
+    # キャラクター別統計
+    cursor.execute('''
+        SELECT c.name, COUNT(*) as count
+        FROM dialogue_lines d
+        JOIN characters c ON c.character_id = d.character_id
+        GROUP BY d.character_id
+        ORDER BY count DESC
+        LIMIT ?
+    ''', (CHARACTER_TOP_N,))
+    character_stats = [
+        {'character': name, 'count': count} for name, count in cursor.fetchall()
+    ]
+
+    # 信頼度別統計
+    cursor.execute('''
+        SELECT
+            COUNT(CASE WHEN match_confidence >= 0.8 THEN 1 END),
+            COUNT(CASE WHEN match_confidence >= 0.5 AND match_confidence < 0.8 THEN 1 END),
+            COUNT(CASE WHEN match_confidence < 0.5 THEN 1 END)
+        FROM scripts
+    ''')
+    high, medium, low = cursor.fetchone()
+    confidence_stats = {
+        'high_confidence': high,
+        'medium_confidence': medium,
+        'low_confidence': low
+    }
+
+    # 年代別統計（解析済みの公開日があればその年、無ければ先頭4文字）
+    if has_release_dates(conn):
+        cursor.execute('''
+            SELECT CAST(release_year AS TEXT) as year, COUNT(*) as count
+            FROM scripts
+            WHERE release_year IS NOT NULL
+            GROUP BY release_year
+            ORDER BY release_year
+        ''')
+    else:
+        cursor.execute('''
+            SELECT substr(release_date, 1, 4) as year, COUNT(*) as count
+            FROM scripts
+            WHERE release_date IS NOT NULL AND release_date != ""
+            GROUP BY year
+            ORDER BY year
+        ''')
+    year_stats = [{'year': year, 'count': count} for year, count in cursor.fetchall()]
+
+    return {
+        'total_scripts': total_scripts,
+        'total_dialogues': total_dialogues,
+        'youtube_connected': youtube_connected,
+        'youtube_coverage': round((youtube_connected / total_scripts) * 100, 2) if total_scripts else 0,
+        'character_stats': character_stats,
+        'confidence_stats': confidence_stats,
+        'year_stats': year_stats
+    }
+
+
+def write_stats_cache(conn):
+    """統計情報を集計して stats_cache に保存する"""
+    if not is_normalized(conn):
+        print("Skipping stats cache: database is not normalized (run python -m sunsun_db.build)")
+        return None
+
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_cache (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            data_version INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+
+    write_character_counts(conn)
+    write_script_character_stats(conn)
+    write_script_tags(conn)
+
+    stats = compute_stats(conn)
+    cursor.execute('''
+        INSERT OR REPLACE INTO stats_cache (id, data_version, payload, updated_at)
+        VALUES (1, ?, ?, ?)
+    ''', (get_data_version(conn), json.dumps(stats, ensure_ascii=False), datetime.now().isoformat()))
+    conn.commit()
+
+    print(f"Stats cache updated: {stats['total_scripts']} scripts, {stats['total_dialogues']} dialogues")
+    return stats
+
+
+def write_script_character_stats(conn):
+    """台本×キャラクターのセリフ数を script_character_stats に保存する"""
+    cursor = conn.cursor()
+    # 台本詳細で表示する順（セリフ数の多い順）に並べて保存する
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS script_character_stats (
+            script_id INTEGER NOT NULL,
+            dialogue_count INTEGER NOT NULL,
+            character_id INTEGER NOT NULL,
+            PRIMARY KEY (script_id, dialogue_count DESC, character_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('DELETE FROM script_character_stats')
+    cursor.execute('''
+        INSERT INTO script_character_stats (script_id, dialogue_count, character_id)
+        SELECT script_id, COUNT(*), character_id
+        FROM dialogue_lines
+        WHERE character_id IS NOT NULL
+        GROUP BY script_id, character_id
+    ''')
+    rows = cursor.rowcount
+    mark_derived_current(conn, 'script_character_stats')
+    conn.commit()
+
+    print(f"Script character stats updated: {rows} rows")
+
+
+def has_script_character_stats(conn):
+    """script_character_stats が現在のデータと一致しているか"""
+    return is_derived_current(conn, 'script_character_stats')
+
+
+def read_stats(conn):
+    """統計情報を取得する
+
+    stats_cache が最新ならその1行を返し、無い・古い場合は再集計する。
+    """
+    try:
+        row = conn.execute('SELECT data_version, payload FROM stats_cache WHERE id = 1').fetchone()
+    except sqlite3.OperationalError:
+        row = None
+
+    if row is not None and row[0] == get_data_version(conn):
+        return json.loads(row[1])
+
+    # 読み取り専用の接続では保存できないため、集計結果だけ返す
+    try:
+        return write_stats_cache(conn) or compute_stats(conn)
+    except sqlite3.OperationalError:
+        return compute_stats(conn)
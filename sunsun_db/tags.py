@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""テーマ・題材の分割
+
+scripts.themes / scripts.subjects はカンマ区切りの文字列で保存されている。
+これを1件ずつに分けて中間テーブル（script_themes / script_subjects）に、
+件数を theme_counts / subject_counts に保存する。
+
+- 一覧 (/api/themes) は件数テーブルを読むだけ
+- 絞り込みは中間テーブルの主キー (theme, script_id) で完全一致の検索になる
+  （LIKE '%...%' のように別のテーマ名の一部にはマッチしない）
+
+stats_cache と同じくビルドと ETL の最後に作り直し、保存時の data_version が
+現在値と異なる場合は元の列を直接分割・照合する。
+"""
+
+import functools
+
+from sunsun_db.schema import is_derived_current, mark_derived_current
+
+# 元の列: (1件の列名, 中間テーブル, 件数テーブル)
+TAG_TABLES = {
+    'themes': ('theme', 'script_themes', 'theme_counts'),
+    'subjects': ('subject', 'script_subjects', 'subject_counts'),
+}
+
+TAG_SEPARATOR = ','
+
+# 複数指定したときの条件
+MATCH_ANY = 'any'  # いずれかを含む
+MATCH_ALL = 'all'  # すべてを含む
+
+
+def split_tags(value):
+    """カンマ区切りの文字列を重複の無いリストにする"""
+    if not value:
+        return []
+    tags = (tag.strip() for tag in value.split(TAG_SEPARATOR))
+    return list(dict.fromkeys(tag for tag in tags if tag))
+
+
+def parse_tags(values):
+    """リクエストの値（繰り返し指定・カンマ区切りのどちらも可）をタプルにする"""
+    if isinstance(values, str):
+        values = [values]
+    tags = []
+    for value in values:
+        tags += split_tags(value)
+    return tuple(dict.fromkeys(tags))
+
+
+def write_script_tags(conn):
+    """テーマ・題材の中間テーブルと件数を作り直す"""
+    cursor = conn.cursor()
+    for column, (name, table, count_table) in TAG_TABLES.items():
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {name} TEXT NOT NULL,
+                script_id INTEGER NOT NULL,
+                PRIMARY KEY ({name}, script_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {count_table} (
+                {name} TEXT PRIMARY KEY,
+                script_count INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(f'DELETE FROM {count_table}')
+
+        rows = cursor.execute(f'SELECT script_id, {column} FROM scripts').fetchall()
+        cursor.executemany(
+            f'INSERT INTO {table} ({name}, script_id) VALUES (?, ?)',
+            [(tag, script_id) for script_id, value in rows for tag in split_tags(value)]
+        )
+        cursor.execute(f'''
+            INSERT INTO {count_table} ({name}, script_count)
+            SELECT {name}, COUNT(*) FROM {table} GROUP BY {name}
+        ''')
+        total = cursor.execute(f'SELECT COUNT(*) FROM {count_table}').fetchone()[0]
+        print(f"Script {column} updated: {total} distinct")
+
+    mark_derived_current(conn, 'script_tags')
+    conn.commit()
+
+
+def has_script_tags(conn):
+    """中間テーブルが現在のデータと一致しているか"""
+    return is_derived_current(conn, 'script_tags')
+
+
+@functools.lru_cache(maxsize=None)
+def tag_condition(column, count, match, precomputed, script_key='script_id'):
+    """テーマ・題材 count 件での絞り込み条件の SQL（パラメータはタグそのもの）
+
+    precomputed なら中間テーブルを主キーで引き、そうでなければ元の列を
+    カンマ区切りの要素として照合する。
+    """
+    if precomputed:
+        name, table, _ = TAG_TABLES[column]
+        placeholders = ', '.join('?' * count)
+        # 該当する台本の集合を作り、台本側は並び順のインデックスのまま走査する
+        # （単項 + で script_id からの検索にしない。台本数の多いテーマでも limit 件で止まる）
+        if match == MATCH_ALL and count > 1:
+            return f'''+{script_key} IN (
+                SELECT script_id FROM {table} WHERE {name} IN ({placeholders})
+                GROUP BY script_id HAVING COUNT(*) = {count}
+            )'''
+        return f'+{script_key} IN (SELECT script_id FROM {table} WHERE {name} IN ({placeholders}))'
+
+    # 前後にカンマを付けて要素単位で比較する（カンマ前後の空白は除く）
+    element = f"instr(',' || REPLACE(REPLACE({column}, ', ', ','), ' ,', ',') || ',', ',' || ? || ',') > 0"
+    joiner = ' AND ' if match == MATCH_ALL else ' OR '
+    return '(' + joiner.join([element] * count) + ')'
+
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""リクエストのフェーズ別計測
+
+ハンドラーの各フェーズ（download / connect / query / serialize など）の時間を
+測り、`Server-Timing` レスポンスヘッダーと1リクエスト1行の JSON ログに出す。
+
+    timer = start_timer('search')
+    with timer.phase('connect'):
+        conn = get_db_connection()
+    timer.track(conn)
+    ...
+    timer.rows(len(results), total)
+    headers.update(timer.headers())
+    timer.log(200)
+
+ログには返した件数・マッチした件数（limit 前の総数。分かるときだけ）・SQLite の
+VM 命令数（vm_steps、読んだ行数の目安）と、プロセスの最初のリクエストかどうか
+（cold）が入る。VM 命令数は set_progress_handler で PROGRESS_STEPS 命令ごとに数えるので
+その倍数の概数になる（接続の返却時にプールが解除する）。計測は perf_counter と
+数千命令に1回の呼び出しだけなので、1リクエストあたり数十マイクロ秒で済む。
+
+環境変数 SUNSUN_TIMING=0 で無効にすると何もしないタイマーが返る
+（ヘッダーもログも出ない）。
+"""
+
+import itertools
+import json
+import os
+import time
+from contextlib import nullcontext
+
+# プロセス内で処理したリクエストの通し番号（0 ならコールドスタート）
+_request_numbers = itertools.count()
+
+# VM 命令数を数える間隔
+PROGRESS_STEPS = 1000
+
+
+def timing_enabled():
+    """計測が有効かどうか（既定で有効）"""
+    return os.environ.get('SUNSUN_TIMING', '1') != '0'
+
+
+class _Phase:
+    """with ブロックの時間をタイマーに加算する"""
+
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        durations = self.timer.durations
+        durations[self.name] = durations.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+class RequestTimer:
+    """1リクエスト分の計測結果"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.cold = next(_request_numbers) == 0
+        self.start = time.perf_counter()
+        self.durations = {}
+        self.rows_returned = None
+        self.rows_matched = None
+        self.vm_steps = None
+        self.cache = None
+
+    def phase(self, name):
+        """フェーズの時間を測る（同じ名前は加算される）"""
+        return _Phase(self, name)
+
+    def rows(self, returned, matched=None):
+        """返した件数と、limit を掛ける前にマッチした件数"""
+        self.rows_returned = returned
+        self.rows_matched = matched
+
+    def track(self, conn):
+        """conn で実行される SQLite の VM 命令数を数える"""
+        if self.vm_steps is None:
+            self.vm_steps = 0
+        conn.set_progress_handler(self._count_steps, PROGRESS_STEPS)
+
+    def _count_steps(self):
+        self.vm_steps += PROGRESS_STEPS
+        # 0 を返すとクエリを続ける
+        return 0
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def headers(self):
+        """Server-Timing ヘッダー（ミリ秒）"""
+        metrics = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.durations.items()]
+        metrics.append(f'total;dur={self.elapsed_ms():.2f}')
+        if self.cold:
+            metrics.append('cold')
+        return {'Server-Timing': ', '.join(metrics)}
+
+    def log(self, status):
+        """構造化ログを1行出力する（マッチした件数は分かるときだけ入れる）"""
+        record = {
+            'event': 'request_timing',
+            'endpoint': self.endpoint,
+            'status': status,
+            'cold': self.cold,
+            'cache': self.cache,
+            'total_ms': round(self.elapsed_ms(), 2),
+            'phases_ms': {name: round(seconds * 1000, 2) for name, seconds in self.durations.items()},
+            'vm_steps': self.vm_steps,
+            'rows_returned': self.rows_returned
+        }
+        if self.rows_matched is not None:
+            record['rows_matched'] = self.rows_matched
+        print(json.dumps(record, ensure_ascii=False))
+
+
+class NullTimer:
+    """計測が無効なときのタイマー（何もしない）
+
+    全リクエストで1つのインスタンス (NULL_TIMER) を共有するので、状態を持たない。
+    """
+
+    __slots__ = ()
+    _phase = nullcontext()
+
+    @property
+    def cache(self):
+        return None
+
+    @cache.setter
+    def cache(self, value):
+        # 共有のインスタンスなので、ハンドラが設定しても保存しない
+        pass
+
+    def phase(self, name):
+        return self._phase
+
+    def rows(self, returned, matched=None):
+        pass
+
+    def track(self, conn):
+        pass
+
+    def headers(self):
+        return {}
+
+    def log(self, status):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def start_timer(endpoint):
+    """リクエストの計測を始める"""
+    if not timing_enabled():
+        return NULL_TIMER
+    return RequestTimer(endpoint)